@@ -0,0 +1,196 @@
+import re
+from urllib.parse import parse_qsl
+from api import bookings, events, guests, reports, rooms, stats
+from api.lib.hotels import for_hotel
+from api.lib.idempotency import idempotent
+from api.lib.http import parse_event, to_vercel
+
+# Largest number of operations accepted in one batch
+MAX_OPERATIONS = 50
+
+# Resource paths a batch may address: path -> (module, fixed query params)
+RESOURCES = {
+    'guests': (guests, {}),
+    'guests/suggest': (guests, {'action': 'suggest'}),
+    'rooms': (rooms, {}),
+    'rooms/availability': (rooms, {'action': 'availability'}),
+    'bookings': (bookings, {}),
+    'events': (events, {}),
+    'stats': (stats, {}),
+    'reports/occupancy': (reports, {'action': 'occupancy'}),
+    'reports/pickup': (reports, {'action': 'pickup'}),
+}
+
+METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+
+# "$0.id" or "$guest.id": a value from an earlier operation's response data
+REFERENCE = re.compile(r'^\$([A-Za-z0-9_]+)((?:\.[A-Za-z0-9_]+)*)$')
+
+# Conditional request headers and idempotency keys only make sense for the batch request itself
+SKIPPED_HEADERS = ('if-none-match', 'if-match', 'content-length', 'idempotency-key')
+
+def handler(event, context):
+    """Vercel serverless function handler for batch endpoint"""
+    return to_vercel(dispatch(*parse_event(event)))
+
+@for_hotel
+@idempotent
+def dispatch(method, query_params, body, request_headers=None):
+    """Run a list of API operations in order within one request"""
+
+    # CORS headers
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+        'Content-Type': 'application/json'
+    }
+
+    # Handle OPTIONS for CORS
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'data': None
+        }
+
+    try:
+        if method == 'POST':
+            return handle_batch(body, headers, request_headers or {})
+        else:
+            return {
+                'statusCode': 405,
+                'headers': headers,
+                'data': {'error': 'Method not allowed'}
+            }
+    except Exception as e:
+        print(f'Batch API Error: {str(e)}')
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'data': {'error': 'Internal server error', 'details': str(e)}
+        }
+
+class OperationError(Exception):
+    """Raised when one operation cannot be run as given"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def handle_batch(body, headers, request_headers):
+    """Run ``{"operations": [...]}`` and return one result per operation"""
+    operations = body.get('operations') if isinstance(body, dict) else body
+    if not isinstance(operations, list) or not operations:
+        return bad_request('Body must be a non-empty list of operations, or {"operations": [...]}', headers)
+    if len(operations) > MAX_OPERATIONS:
+        return {
+            'statusCode': 413,
+            'headers': headers,
+            'data': {'error': f'Batch too large ({len(operations)} operations, max {MAX_OPERATIONS})'}
+        }
+    stop_on_error = isinstance(body, dict) and body.get('stop_on_error') is True
+
+    inner_headers = {k: v for k, v in request_headers.items() if k not in SKIPPED_HEADERS}
+    names = {}
+    results = []
+    failed = False
+
+    for index, operation in enumerate(operations):
+        name = operation.get('id') if isinstance(operation, dict) else None
+        if failed and stop_on_error:
+            result = operation_result(index, name, 424, {'error': 'Skipped after an earlier failure'})
+        else:
+            try:
+                response = run_operation(operation, results, names, inner_headers)
+                result = operation_result(index, name, response['statusCode'], response.get('data'))
+            except OperationError as e:
+                result = operation_result(index, name, e.status, {'error': str(e)})
+        results.append(result)
+        failed = failed or result['status'] >= 400
+        if name is not None:
+            names[str(name)] = index
+
+    return {
+        'statusCode': 207 if failed else 200,
+        'headers': {**headers, 'Cache-Control': 'no-store'},
+        'data': {'results': results}
+    }
+
+def run_operation(operation, results, names, request_headers):
+    """Resolve references in one operation and call its handler in-process"""
+    if not isinstance(operation, dict):
+        raise OperationError('Operation must be an object')
+
+    method = str(operation.get('method', 'GET')).upper()
+    if method not in METHODS:
+        raise OperationError(f"method must be one of: {', '.join(METHODS)}", 405)
+
+    path, _, query = str(operation.get('resource', '')).partition('?')
+    path = path.strip('/')
+    path = path[len('api/'):] if path.startswith('api/') else path
+    if path not in RESOURCES:
+        raise OperationError(f'Unknown resource: {path}', 404)
+    module, defaults = RESOURCES[path]
+
+    params = operation.get('params') or {}
+    if not isinstance(params, dict):
+        raise OperationError('params must be an object')
+    params = {**dict(parse_qsl(query)), **params}
+    params = {key: str(value) for key, value in resolve(params, results, names).items()}
+    if params.get('action') == 'export':
+        raise OperationError('Exports stream their rows and are not available in a batch')
+
+    body = resolve(operation.get('body', {}), results, names)
+    response = module.dispatch(method, {**params, **defaults}, body, request_headers)
+
+    if 'stream' in response:
+        raise OperationError('Streaming responses are not available in a batch')
+    return response
+
+def resolve(value, results, names):
+    """Replace ``$<op>.<path>`` strings with values from earlier results"""
+    if isinstance(value, dict):
+        return {key: resolve(item, results, names) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve(item, results, names) for item in value]
+    if not isinstance(value, str) or not value.startswith('$'):
+        return value
+    if value.startswith('$$'):
+        # Escaped literal dollar sign
+        return value[1:]
+
+    match = REFERENCE.match(value)
+    if not match:
+        raise OperationError(f'Invalid reference: {value}')
+    target, path = match.groups()
+    index = names.get(target, int(target) if target.isdigit() else None)
+    if index is None or index >= len(results):
+        raise OperationError(f'Reference to an unknown or later operation: {value}')
+
+    result = results[index]
+    if result['status'] >= 400:
+        raise OperationError(f'Depends on failed operation {index}', 424)
+
+    current = result['data']
+    for key in path.split('.')[1:]:
+        if isinstance(current, list) and key.isdigit() and int(key) < len(current):
+            current = current[int(key)]
+        elif isinstance(current, dict) and key in current:
+            current = current[key]
+        else:
+            raise OperationError(f'Reference not found in operation {index} result: {value}')
+    return current
+
+def operation_result(index, name, status, data):
+    result = {'index': index, 'status': status, 'data': data}
+    if name is not None:
+        result['id'] = name
+    return result
+
+def bad_request(message, headers):
+    return {
+        'statusCode': 400,
+        'headers': headers,
+        'data': {'error': message}
+    }
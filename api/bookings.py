@@ -1,30 +1,35 @@
-from supabase import create_client, Client
-from marshmallow import Schema, fields, ValidationError, validate
-from datetime import datetime
-import os
-import json
+from api.lib.aggregates import get_stats
+from api.lib.analytics import get_report_engine
+from api.lib.availability import get_occupancy_map
+from api.lib.intervals import ACTIVE_STATUSES, get_conflict_index, to_day
+from api.lib import batch
+from api.lib.concurrency import gather
+from api.lib.cache import get_response_cache
+from api.lib.events import get_change_feed
+from api.lib.export import EXPORT_PAGE_SIZE, export_columns, export_response
+from api.lib.membership import get_known_keys
+from api.lib.pagination import InvalidCursor, list_page, scan
+from api.lib.projection import InvalidFields, parse_projection
+from api.lib.storage import MissingReference, get_storage
+from api.lib.storage.schema import BOOKING_EMBED, BOOKING_LIST_EMBED
+from api.lib.transitions import TransitionError, transition
+from api.lib.hotels import for_hotel
+from api.lib.idempotency import idempotent
+from api.lib.http import parse_event, to_vercel
+from api.lib.validation import LazySchema, ValidationError
 
-# Initialize Supabase client
-supabase: Client = create_client(
-    os.environ.get('SUPABASE_URL'),
-    os.environ.get('SUPABASE_SERVICE_KEY')
-)
-
-# Validation schemas
-class BookingSchema(Schema):
-    guest_id = fields.Int(required=True, validate=validate.Range(min=1))
-    room_id = fields.Int(required=True, validate=validate.Range(min=1))
-    check_in_date = fields.Date(required=True)
-    check_out_date = fields.Date(required=True)
-    total_amount = fields.Float(required=True, validate=validate.Range(min=0))
-
-booking_schema = BookingSchema()
+# Validation schema (marshmallow is imported on first use)
+booking_schema = LazySchema('BookingSchema')
+booking_update_schema = LazySchema('BookingSchema', partial=True)
 
 def handler(event, context):
     """Vercel serverless function handler for bookings endpoint"""
-    # Parse the request
-    method = event.get('httpMethod', event.get('method', 'GET'))
-    query_params = event.get('queryStringParameters', {}) or {}
+    return to_vercel(dispatch(*parse_event(event)))
+
+@for_hotel
+@idempotent
+def dispatch(method, query_params, body, request_headers=None):
+    """Route a parsed request to the matching bookings handler"""
     
     # CORS headers
     headers = {
@@ -39,14 +44,17 @@ def handler(event, context):
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': ''
+            'data': None
         }
     
     try:
         if method == 'GET':
-            return handle_get_bookings(query_params, headers)
+            if query_params.get('action') == 'export':
+                return handle_export_bookings(query_params, headers)
+            return handle_get_bookings(query_params, headers, request_headers)
         elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
+            if isinstance(body, list):
+                return handle_create_bookings_batch(body, headers)
             return handle_create_booking(body, headers)
         elif method == 'PUT':
             action = query_params.get('action')
@@ -55,7 +63,6 @@ def handler(event, context):
             elif action == 'checkout':
                 return handle_check_out(query_params, headers)
             else:
-                body = json.loads(event.get('body', '{}'))
                 return handle_update_booking(query_params, body, headers)
         elif method == 'DELETE':
             return handle_cancel_booking(query_params, headers)
@@ -63,125 +70,268 @@ def handler(event, context):
             return {
                 'statusCode': 405,
                 'headers': headers,
-                'body': json.dumps({'error': 'Method not allowed'})
+                'data': {'error': 'Method not allowed'}
             }
     except Exception as e:
         print(f'Bookings API Error: {str(e)}')
         return {
             'statusCode': 500,
             'headers': headers,
-            'body': json.dumps({'error': 'Internal server error', 'details': str(e)})
+            'data': {'error': 'Internal server error', 'details': str(e)}
         }
 
-def handle_get_bookings(params, headers):
+def handle_get_bookings(params, headers, request_headers=None):
     """Get all bookings with optional filtering"""
     skip = int(params.get('skip', 0))
     limit = int(params.get('limit', 100))
+    cursor = params.get('cursor')
+    filters = booking_filters(params)
+    
+    # Served from the response cache until a booking or room write
+    cache = get_response_cache()
+    try:
+        projection = parse_projection('bookings', params, BOOKING_LIST_EMBED)
+        key = (skip, limit, cursor, tuple(sorted(filters.items())), projection.key)
+        entry = cache.fetch('bookings', key, lambda: projection.shape(list_page(
+            get_storage(),
+            'bookings',
+            limit,
+            skip,
+            cursor,
+            projection.columns,
+            filters=filters,
+            embed=projection.embed
+        )))
+    except (InvalidCursor, InvalidFields) as e:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'data': {'error': str(e)}
+        }
+    
+    return cache.respond(entry, headers, request_headers)
+
+def booking_filters(params):
+    """Storage filters for the ``status``, ``guest_id`` and ``room_id`` params"""
     status = params.get('status')
     guest_id = params.get('guest_id')
     room_id = params.get('room_id')
     
-    query = supabase.table('bookings').select('''
-        *,
-        guest:guests(id, name, email),
-        room:rooms(id, room_number, room_type, price_per_night)
-    ''')
+    filters = {}
     
     if status:
-        query = query.eq('status', status)
+        filters['status'] = status
     
     if guest_id:
-        query = query.eq('guest_id', int(guest_id))
+        filters['guest_id'] = int(guest_id)
     
     if room_id:
-        query = query.eq('room_id', int(room_id))
-    
-    response = query.range(skip, skip + limit - 1).order('created_at', desc=True).execute()
+        filters['room_id'] = int(room_id)
     
-    return {
-        'statusCode': 200,
-        'headers': headers,
-        'body': json.dumps(response.data)
-    }
+    return filters
+
+def handle_export_bookings(params, headers):
+    """Stream every matching booking as CSV or NDJSON"""
+    rows = scan(
+        get_storage(),
+        'bookings',
+        filters=booking_filters(params),
+        page_size=EXPORT_PAGE_SIZE,
+        embed=BOOKING_LIST_EMBED
+    )
+    return export_response(
+        rows,
+        params.get('format', 'csv'),
+        export_columns('bookings', BOOKING_LIST_EMBED),
+        'bookings',
+        headers
+    )
 
 def handle_create_booking(data, headers):
     """Create a new booking"""
+    storage = get_storage()
     try:
         # Validate input
         validated_data = booking_schema.load(data)
         
+        # Guest, room and conflict lookups are independent; overlap them.
+        # A guest this process already knows needs no query.
+        conflict_index = get_conflict_index()
+        known = get_known_keys()
+        guest, room, conflict = gather(
+            lambda: known.exists(storage, 'guests', validated_data['guest_id']),
+            lambda: storage.first('rooms', 'id, is_available', {'id': validated_data['room_id']}),
+            lambda: conflict_index.find_conflict(
+                storage,
+                validated_data['room_id'],
+                validated_data['check_in_date'],
+                validated_data['check_out_date']
+            )
+        )
+        
         # Verify guest exists
-        guest = supabase.table('guests').select('id').eq('id', validated_data['guest_id']).execute()
-        if not guest.data:
+        if not guest:
             return {
                 'statusCode': 400,
                 'headers': headers,
-                'body': json.dumps({'error': 'Guest not found'})
+                'data': {'error': 'Guest not found'}
             }
         
         # Verify room exists and is available
-        room = supabase.table('rooms').select('id, is_available').eq('id', validated_data['room_id']).execute()
-        if not room.data:
+        if not room:
             return {
                 'statusCode': 400,
                 'headers': headers,
-                'body': json.dumps({'error': 'Room not found'})
+                'data': {'error': 'Room not found'}
             }
         
-        if not room.data[0]['is_available']:
+        if not room['is_available']:
             return {
                 'statusCode': 400,
                 'headers': headers,
-                'body': json.dumps({'error': 'Room is not available'})
+                'data': {'error': 'Room is not available'}
             }
         
         # Check for booking conflicts
-        conflicts = supabase.table('bookings').select('*').eq('room_id', validated_data['room_id']).in_('status', ['booked', 'checked_in']).execute()
-        
-        check_in = validated_data['check_in_date']
-        check_out = validated_data['check_out_date']
-        
-        for conflict in conflicts.data:
-            conflict_in = datetime.fromisoformat(conflict['check_in_date'].replace('Z', '+00:00')).date()
-            conflict_out = datetime.fromisoformat(conflict['check_out_date'].replace('Z', '+00:00')).date()
-            
-            if (check_in <= conflict_out and check_out >= conflict_in):
-                return {
-                    'statusCode': 400,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'Room is already booked for these dates'})
-                }
+        if conflict is not None:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'data': {'error': 'Room is already booked for these dates'}
+            }
         
         # Create booking
         validated_data['status'] = 'booked'
         validated_data['check_in_date'] = validated_data['check_in_date'].isoformat()
         validated_data['check_out_date'] = validated_data['check_out_date'].isoformat()
         
-        response = supabase.table('bookings').insert(validated_data).execute()
+        # The insert returns the complete booking, guest and room included;
+        # the foreign key catches a guest deleted by another process
+        try:
+            booking = storage.insert('bookings', validated_data, embed=BOOKING_EMBED)[0]
+        except MissingReference:
+            known.removed('guests', [{'id': validated_data['guest_id']}])
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'data': {'error': 'Guest not found'}
+            }
+        conflict_index.booking_added(
+            validated_data['room_id'],
+            booking['id'],
+            validated_data['check_in_date'],
+            validated_data['check_out_date']
+        )
+        get_occupancy_map().booking_added(
+            validated_data['room_id'],
+            booking['id'],
+            validated_data['check_in_date'],
+            validated_data['check_out_date']
+        )
         
         # Update room availability
-        supabase.table('rooms').update({'is_available': False}).eq('id', validated_data['room_id']).execute()
-        
-        # Fetch complete booking data
-        booking = supabase.table('bookings').select('''
-            *,
-            guest:guests(id, name, email),
-            room:rooms(id, room_number, room_type)
-        ''').eq('id', response.data[0]['id']).execute()
+        storage.update('rooms', {'is_available': False}, {'id': validated_data['room_id']})
+        get_response_cache().invalidate('bookings', 'rooms')
+        get_stats().booking_created(booking)
+        get_report_engine().bookings_changed([booking['id']])
+        publish_booking_changes('created', [booking], taken=[validated_data['room_id']])
         
         return {
             'statusCode': 201,
             'headers': headers,
-            'body': json.dumps(booking.data[0])
+            'data': booking
         }
     
     except ValidationError as e:
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Validation failed', 'details': e.messages})
+            'data': {'error': 'Validation failed', 'details': e.messages}
         }
 
+def handle_create_bookings_batch(items, headers):
+    """Create a group of bookings with set-based checks and one insert
+    
+    Each item follows the single-booking rule: its room must be available,
+    so a room taken by an earlier item of the batch is not available to a
+    later one (check-out and cancel release the whole room).
+    """
+    storage = get_storage()
+    if len(items) > batch.MAX_BATCH_SIZE:
+        return batch.too_large(len(items), headers)
+    
+    results = [None] * len(items)
+    valid = []
+    
+    # Validate every item before touching the database
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, booking_schema.load(item)))
+        except ValidationError as e:
+            results[index] = batch.item_error(index, 'Validation failed', e.messages)
+    
+    guest_ids = {data['guest_id'] for _, data in valid}
+    room_ids = {data['room_id'] for _, data in valid}
+    guest_rows, room_rows = gather(
+        lambda: batch.select_in(storage, 'guests', 'id', 'id', guest_ids),
+        lambda: batch.select_in(storage, 'rooms', 'id, is_available', 'id', room_ids)
+    )
+    known_guests = {row['id'] for row in guest_rows}
+    rooms = {row['id']: row for row in room_rows}
+    
+    conflict_index = get_conflict_index()
+    conflict_index.preload(storage, [room_id for room_id, room in rooms.items() if room['is_available']])
+    
+    # Rooms taken by earlier items of this batch
+    taken = set()
+    pending = []
+    for index, data in valid:
+        room = rooms.get(data['room_id'])
+        if data['guest_id'] not in known_guests:
+            results[index] = batch.item_error(index, 'Guest not found')
+        elif room is None:
+            results[index] = batch.item_error(index, 'Room not found')
+        elif not room['is_available'] or data['room_id'] in taken:
+            results[index] = batch.item_error(index, 'Room is not available')
+        else:
+            conflict = conflict_index.find_conflict(
+                storage, data['room_id'], data['check_in_date'], data['check_out_date']
+            )
+            
+            if conflict is not None:
+                results[index] = batch.item_error(index, 'Room is already booked for these dates')
+            else:
+                taken.add(data['room_id'])
+                data['status'] = 'booked'
+                data['check_in_date'] = data['check_in_date'].isoformat()
+                data['check_out_date'] = data['check_out_date'].isoformat()
+                pending.append((index, data))
+    
+    if not pending:
+        return batch.batch_response(results, headers)
+    
+    inserted = storage.insert('bookings', [data for _, data in pending], embed=BOOKING_EMBED)
+    
+    # Take every booked room off the market, one statement per chunk
+    booked_rooms = sorted({data['room_id'] for _, data in pending})
+    gather(*[
+        lambda chunk=chunk: storage.update('rooms', {'is_available': False}, {'id': chunk})
+        for chunk in batch.chunked(booked_rooms)
+    ])
+    get_response_cache().invalidate('bookings', 'rooms')
+    get_report_engine().bookings_changed(row['id'] for row in inserted)
+    publish_booking_changes('created', inserted, taken=booked_rooms)
+    
+    stats = get_stats()
+    occupancy = get_occupancy_map()
+    for (index, data), row in zip(pending, inserted):
+        conflict_index.booking_added(data['room_id'], row['id'], data['check_in_date'], data['check_out_date'])
+        occupancy.booking_added(data['room_id'], row['id'], data['check_in_date'], data['check_out_date'])
+        stats.booking_created(row)
+        results[index] = batch.item_created(index, row)
+    
+    return batch.batch_response(results, headers)
+
 def handle_check_in(params, headers):
     """Check in a guest"""
     booking_id = params.get('id')
@@ -190,36 +340,26 @@ def handle_check_in(params, headers):
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Booking ID is required'})
+            'data': {'error': 'Booking ID is required'}
         }
     
-    # Get booking
-    booking = supabase.table('bookings').select('*').eq('id', booking_id).execute()
-    
-    if not booking.data:
-        return {
-            'statusCode': 404,
-            'headers': headers,
-            'body': json.dumps({'error': 'Booking not found'})
-        }
-    
-    if booking.data[0]['status'] != 'booked':
+    # Only a booked reservation moves to checked_in, in one conditional update
+    try:
+        booking, room_released = transition(get_storage(), 'checkin', booking_id)
+    except TransitionError as e:
         return {
-            'statusCode': 400,
+            'statusCode': e.status_code,
             'headers': headers,
-            'body': json.dumps({'error': 'Only booked reservations can be checked in'})
+            'data': {'error': str(e)}
         }
-    
-    # Update booking
-    response = supabase.table('bookings').update({
-        'status': 'checked_in',
-        'actual_check_in': datetime.utcnow().isoformat()
-    }).eq('id', booking_id).execute()
+    get_stats().booking_status_changed(booking, room_released)
+    get_response_cache().invalidate('bookings')
+    publish_booking_changes('updated', [booking])
     
     return {
         'statusCode': 200,
         'headers': headers,
-        'body': json.dumps({'message': 'Guest checked in successfully', 'booking': response.data[0]})
+        'data': {'message': 'Guest checked in successfully', 'booking': booking}
     }
 
 def handle_check_out(params, headers):
@@ -230,39 +370,32 @@ def handle_check_out(params, headers):
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Booking ID is required'})
-        }
-    
-    # Get booking
-    booking = supabase.table('bookings').select('*').eq('id', booking_id).execute()
-    
-    if not booking.data:
-        return {
-            'statusCode': 404,
-            'headers': headers,
-            'body': json.dumps({'error': 'Booking not found'})
+            'data': {'error': 'Booking ID is required'}
         }
     
-    if booking.data[0]['status'] != 'checked_in':
+    # Checked-in bookings only; the room is released in the same transaction
+    try:
+        booking, room_released = transition(get_storage(), 'checkout', booking_id)
+    except TransitionError as e:
         return {
-            'statusCode': 400,
+            'statusCode': e.status_code,
             'headers': headers,
-            'body': json.dumps({'error': 'Only checked-in guests can be checked out'})
+            'data': {'error': str(e)}
         }
-    
-    # Update booking
-    response = supabase.table('bookings').update({
-        'status': 'checked_out',
-        'actual_check_out': datetime.utcnow().isoformat()
-    }).eq('id', booking_id).execute()
-    
-    # Make room available again
-    supabase.table('rooms').update({'is_available': True}).eq('id', booking.data[0]['room_id']).execute()
+    get_conflict_index().booking_released(booking['room_id'], booking['id'])
+    get_occupancy_map().booking_released(booking['room_id'], booking['id'])
+    get_stats().booking_status_changed(booking, room_released)
+    get_response_cache().invalidate('bookings', 'rooms')
+    publish_booking_changes(
+        'updated', [booking],
+        released=[booking['room_id']] if room_released else (),
+        recheck=[booking['room_id']] if room_released is None else ()
+    )
     
     return {
         'statusCode': 200,
         'headers': headers,
-        'body': json.dumps({'message': 'Guest checked out successfully', 'booking': response.data[0]})
+        'data': {'message': 'Guest checked out successfully', 'booking': booking}
     }
 
 def handle_update_booking(params, data, headers):
@@ -273,77 +406,135 @@ def handle_update_booking(params, data, headers):
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Booking ID is required'})
+            'data': {'error': 'Booking ID is required'}
         }
     
-    # Update booking
-    response = supabase.table('bookings').update(data).eq('id', booking_id).execute()
-    
-    if not response.data:
+    # Status changes go through check-in, check-out and cancel
+    try:
+        changes = booking_update_schema.load(data)
+    except ValidationError as e:
         return {
-            'statusCode': 404,
+            'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Booking not found'})
+            'data': {'error': 'Validation failed', 'details': e.messages}
         }
     
-    return {
-        'statusCode': 200,
-        'headers': headers,
-        'body': json.dumps(response.data[0])
-    }
-
-def handle_cancel_booking(params, headers):
-    """Cancel a booking"""
-    booking_id = params.get('id')
-    
-    if not booking_id:
+    if not changes:
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Booking ID is required'})
+            'data': {'error': 'No fields to update'}
         }
     
-    # Get booking
-    booking = supabase.table('bookings').select('*').eq('id', booking_id).execute()
+    for field in ('check_in_date', 'check_out_date'):
+        if field in changes:
+            changes[field] = changes[field].isoformat()
     
-    if not booking.data:
+    # Check the stay as it will be, not just the fields sent
+    storage = get_storage()
+    current = storage.first('bookings', 'id, room_id, check_in_date, check_out_date, status', {'id': booking_id})
+    if not current:
         return {
             'statusCode': 404,
             'headers': headers,
-            'body': json.dumps({'error': 'Booking not found'})
+            'data': {'error': 'Booking not found'}
         }
+    merged = {**current, **changes}
     
-    status = booking.data[0]['status']
-    
-    if status == 'checked_in':
+    if to_day(merged['check_out_date']) <= to_day(merged['check_in_date']):
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Cannot cancel a booking for a checked-in guest'})
+            'data': {'error': 'check_out_date must be after check_in_date'}
         }
     
-    if status == 'cancelled':
+    moved = any(field in changes for field in ('room_id', 'check_in_date', 'check_out_date'))
+    if moved and current['status'] in ACTIVE_STATUSES:
+        conflict = get_conflict_index().find_conflict(
+            storage,
+            merged['room_id'],
+            merged['check_in_date'],
+            merged['check_out_date'],
+            exclude=current['id']
+        )
+        if conflict is not None:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'data': {'error': 'Room is already booked for these dates'}
+            }
+    
+    # Update booking
+    updated = storage.update('bookings', changes, {'id': booking_id})
+    
+    if not updated:
         return {
-            'statusCode': 400,
+            'statusCode': 404,
             'headers': headers,
-            'body': json.dumps({'error': 'Booking is already cancelled'})
+            'data': {'error': 'Booking not found'}
         }
     
-    if status == 'checked_out':
+    # Amount, dates or status may have changed, so recount and reindex
+    get_stats().invalidate()
+    get_conflict_index().invalidate()
+    get_occupancy_map().invalidate()
+    get_report_engine().bookings_changed([booking_id])
+    get_response_cache().invalidate('bookings', 'rooms')
+    publish_booking_changes('updated', updated)
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'data': updated[0]
+    }
+
+def handle_cancel_booking(params, headers):
+    """Cancel a booking"""
+    booking_id = params.get('id')
+    
+    if not booking_id:
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Cannot cancel a completed booking'})
+            'data': {'error': 'Booking ID is required'}
         }
     
-    # Cancel booking
-    supabase.table('bookings').update({'status': 'cancelled'}).eq('id', booking_id).execute()
-    
-    # Make room available again
-    supabase.table('rooms').update({'is_available': True}).eq('id', booking.data[0]['room_id']).execute()
+    # Booked reservations only; the room is released in the same transaction
+    try:
+        booking, room_released = transition(get_storage(), 'cancel', booking_id)
+    except TransitionError as e:
+        return {
+            'statusCode': e.status_code,
+            'headers': headers,
+            'data': {'error': str(e)}
+        }
+    get_conflict_index().booking_released(booking['room_id'], booking['id'])
+    get_occupancy_map().booking_released(booking['room_id'], booking['id'])
+    get_stats().booking_status_changed(booking, room_released)
+    get_report_engine().bookings_changed([booking['id']])
+    get_response_cache().invalidate('bookings', 'rooms')
+    publish_booking_changes(
+        'updated', [booking],
+        released=[booking['room_id']] if room_released else (),
+        recheck=[booking['room_id']] if room_released is None else ()
+    )
     
     return {
         'statusCode': 200,
         'headers': headers,
-        'body': json.dumps({'message': 'Booking cancelled successfully'})
+        'data': {'message': 'Booking cancelled successfully'}
     }
+
+def publish_booking_changes(operation, bookings, taken=(), released=(), recheck=()):
+    """Change events for bookings and the rooms they took or gave back
+
+    ``recheck`` rooms may or may not have come free; their current row is read.
+    """
+    feed = get_change_feed()
+    feed.publish('bookings', operation, bookings)
+    rooms = [{'id': room_id, 'is_available': False} for room_id in taken]
+    rooms.extend({'id': room_id, 'is_available': True} for room_id in released)
+    if recheck:
+        rooms.extend(get_storage().select('rooms', 'id, is_available', filters=[('id', 'in', list(recheck))]))
+    if rooms:
+        feed.publish('rooms', 'updated', rooms)
@@ -0,0 +1,135 @@
+import os
+import time
+from api.lib.events import get_change_feed
+from api.lib.hotels import for_hotel
+from api.lib.http import parse_event, to_vercel
+from api.lib.serialization import dumps
+
+# Seconds a stream stays open before the browser reconnects (with Last-Event-ID)
+STREAM_SECONDS = float(os.environ.get('EVENTS_STREAM_SECONDS', 300))
+# Comment line sent when idle, so proxies keep the connection and dead clients are noticed
+HEARTBEAT_SECONDS = 15
+# Reconnect delay the browser is told to use
+RETRY_MS = int(os.environ.get('EVENTS_RETRY_MS', 3000))
+
+def handler(event, context):
+    """Vercel serverless function handler for events endpoint"""
+    # No streaming responses there: send the backlog and let EventSource reconnect
+    method, params, body, headers = parse_event(event)
+    return to_vercel(dispatch(method, {**params, 'wait': '0'}, body, headers))
+
+@for_hotel
+def dispatch(method, query_params, body, request_headers=None):
+    """Change events as a Server-Sent Events stream, or the delta since an event"""
+
+    # CORS headers
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization, Last-Event-ID',
+        'Content-Type': 'application/json',
+        'Cache-Control': 'no-store'
+    }
+
+    # Handle OPTIONS for CORS
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'data': None
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': headers,
+            'data': {'error': 'Method not allowed'}
+        }
+
+    if 'updated_since' in query_params:
+        return handle_delta(query_params, headers)
+    return handle_stream(query_params, headers, request_headers or {})
+
+def handle_delta(params, headers):
+    """Events after ``updated_since``; ``reset`` when they are no longer known"""
+    feed = get_change_feed()
+    position = feed.position
+    since = params.get('updated_since')
+    # An empty id asks for the current position only
+    seq = feed.parse(since) if since else position
+    events = feed.since(seq) if seq is not None else None
+
+    if events is None:
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'data': {'events': [], 'last_event_id': feed.event_id(position), 'reset': True}
+        }
+
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'data': {
+            'events': [event for _, event in events],
+            'last_event_id': feed.event_id(events[-1][0] if events else seq),
+            'reset': False
+        }
+    }
+
+def handle_stream(params, headers, request_headers):
+    """``text/event-stream`` of change events, resuming after Last-Event-ID"""
+    try:
+        wait = min(float(params.get('wait', STREAM_SECONDS)), STREAM_SECONDS)
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'data': {'error': 'wait must be a number of seconds'}
+        }
+
+    resume = request_headers.get('last-event-id') or params.get('last_event_id')
+    return {
+        'statusCode': 200,
+        'headers': {
+            **headers,
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            # Stop nginx-style proxies from buffering the stream
+            'X-Accel-Buffering': 'no'
+        },
+        'stream': event_stream(get_change_feed(), resume, wait)
+    }
+
+def sse(event, event_id, data):
+    return f'id: {event_id}\nevent: {event}\ndata: {dumps(data)}\n\n'
+
+def event_stream(feed, resume, wait):
+    """Backlog after ``resume``, then live events until ``wait`` seconds have passed"""
+    feed.stream_opened()
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        seq = feed.parse(resume) if resume else None
+        backlog = feed.since(seq) if seq is not None else None
+        if backlog is None:
+            # New client, or one whose position is gone: start from now
+            seq = feed.position
+            yield sse('reset' if resume else 'ready', feed.event_id(seq), {})
+            backlog = []
+
+        deadline = time.monotonic() + wait
+        while True:
+            if backlog is None:
+                seq = feed.position
+                yield sse('reset', feed.event_id(seq), {})
+                backlog = []
+            for seq, event in backlog:
+                yield sse('change', event['id'], event)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            backlog = feed.wait(seq, min(HEARTBEAT_SECONDS, remaining))
+            if backlog == []:
+                yield ': keep-alive\n\n'
+    finally:
+        feed.stream_closed()
@@ -1,36 +1,35 @@
-from supabase import create_client, Client
-from marshmallow import Schema, fields, ValidationError
-import os
-import json
+from api.lib.aggregates import get_stats
+from api.lib import batch
+from api.lib.cache import get_response_cache
+from api.lib.events import get_change_feed
+from api.lib.export import EXPORT_PAGE_SIZE, export_columns, export_response
+from api.lib.membership import get_known_keys
+from api.lib.pagination import (
+    InvalidCursor, decode_cursor, drop_columns, encode_cursor, list_page, scan, with_cursor_columns
+)
+from api.lib.projection import InvalidFields, parse_projection
+from api.lib.search import get_guest_index
+from api.lib.storage import UniqueViolation, get_storage
+from api.lib.hotels import for_hotel
+from api.lib.idempotency import idempotent
+from api.lib.http import parse_event, to_vercel
+from api.lib.validation import LazySchema, ValidationError
 
-# Validation schema
-class GuestSchema(Schema):
-    name = fields.Str(required=True)
-    email = fields.Email(required=True)
-    phone = fields.Str(required=True)
-    address = fields.Str(allow_none=True)
-    id_proof = fields.Str(allow_none=True)
+# Validation schema (marshmallow is imported on first use)
+guest_schema = LazySchema('GuestSchema')
 
-guest_schema = GuestSchema()
-
-# Lazy initialization of Supabase client
-_supabase_client = None
-
-def get_supabase():
-    """Get or create Supabase client"""
-    global _supabase_client
-    if _supabase_client is None:
-        _supabase_client = create_client(
-            os.environ.get('SUPABASE_URL'),
-            os.environ.get('SUPABASE_SERVICE_KEY')
-        )
-    return _supabase_client
+# Type-ahead suggestions per request
+SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 50
 
 def handler(event, context):
     """Vercel serverless function handler for guests endpoint"""
-    # Parse the request
-    method = event.get('httpMethod', event.get('method', 'GET'))
-    query_params = event.get('queryStringParameters', {}) or {}
+    return to_vercel(dispatch(*parse_event(event)))
+
+@for_hotel
+@idempotent
+def dispatch(method, query_params, body, request_headers=None):
+    """Route a parsed request to the matching guests handler"""
     
     # CORS headers
     headers = {
@@ -45,14 +44,19 @@ def handler(event, context):
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': ''
+            'data': None
         }
     
     try:
         if method == 'GET':
-            return handle_get_guests(query_params, headers)
+            if query_params.get('action') == 'suggest':
+                return handle_suggest_guests(query_params, headers)
+            if query_params.get('action') == 'export':
+                return handle_export_guests(query_params, headers)
+            return handle_get_guests(query_params, headers, request_headers)
         elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
+            if isinstance(body, list):
+                return handle_create_guests_batch(body, headers)
             return handle_create_guest(body, headers)
         elif method == 'DELETE':
             return handle_delete_guest(query_params, headers)
@@ -60,7 +64,7 @@ def handler(event, context):
             return {
                 'statusCode': 405,
                 'headers': headers,
-                'body': json.dumps({'error': 'Method not allowed'})
+                'data': {'error': 'Method not allowed'}
             }
     except Exception as e:
         print(f'Guests API Error: {str(e)}')
@@ -69,87 +73,212 @@ def handler(event, context):
         return {
             'statusCode': 500,
             'headers': headers,
-            'body': json.dumps({'error': 'Internal server error', 'details': str(e)})
+            'data': {'error': 'Internal server error', 'details': str(e)}
         }
 
-def handle_get_guests(params, headers):
+def handle_get_guests(params, headers, request_headers=None):
     """Get all guests with optional filtering"""
-    supabase = get_supabase()
     skip = int(params.get('skip', 0))
     limit = int(params.get('limit', 100))
     search = params.get('search', '')
+    cursor = params.get('cursor')
     
-    query = supabase.table('guests').select('*')
+    # Served from the response cache until a guest write
+    cache = get_response_cache()
+    try:
+        columns = parse_projection('guests', params).columns
+        key = (skip, limit, cursor, search.lower(), columns)
+        if search:
+            # Ranked matches come from the in-process trigram index
+            entry = cache.fetch('guests', key, lambda: search_guests(get_storage(), search, limit, skip, cursor, columns))
+        else:
+            entry = cache.fetch('guests', key, lambda: list_page(get_storage(), 'guests', limit, skip, cursor, columns))
+    except (InvalidCursor, InvalidFields) as e:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'data': {'error': str(e)}
+        }
     
-    if search:
-        query = query.or_(f'name.ilike.%{search}%,email.ilike.%{search}%,phone.ilike.%{search}%')
+    return cache.respond(entry, headers, request_headers)
+
+def search_guests(storage, search, limit, skip=0, cursor=None, columns='*'):
+    """One page of search results, ranked unless paging by cursor"""
+    docs = get_guest_index().search(storage, search)
+    
+    if cursor is None:
+        page = docs[skip:skip + limit]
+    else:
+        # Cursor pages follow the list order so they stay stable under inserts
+        docs = sorted(docs, key=lambda doc: (doc.created_at, doc.id), reverse=True)
+        if cursor:
+            after = decode_cursor(cursor)
+            docs = [doc for doc in docs if (doc.created_at, doc.id) < after]
+        page = docs[:limit + 1]
     
-    response = query.range(skip, skip + limit - 1).order('created_at', desc=True).execute()
+    ids = [doc.id for doc in page[:limit]]
+    fetch, added = with_cursor_columns(columns) if cursor is not None else (columns, ())
+    rows = {row['id']: row for row in batch.select_in(storage, 'guests', fetch, 'id', ids)}
+    items = [rows[guest_id] for guest_id in ids if guest_id in rows]
+    
+    if cursor is None:
+        return items
+    return {
+        'items': drop_columns(items, added),
+        'next_cursor': encode_cursor(items[-1]) if len(page) > limit and items else None
+    }
+
+def handle_export_guests(params, headers):
+    """Stream every guest, or every search match, as CSV or NDJSON"""
+    storage = get_storage()
+    search = params.get('search', '')
+
+    if search:
+        rows = search_rows(storage, search, EXPORT_PAGE_SIZE)
+    else:
+        rows = scan(storage, 'guests', page_size=EXPORT_PAGE_SIZE)
+
+    return export_response(rows, params.get('format', 'csv'), export_columns('guests'), 'guests', headers)
+
+def search_rows(storage, search, page_size):
+    """Yield the guests matching ``search`` in ``id`` order, a page at a time"""
+    ids = sorted(doc.id for doc in get_guest_index().search(storage, search))
+    for start in range(0, len(ids), page_size):
+        yield from batch.select_in(storage, 'guests', '*', 'id', ids[start:start + page_size])
+
+def handle_suggest_guests(params, headers):
+    """Top guest matches for type-ahead, answered from the search index"""
+    query = params.get('q', '')
+    limit = min(int(params.get('limit', SUGGEST_LIMIT)), MAX_SUGGEST_LIMIT)
     
     return {
         'statusCode': 200,
         'headers': headers,
-        'body': json.dumps(response.data)
+        'data': get_guest_index().suggest(get_storage(), query, limit)
     }
 
 def handle_create_guest(data, headers):
     """Create a new guest"""
-    supabase = get_supabase()
+    storage = get_storage()
     try:
         # Validate input
         validated_data = guest_schema.load(data)
         
-        # Check if email already exists
-        existing = supabase.table('guests').select('id').eq('email', validated_data['email']).execute()
-        if existing.data:
-            return {
-                'statusCode': 400,
-                'headers': headers,
-                'body': json.dumps({'error': 'Guest with this email already exists'})
-            }
+        # Check if email already exists; emails never seen need no query
+        known = get_known_keys()
+        if not known.is_new(storage, 'guests', 'email', validated_data['email']):
+            return duplicate_email(headers)
         
-        # Create guest
-        response = supabase.table('guests').insert(validated_data).execute()
+        # Create guest; the unique constraint catches emails added elsewhere
+        try:
+            guest = storage.insert('guests', validated_data)[0]
+        except UniqueViolation:
+            return duplicate_email(headers)
+        known.added('guests', [guest])
+        get_stats().guest_created()
+        get_guest_index().guest_added(guest)
+        get_response_cache().invalidate('guests')
+        get_change_feed().publish('guests', 'created', [guest])
         
         return {
             'statusCode': 201,
             'headers': headers,
-            'body': json.dumps(response.data[0])
+            'data': guest
         }
     
     except ValidationError as e:
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Validation failed', 'details': e.messages})
+            'data': {'error': 'Validation failed', 'details': e.messages}
         }
 
+def duplicate_email(headers):
+    """400 for an email another guest has"""
+    return {
+        'statusCode': 400,
+        'headers': headers,
+        'data': {'error': 'Guest with this email already exists'}
+    }
+
+def handle_create_guests_batch(items, headers):
+    """Create many guests with one uniqueness check and one insert"""
+    storage = get_storage()
+    if len(items) > batch.MAX_BATCH_SIZE:
+        return batch.too_large(len(items), headers)
+    
+    results = [None] * len(items)
+    valid = []
+    
+    # Validate every item before touching the database
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, guest_schema.load(item)))
+        except ValidationError as e:
+            results[index] = batch.item_error(index, 'Validation failed', e.messages)
+    
+    # Emails must be unique against the table and within the batch
+    existing = {
+        row['email'] for row in
+        batch.select_in(storage, 'guests', 'email', 'email', [data['email'] for _, data in valid])
+    }
+    pending = []
+    for index, data in valid:
+        if data['email'] in existing:
+            results[index] = batch.item_error(index, 'Guest with this email already exists')
+        else:
+            existing.add(data['email'])
+            pending.append((index, data))
+    
+    # Emails taken by a concurrent request since the check fail their items only
+    inserted, rejected = batch.insert_unique(
+        storage, 'guests', 'email', pending, 'Guest with this email already exists'
+    )
+    for result in rejected:
+        results[result['index']] = result
+    created = [row for _, row in inserted]
+    if created:
+        for index, row in inserted:
+            results[index] = batch.item_created(index, row)
+        get_known_keys().added('guests', created)
+        get_stats().guest_created(count=len(created))
+        get_guest_index().guests_added(created)
+        get_response_cache().invalidate('guests')
+        get_change_feed().publish('guests', 'created', created)
+    
+    return batch.batch_response(results, headers)
+
 def handle_delete_guest(params, headers):
     """Delete a guest by ID"""
-    supabase = get_supabase()
+    storage = get_storage()
     guest_id = params.get('id')
     
     if not guest_id:
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Guest ID is required'})
+            'data': {'error': 'Guest ID is required'}
         }
     
-    # Check if guest has any bookings
-    bookings = supabase.table('bookings').select('id').eq('guest_id', guest_id).execute()
-    if bookings.data:
+    # Check if guest has any bookings; one row is enough to tell
+    if storage.exists('bookings', {'guest_id': guest_id}):
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Cannot delete guest with existing bookings'})
+            'data': {'error': 'Cannot delete guest with existing bookings'}
         }
     
     # Delete guest
-    supabase.table('guests').delete().eq('id', guest_id).execute()
+    deleted = storage.delete('guests', {'id': guest_id})
+    if deleted:
+        get_stats().guest_deleted()
+        get_guest_index().guest_removed(guest_id)
+        get_known_keys().removed('guests', deleted)
+        get_response_cache().invalidate('guests')
+        get_change_feed().publish('guests', 'deleted', [{'id': row['id']} for row in deleted])
     
     return {
         'statusCode': 200,
         'headers': headers,
-        'body': json.dumps({'message': 'Guest deleted successfully'})
+        'data': {'message': 'Guest deleted successfully'}
     }
@@ -1,7 +1,14 @@
 import os
-import json
+from api.lib.cache import get_response_cache
+from api.lib.hotels import for_hotel
+from api.lib.http import parse_event, to_vercel
 
 def handler(event, context):
+    """Vercel serverless function handler for health endpoint"""
+    return to_vercel(dispatch(*parse_event(event)))
+
+@for_hotel
+def dispatch(method, query_params, body, request_headers=None):
     """Simple health check endpoint to verify environment variables"""
     
     headers = {
@@ -13,11 +20,13 @@ def handler(event, context):
     env_check = {
         'SUPABASE_URL': 'SET' if os.environ.get('SUPABASE_URL') else 'MISSING',
         'SUPABASE_SERVICE_KEY': 'SET' if os.environ.get('SUPABASE_SERVICE_KEY') else 'MISSING',
+        'STORAGE_BACKEND': os.environ.get('STORAGE_BACKEND', 'supabase'),
+        'cache': get_response_cache().stats(),
         'status': 'ok'
     }
     
     return {
         'statusCode': 200,
         'headers': headers,
-        'body': json.dumps(env_check)
+        'data': env_check
     }
@@ -0,0 +1,323 @@
+"""Server-side rate limits and load shedding for the Flask app
+
+Every API request falls in a class by route and method:
+
+* ``read`` - cheap GETs answered from caches and in-process indexes
+* ``heavy`` - booking lists (joins), guest search, reports, batches and sweeps
+* ``export`` - streamed CSV / NDJSON exports
+* ``events`` - ``/api/events`` Server-Sent Events streams
+* ``write`` - POST, PUT and DELETE
+
+Each client address has a token bucket per class, refilled at the class
+rate up to its burst. Bucket state is kept in a small SQLite file in the
+temp directory and updated with one atomic statement per request, so all
+worker processes on the host draw from the same buckets
+(``RATE_LIMIT_STORE=memory`` keeps them per process instead).
+
+``heavy`` and ``export`` requests are also capped in flight per process. A
+request over the cap waits up to ``ADMISSION_WAIT_MS`` for a slot and is
+then shed. An event stream stays open for minutes, so ``events`` is capped
+per client instead, for the life of the stream, and a stream over the cap is
+refused at once (the browser falls back to polling). Every refusal is ``429``
+with ``Retry-After``. Cheap reads have their own bucket and no cap, so they
+keep flowing while heavy work is shed.
+
+``RATE_LIMIT=off`` turns both off. The serverless entry points are not
+limited here; Vercel fronts them.
+"""
+import math
+import os
+import threading
+import time
+
+from api.lib import registry
+
+# class -> (tokens per second, burst); override with e.g. RATE_LIMIT_HEAVY=5,20
+DEFAULT_RATES = {
+    'read': (20.0, 60.0),
+    'heavy': (5.0, 20.0),
+    'export': (0.2, 3.0),
+    'events': (0.5, 5.0),
+    'write': (5.0, 20.0),
+}
+
+# class -> requests in flight per process; override with e.g. MAX_CONCURRENT_HEAVY=8
+DEFAULT_CONCURRENCY = {
+    'heavy': 8,
+    'export': 2,
+}
+
+# class -> requests in flight per client address; override with e.g. MAX_CONCURRENT_EVENTS_PER_CLIENT=3
+DEFAULT_CLIENT_CONCURRENCY = {
+    'events': 3,
+}
+
+WAIT_SECONDS = float(os.environ.get('ADMISSION_WAIT_MS', 250)) / 1000
+
+# GET routes whose cost grows with the data; other GETs are ``read``
+HEAVY_READS = {'/api/bookings', '/api/reports/occupancy', '/api/reports/pickup'}
+
+# Monitoring must still answer when everything else is being refused
+EXEMPT_ROUTES = {'/api/health', '/api/metrics'}
+
+WRITE_METHODS = ('POST', 'PUT', 'DELETE')
+
+# Idle buckets are full again long before this; the memory store drops them
+IDLE_SECONDS = 600
+
+
+class Refused(Exception):
+    """Raised when a request is over its rate or its class is saturated"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def classify(route, method, params):
+    """Limit class of a request"""
+    if route.endswith('/export'):
+        return 'export'
+    if route in ('/api/batch', '/api/sweeps'):
+        return 'heavy'
+    # Polling with ?updated_since= is a plain read
+    if route == '/api/events' and method == 'GET' and 'updated_since' not in params:
+        return 'events'
+    if method in WRITE_METHODS:
+        return 'write'
+    if route in HEAVY_READS or (route == '/api/guests' and params.get('search')):
+        return 'heavy'
+    return 'read'
+
+
+def parse_rate(value, default):
+    """``'5,20'`` -> ``(5.0, 20.0)``"""
+    if not value:
+        return default
+    rate, _, burst = value.partition(',')
+    return float(rate), float(burst or rate)
+
+
+class MemoryBuckets:
+    """Token buckets in this process only"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._pruned = time.time()
+
+    def take(self, key, rate, burst, now):
+        """Take a token; returns ``(granted, tokens left)``"""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            granted = tokens >= 1
+            if granted:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if now - self._pruned > IDLE_SECONDS:
+                self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < IDLE_SECONDS}
+                self._pruned = now
+            return granted, tokens
+
+
+# Refill, then take a token if there is one, in a single statement. The
+# right-hand sides all see the old row, so granted and tokens agree.
+TAKE_SQL = """
+INSERT INTO buckets (key, tokens, updated, granted) VALUES (:key, :burst - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    granted = min(:burst, tokens + max(0.0, :now - updated) * :rate) >= 1,
+    tokens = min(:burst, tokens + max(0.0, :now - updated) * :rate)
+             - (min(:burst, tokens + max(0.0, :now - updated) * :rate) >= 1),
+    updated = max(updated, :now)
+RETURNING granted, tokens
+"""
+
+
+class SQLiteBuckets:
+    """Token buckets in a SQLite file shared by every process on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._pruned = time.time()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            import sqlite3
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            # Losing buckets in a crash only resets some limits
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, granted INTEGER NOT NULL'
+                ') WITHOUT ROWID'
+            )
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, rate, burst, now):
+        """Take a token; returns ``(granted, tokens left)``"""
+        connection = self._connection()
+        granted, tokens = connection.execute(
+            TAKE_SQL, {'key': key, 'rate': rate, 'burst': burst, 'now': now}
+        ).fetchone()
+        if now - self._pruned > IDLE_SECONDS:
+            self._pruned = now
+            connection.execute('DELETE FROM buckets WHERE updated < ?', (now - IDLE_SECONDS,))
+        return bool(granted), tokens
+
+
+def create_store():
+    target = os.environ.get('RATE_LIMIT_STORE', '')
+    if target == 'memory':
+        return MemoryBuckets()
+    if not target:
+        import tempfile
+        target = os.path.join(tempfile.gettempdir(), 'hotel-ratelimit.db')
+    return SQLiteBuckets(target)
+
+
+registry.register('rate_limit_store', create_store)
+
+
+class Ticket:
+    """Held while an admitted request runs; frees its concurrency slot once"""
+
+    __slots__ = ('_slot',)
+
+    def __init__(self, slot=None):
+        self._slot = slot
+
+    def release(self):
+        slot, self._slot = self._slot, None
+        if slot is not None:
+            slot.release()
+
+
+class ClientSlot:
+    """One of a client's slots in a class, given back to its :class:`ClientSlots`"""
+
+    __slots__ = ('_slots', '_client')
+
+    def __init__(self, slots, client):
+        self._slots = slots
+        self._client = client
+
+    def release(self):
+        self._slots.release(self._client)
+
+
+class ClientSlots:
+    """At most ``limit`` requests in flight per client address"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._held = {}
+
+    def acquire(self, client):
+        """A :class:`ClientSlot`, or None when the client is at its limit"""
+        with self._lock:
+            held = self._held.get(client, 0)
+            if held >= self.limit:
+                return None
+            self._held[client] = held + 1
+        return ClientSlot(self, client)
+
+    def release(self, client):
+        with self._lock:
+            held = self._held.pop(client, 0) - 1
+            if held > 0:
+                self._held[client] = held
+
+    def in_flight(self):
+        with self._lock:
+            return sum(self._held.values())
+
+
+class Admission:
+    """Decides whether a request runs now, and keeps count of refusals"""
+
+    def __init__(self, rates=None, concurrency=None, client_concurrency=None, wait=WAIT_SECONDS, enabled=True):
+        self.rates = rates or {
+            name: parse_rate(os.environ.get(f'RATE_LIMIT_{name.upper()}'), default)
+            for name, default in DEFAULT_RATES.items()
+        }
+        concurrency = concurrency or {
+            name: int(os.environ.get(f'MAX_CONCURRENT_{name.upper()}', default))
+            for name, default in DEFAULT_CONCURRENCY.items()
+        }
+        self.limits = concurrency
+        self._slots = {name: threading.BoundedSemaphore(limit) for name, limit in concurrency.items() if limit > 0}
+        client_concurrency = client_concurrency or {
+            name: int(os.environ.get(f'MAX_CONCURRENT_{name.upper()}_PER_CLIENT', default))
+            for name, default in DEFAULT_CLIENT_CONCURRENCY.items()
+        }
+        self._client_slots = {name: ClientSlots(limit) for name, limit in client_concurrency.items() if limit > 0}
+        self.wait = wait
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.limited = 0
+        self.shed = 0
+        self.store_errors = 0
+
+    def admit(self, client, route, method, params):
+        """Return a :class:`Ticket` to release when done, or raise :class:`Refused`"""
+        if not self.enabled or method == 'OPTIONS' or route in EXEMPT_ROUTES:
+            return Ticket()
+        kind = classify(route, method, params)
+
+        rate, burst = self.rates[kind]
+        try:
+            granted, tokens = registry.get('rate_limit_store').take(f'{client}|{kind}', rate, burst, time.time())
+        except Exception as e:
+            # The limiter must not take the API down with it
+            print(f'Rate limit store error: {e}')
+            with self._lock:
+                self.store_errors += 1
+            granted, tokens = True, 0.0
+        if not granted:
+            with self._lock:
+                self.limited += 1
+            raise Refused(f'Too many {kind} requests', max(1, math.ceil((1 - tokens) / rate)))
+
+        client_slots = self._client_slots.get(kind)
+        if client_slots is not None:
+            slot = client_slots.acquire(client)
+            if slot is None:
+                with self._lock:
+                    self.shed += 1
+                raise Refused(f'Too many open {kind} streams', 1)
+            return Ticket(slot)
+
+        slot = self._slots.get(kind)
+        if slot is None:
+            return Ticket()
+        if not slot.acquire(timeout=self.wait):
+            with self._lock:
+                self.shed += 1
+            raise Refused(f'Server busy with {kind} requests', 1)
+        return Ticket(slot)
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            stats = {'limited': self.limited, 'shed': self.shed, 'store_errors': self.store_errors}
+        for name, limit in self.limits.items():
+            slot = self._slots.get(name)
+            # BoundedSemaphore keeps the free count in _value
+            stats[f'in_flight_{name}'] = limit - slot._value if slot is not None else 0
+        for name, slots in self._client_slots.items():
+            stats[f'in_flight_{name}'] = slots.in_flight()
+        return stats
+
+
+_admission = Admission(enabled=os.environ.get('RATE_LIMIT', 'on') != 'off')
+
+
+def get_admission():
+    """Process-wide admission control"""
+    return _admission
@@ -0,0 +1,127 @@
+"""Dashboard counters kept up to date by the write handlers"""
+import os
+import threading
+import time
+
+from api.lib.concurrency import gather
+from api.lib.hotels import PerHotel
+from api.lib.storage.schema import BOOKING_EMBED
+
+ACTIVE_STATUSES = ('booked', 'checked_in')
+RECENT_BOOKINGS = 5
+
+# Counters older than this are rebuilt from the database on the next read.
+# Writes served by another process (e.g. a separate serverless function)
+# are only picked up by that recompute.
+MAX_AGE = float(os.environ.get('STATS_MAX_AGE', 300))
+
+
+class DashboardStats:
+    """Running totals for the dashboard cards"""
+
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self.total_guests = 0
+        self.total_rooms = 0
+        self.available_rooms = 0
+        self.active_bookings = 0
+        self.total_revenue = 0.0
+        self.recent_bookings = []
+
+    def is_stale(self):
+        """Whether the counters need a full recompute"""
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age
+
+    def invalidate(self):
+        """Force a full recompute on the next read"""
+        with self._lock:
+            self._loaded_at = None
+
+    def snapshot(self, storage):
+        """Return the current stats, recomputing them first if needed"""
+        if self.is_stale():
+            self.recompute(storage)
+
+        with self._lock:
+            occupied = self.total_rooms - self.available_rooms
+            occupancy_rate = round(occupied / self.total_rooms * 100) if self.total_rooms > 0 else 0
+            return {
+                'total_guests': self.total_guests,
+                'total_rooms': self.total_rooms,
+                'available_rooms': self.available_rooms,
+                'active_bookings': self.active_bookings,
+                'total_revenue': round(self.total_revenue, 2),
+                'occupancy_rate': occupancy_rate,
+                'recent_bookings': [dict(b) for b in self.recent_bookings]
+            }
+
+    def recompute(self, storage):
+        """Rebuild every counter from the database, the queries overlapped"""
+        total_guests, total_rooms, available_rooms, active_bookings, total_revenue, recent = gather(
+            lambda: storage.count('guests'),
+            lambda: storage.count('rooms'),
+            lambda: storage.count('rooms', {'is_available': True}),
+            lambda: storage.count('bookings', {'status': list(ACTIVE_STATUSES)}),
+            lambda: storage.sum('bookings', 'total_amount'),
+            lambda: storage.select('bookings', embed=BOOKING_EMBED, order='-created_at', limit=RECENT_BOOKINGS)
+        )
+
+        with self._lock:
+            self.total_guests = total_guests
+            self.total_rooms = total_rooms
+            self.available_rooms = available_rooms
+            self.active_bookings = active_bookings
+            self.total_revenue = total_revenue
+            self.recent_bookings = recent
+            self._loaded_at = time.monotonic()
+
+    # Incremental updates called by the write handlers
+
+    def guest_created(self, count=1):
+        with self._lock:
+            self.total_guests += count
+
+    def guest_deleted(self):
+        with self._lock:
+            self.total_guests = max(self.total_guests - 1, 0)
+
+    def room_created(self, is_available=True, count=1):
+        with self._lock:
+            self.total_rooms += count
+            if is_available:
+                self.available_rooms += count
+
+    def booking_created(self, booking):
+        """A new booking takes its room off the market"""
+        with self._lock:
+            self.active_bookings += 1
+            self.total_revenue += booking.get('total_amount') or 0
+            self.available_rooms = max(self.available_rooms - 1, 0)
+            # A copy: the caller's dict is also the response body
+            self.recent_bookings = [dict(booking)] + self.recent_bookings[:RECENT_BOOKINGS - 1]
+
+    def booking_status_changed(self, booking, room_released=False):
+        """Track check-in, check-out and cancellation of the updated ``booking``; ``room_released`` is None when unknown"""
+        with self._lock:
+            if booking['status'] not in ACTIVE_STATUSES:
+                self.active_bookings = max(self.active_bookings - 1, 0)
+            if room_released:
+                self.available_rooms = min(self.available_rooms + 1, self.total_rooms)
+            elif room_released is None:
+                # Only a recount can tell whether the room came free
+                self._loaded_at = None
+            # The updated row has no guest or room; keep the ones already embedded
+            self.recent_bookings = [
+                {**recent, **booking} if str(recent.get('id')) == str(booking['id']) else recent
+                for recent in self.recent_bookings
+            ]
+
+
+_stats = PerHotel(DashboardStats)
+
+
+def get_stats():
+    """Return the current property's dashboard aggregates"""
+    return _stats.get()
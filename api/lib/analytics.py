@@ -0,0 +1,340 @@
+"""Columnar occupancy and revenue analytics for the reports endpoints
+
+Bookings are loaded once into NumPy columns. Each stay is expanded into one
+row per night (check-in up to, not including, check-out; day-use stays count
+one night) with its amount spread evenly over those nights. The nightly
+rooms sold and revenue per room type are kept as dense day series, so
+occupancy, ADR and RevPAR for any range are slices and sums.
+
+Writes mark booking ids as changed. The next report refetches just those
+bookings and recomputes only the days their old and new stays cover. A full
+reload happens after ``ANALYTICS_TTL`` seconds to pick up writes from other
+processes.
+
+Inventory is the current room count for every day in the range.
+"""
+import os
+import threading
+import time
+from datetime import date
+
+from api.lib import batch
+from api.lib.hotels import PerHotel
+from api.lib.intervals import to_day
+from api.lib.pagination import scan
+
+REPORT_TTL = float(os.environ.get('ANALYTICS_TTL', 900))
+
+# Cancelled stays neither occupy a room nor earn revenue
+COUNTED_STATUSES = ('booked', 'checked_in', 'checked_out')
+
+BOOKING_COLUMNS = 'id, room_id, check_in_date, check_out_date, total_amount, status, created_at'
+
+GROUPS = ('day', 'week', 'room_type')
+MAX_PICKUP_DAYS = 365
+
+
+def _numpy():
+    import numpy
+    return numpy
+
+
+def expand_nights(starts, nights):
+    """Per-night rows for stays: ``(owner index, day)`` arrays"""
+    np = _numpy()
+    owner = np.repeat(np.arange(len(nights)), nights)
+    first_row = np.repeat(np.cumsum(nights) - nights, nights)
+    return owner, starts[owner] + (np.arange(len(owner)) - first_row)
+
+
+def ratio(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else 0.0
+
+
+def metrics(available, sold, revenue):
+    """Occupancy, ADR and RevPAR from room-nights and revenue"""
+    # Plain Python numbers so the result serializes like any other response
+    available, sold, revenue = int(available), int(sold), float(revenue)
+    return {
+        'rooms_available': available,
+        'rooms_sold': sold,
+        'revenue': round(revenue, 2),
+        'occupancy': ratio(sold, available),
+        'adr': round(revenue / sold, 2) if sold else 0.0,
+        'revpar': round(revenue / available, 2) if available else 0.0
+    }
+
+
+class ReportEngine:
+    """Bookings as columns plus nightly sold/revenue series per room type"""
+
+    def __init__(self, ttl=REPORT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._dirty_ids = set()
+        self._rooms_dirty = False
+        self.full_loads = 0
+        self.incremental_refreshes = 0
+        self.days_recomputed = 0
+
+    # Write hooks
+
+    def bookings_changed(self, booking_ids):
+        with self._lock:
+            self._dirty_ids.update(int(booking_id) for booking_id in booking_ids)
+
+    def rooms_changed(self):
+        with self._lock:
+            self._rooms_dirty = True
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    # Reports
+
+    def occupancy(self, storage, start, end, group='day'):
+        """Occupancy, ADR and RevPAR for ``[start, end]`` grouped by day, week or room type"""
+        np = _numpy()
+        self._refresh(storage)
+        first, last = to_day(start), to_day(end)
+
+        with self._lock:
+            sold, revenue = self._window(first, last)
+            inventory = self._inventory
+            type_names = list(self._type_names)
+
+        days = last - first + 1
+        total = metrics(inventory.sum() * days, sold.sum(), revenue.sum())
+
+        if group == 'room_type':
+            series = [
+                dict(room_type=name, **metrics(inventory[index] * days, sold[index].sum(), revenue[index].sum()))
+                for index, name in enumerate(type_names) if inventory[index] or sold[index].any()
+            ]
+        else:
+            day_numbers = np.arange(first, last + 1)
+            if group == 'week':
+                # Ordinal day 1 was a Monday, so this is the week's Monday
+                keys = day_numbers - (day_numbers - 1) % 7
+            else:
+                keys = day_numbers
+            periods, inverse = np.unique(keys, return_inverse=True)
+            sold_by = np.bincount(inverse, weights=sold.sum(axis=0), minlength=len(periods))
+            revenue_by = np.bincount(inverse, weights=revenue.sum(axis=0), minlength=len(periods))
+            days_by = np.bincount(inverse, minlength=len(periods))
+            series = [
+                dict(period=date.fromordinal(int(period)).isoformat(),
+                     **metrics(inventory.sum() * days_by[i], sold_by[i], revenue_by[i]))
+                for i, period in enumerate(periods)
+            ]
+
+        return {
+            'start': date.fromordinal(first).isoformat(),
+            'end': date.fromordinal(last).isoformat(),
+            'group': group,
+            'rooms': int(inventory.sum()),
+            'totals': total,
+            'series': series
+        }
+
+    def pickup(self, storage, start, end, max_days=90):
+        """Room-nights and revenue on the books for ``[start, end]`` N days before each night"""
+        np = _numpy()
+        self._refresh(storage)
+        first, last = to_day(start), to_day(end)
+        max_days = min(max_days, MAX_PICKUP_DAYS)
+
+        with self._lock:
+            mask = (self._starts <= last) & (self._starts + self._nights > first)
+            starts, nights = self._starts[mask], self._nights[mask]
+            rates, created = self._rates[mask], self._created[mask]
+            inventory = int(self._inventory.sum())
+
+        owner, days = expand_nights(starts, nights)
+        inside = (days >= first) & (days <= last)
+        owner, days = owner[inside], days[inside]
+        lead = np.clip(days - created[owner], 0, max_days)
+
+        # Nights booked at least d days ahead = sum of the histogram from d up
+        sold = np.bincount(lead, minlength=max_days + 1)[::-1].cumsum()[::-1]
+        revenue = np.bincount(lead, weights=rates[owner], minlength=max_days + 1)[::-1].cumsum()[::-1]
+        available = inventory * (last - first + 1)
+
+        return {
+            'start': date.fromordinal(first).isoformat(),
+            'end': date.fromordinal(last).isoformat(),
+            'rooms': inventory,
+            'curve': [
+                dict(days_before=d, **metrics(available, sold[d], revenue[d]))
+                for d in range(max_days, -1, -1)
+            ]
+        }
+
+    # Loading and incremental refresh
+
+    def _refresh(self, storage):
+        with self._lock:
+            stale = self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+            dirty_ids = set(self._dirty_ids)
+            rooms_dirty = self._rooms_dirty
+
+        if stale:
+            self._load(storage)
+            return
+        if rooms_dirty:
+            rooms = list(scan(storage, 'rooms', 'id, room_type'))
+            with self._lock:
+                self._rooms_dirty = False
+                self._set_rooms(rooms)
+                self._recompute(self._origin, self._origin + self._sold.shape[1])
+        if dirty_ids:
+            rows = batch.select_in(storage, 'bookings', BOOKING_COLUMNS, 'id', dirty_ids)
+            with self._lock:
+                self._dirty_ids -= dirty_ids
+                self._apply_changes(dirty_ids, rows)
+                self.incremental_refreshes += 1
+
+    def _load(self, storage):
+        rooms = list(scan(storage, 'rooms', 'id, room_type'))
+        rows = list(scan(storage, 'bookings', BOOKING_COLUMNS, [('status', 'in', list(COUNTED_STATUSES))]))
+        np = _numpy()
+
+        with self._lock:
+            self._dirty_ids.clear()
+            self._rooms_dirty = False
+            self._set_rooms(rooms)
+            self._set_bookings(*self._columns(rows))
+            span_start = int(self._starts.min()) if len(self._starts) else date.today().toordinal()
+            span_end = int((self._starts + self._nights).max()) if len(self._starts) else span_start + 1
+            self._origin = span_start
+            self._sold = np.zeros((len(self._type_names), span_end - span_start))
+            self._revenue = np.zeros_like(self._sold)
+            self._recompute(span_start, span_end)
+            self._loaded_at = time.monotonic()
+            self.full_loads += 1
+
+    def _set_rooms(self, rooms):
+        np = _numpy()
+        names = sorted({room['room_type'] for room in rooms})
+        self._type_names = names
+        codes = {name: index for index, name in enumerate(names)}
+        self._room_types = {room['id']: codes[room['room_type']] for room in rooms}
+        self._inventory = np.bincount([codes[room['room_type']] for room in rooms], minlength=len(names))
+
+    def _columns(self, rows):
+        np = _numpy()
+        rows = [row for row in rows if row['status'] in COUNTED_STATUSES]
+        starts = np.array([to_day(row['check_in_date']) for row in rows], dtype=np.int64)
+        ends = np.array([to_day(row['check_out_date']) for row in rows], dtype=np.int64)
+        nights = np.maximum(ends - starts, 1)
+        amounts = np.array([row['total_amount'] or 0 for row in rows], dtype=float)
+        return (
+            np.array([row['id'] for row in rows], dtype=np.int64),
+            np.array([row['room_id'] for row in rows], dtype=np.int64),
+            starts,
+            nights,
+            amounts / nights,
+            np.array([to_day(row['created_at']) for row in rows], dtype=np.int64)
+        )
+
+    def _set_bookings(self, ids, room_ids, starts, nights, rates, created):
+        self._ids, self._room_ids, self._starts = ids, room_ids, starts
+        self._nights, self._rates, self._created = nights, rates, created
+
+    def _apply_changes(self, changed_ids, rows):
+        """Swap in fresh copies of ``changed_ids`` and recompute the days they cover"""
+        np = _numpy()
+        old = np.isin(self._ids, list(changed_ids))
+        spans = [(int(s), int(s + n)) for s, n in zip(self._starts[old], self._nights[old])]
+
+        fresh = self._columns(rows)
+        spans += [(int(s), int(s + n)) for s, n in zip(fresh[2], fresh[3])]
+        keep = ~old
+        current = (self._ids, self._room_ids, self._starts, self._nights, self._rates, self._created)
+        self._set_bookings(*(np.concatenate([column[keep], new]) for column, new in zip(current, fresh)))
+
+        if not spans:
+            return
+        lo = min(start for start, _ in spans)
+        hi = max(end for _, end in spans)
+        self._grow(lo, hi)
+        # Merge overlapping spans so each day is recomputed at most once
+        spans.sort()
+        merged = [list(spans[0])]
+        for start, end in spans[1:]:
+            if start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        for start, end in merged:
+            self._recompute(start, end)
+
+    def _grow(self, lo, hi):
+        np = _numpy()
+        before = max(self._origin - lo, 0)
+        after = max(hi - (self._origin + self._sold.shape[1]), 0)
+        if before or after:
+            self._sold = np.pad(self._sold, ((0, 0), (before, after)))
+            self._revenue = np.pad(self._revenue, ((0, 0), (before, after)))
+            self._origin -= before
+
+    def _recompute(self, lo, hi):
+        """Rebuild the nightly series for days ``[lo, hi)`` from the booking columns"""
+        np = _numpy()
+        if self._sold.shape[0] != len(self._type_names):
+            self._sold = np.zeros((len(self._type_names), self._sold.shape[1]))
+            self._revenue = np.zeros_like(self._sold)
+            lo, hi = self._origin, self._origin + self._sold.shape[1]
+
+        width = hi - lo
+        self._sold[:, lo - self._origin:hi - self._origin] = 0
+        self._revenue[:, lo - self._origin:hi - self._origin] = 0
+        self.days_recomputed += width
+
+        mask = (self._starts < hi) & (self._starts + self._nights > lo)
+        owner, days = expand_nights(self._starts[mask], self._nights[mask])
+        inside = (days >= lo) & (days < hi)
+        owner, days = owner[inside], days[inside]
+        if not len(owner):
+            return
+
+        types = np.array([self._room_types.get(int(room_id), -1) for room_id in self._room_ids[mask]], dtype=np.int64)
+        night_types = types[owner]
+        known = night_types >= 0
+        cells = night_types[known] * width + (days[known] - lo)
+        size = len(self._type_names) * width
+        sold = np.bincount(cells, minlength=size).reshape(len(self._type_names), width)
+        revenue = np.bincount(cells, weights=self._rates[mask][owner][known], minlength=size)
+        self._sold[:, lo - self._origin:hi - self._origin] = sold
+        self._revenue[:, lo - self._origin:hi - self._origin] = revenue.reshape(len(self._type_names), width)
+
+    def _window(self, first, last):
+        """Copies of the per-type series for days ``[first, last]``, zero outside the data"""
+        np = _numpy()
+        width = last - first + 1
+        sold = np.zeros((len(self._type_names), width))
+        revenue = np.zeros_like(sold)
+        lo = max(first, self._origin)
+        hi = min(last + 1, self._origin + self._sold.shape[1])
+        if lo < hi:
+            sold[:, lo - first:hi - first] = self._sold[:, lo - self._origin:hi - self._origin]
+            revenue[:, lo - first:hi - first] = self._revenue[:, lo - self._origin:hi - self._origin]
+        return sold, revenue
+
+    def stats(self):
+        with self._lock:
+            return {
+                'full_loads': self.full_loads,
+                'incremental_refreshes': self.incremental_refreshes,
+                'days_recomputed': self.days_recomputed
+            }
+
+
+_engine = PerHotel(ReportEngine)
+
+
+def get_report_engine():
+    """Return the current property's report engine"""
+    return _engine.get()
@@ -0,0 +1,197 @@
+"""Room x night occupancy bitmap for date-range availability search
+
+Row ``r`` of the bitmap is one room, column ``d`` is the night ``origin + d``
+(``origin`` is today). A stay occupies every day from check-in to check-out
+inclusive, matching the conflict check in ``intervals``. "Which rooms are
+free from the 12th to the 15th" is then a single ``any`` over those columns
+plus a mask for room type and capacity, with no per-room queries.
+
+The bitmap covers ``AVAILABILITY_HORIZON`` days. It is built on first use,
+kept current by the booking and room write handlers, rebuilt when the day
+rolls over and after ``AVAILABILITY_TTL`` seconds (to pick up writes from
+other processes). Stays reaching past the horizon are answered with one
+overlap query instead. NumPy is imported with the first build so it does
+not slow down cold starts of the other endpoints.
+"""
+import os
+import threading
+import time
+from datetime import date
+
+from api.lib.hotels import PerHotel
+from api.lib.intervals import ACTIVE_STATUSES, to_day
+from api.lib.pagination import scan
+
+HORIZON_DAYS = int(os.environ.get('AVAILABILITY_HORIZON', 365))
+MAP_TTL = float(os.environ.get('AVAILABILITY_TTL', 60))
+
+ROOM_COLUMNS = ('id', 'room_number', 'room_type', 'capacity', 'price_per_night')
+
+
+class OccupancyMap:
+    """Occupancy bitmap over every room for the next ``horizon`` nights"""
+
+    def __init__(self, horizon=HORIZON_DAYS, ttl=MAP_TTL):
+        self.horizon = horizon
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self.origin = None
+        self.rooms = []
+        self._rows = {}
+        self._grid = None
+        self._types = None
+        self._capacity = None
+        # booking id -> (row, first day, last day) so a release can clear it
+        self._stays = {}
+        self._room_stays = {}
+
+    def free_rooms(self, storage, check_in, check_out, room_type=None, min_capacity=None):
+        """Rooms with no active stay on any day of ``[check_in, check_out]``"""
+        start, end = to_day(check_in), to_day(check_out)
+        self._ensure(storage)
+        np = _numpy()
+
+        with self._lock:
+            first, last = start - self.origin, end - self.origin
+            in_window = first >= 0 and last < self.horizon
+        overlapping = None if in_window else _overlapping_rooms(storage, check_in, check_out)
+
+        with self._lock:
+            if not self.rooms:
+                return []
+            if overlapping is None:
+                busy = self._grid[:, first:last + 1].any(axis=1)
+            else:
+                busy = np.zeros(len(self.rooms), dtype=bool)
+                for room_id in overlapping:
+                    row = self._rows.get(room_id)
+                    if row is not None:
+                        busy[row] = True
+
+            free = ~busy
+            if room_type:
+                free &= self._types == room_type
+            if min_capacity:
+                free &= self._capacity >= min_capacity
+            return [dict(self.rooms[row]) for row in np.flatnonzero(free)]
+
+    def booking_added(self, room_id, booking_id, check_in, check_out):
+        with self._lock:
+            row = self._rows.get(room_id)
+            if self._grid is None or row is None:
+                return
+            stay = (row, to_day(check_in), to_day(check_out))
+            self._stays[booking_id] = stay
+            self._room_stays.setdefault(row, set()).add(booking_id)
+            self._mark(*stay)
+
+    def booking_released(self, room_id, booking_id):
+        """Free the nights of a stay that was checked out or cancelled"""
+        with self._lock:
+            stay = self._stays.pop(booking_id, None)
+            if stay is None:
+                return
+            row, first, last = stay
+            self._room_stays.get(row, set()).discard(booking_id)
+            self._mark(row, first, last, False)
+            # Legacy data can hold overlapping stays; repaint the survivors
+            for other in self._room_stays.get(row, ()):
+                self._mark(*self._stays[other])
+
+    def rooms_added(self, rooms):
+        with self._lock:
+            if self._grid is None:
+                return
+            np = _numpy()
+            new = [room for room in rooms if room['id'] not in self._rows]
+            if not new:
+                return
+            for room in new:
+                self._rows[room['id']] = len(self.rooms)
+                self.rooms.append({column: room.get(column) for column in ROOM_COLUMNS})
+            self._grid = np.vstack([self._grid, np.zeros((len(new), self.horizon), dtype=bool)])
+            self._types = np.append(self._types, [room['room_type'] for room in new])
+            self._capacity = np.append(self._capacity, [room['capacity'] or 0 for room in new])
+
+    def invalidate(self):
+        """Rebuild from the database on next use"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _mark(self, row, first, last, value=True):
+        lo = max(first - self.origin, 0)
+        hi = min(last - self.origin, self.horizon - 1)
+        if lo <= hi:
+            self._grid[row, lo:hi + 1] = value
+
+    def _ensure(self, storage):
+        today = date.today().toordinal()
+        with self._lock:
+            if (self._loaded_at is not None and self.origin == today
+                    and time.monotonic() - self._loaded_at <= self.ttl):
+                return
+
+        np = _numpy()
+        rooms = [
+            {column: room.get(column) for column in ROOM_COLUMNS}
+            for room in scan(storage, 'rooms', ', '.join(ROOM_COLUMNS))
+        ]
+        rooms.sort(key=lambda room: room['room_number'])
+        rows = {room['id']: index for index, room in enumerate(rooms)}
+
+        # Only stays that have not ended yet can occupy a night in the window
+        bookings = list(scan(
+            storage, 'bookings', 'id, room_id, check_in_date, check_out_date',
+            [('status', 'in', list(ACTIVE_STATUSES)), ('check_out_date', 'gte', date.fromordinal(today).isoformat())]
+        ))
+
+        with self._lock:
+            self.origin = today
+            self.rooms = rooms
+            self._rows = rows
+            self._grid = np.zeros((len(rooms), self.horizon), dtype=bool)
+            self._types = np.array([room['room_type'] for room in rooms], dtype=object)
+            self._capacity = np.array([room['capacity'] or 0 for room in rooms], dtype=np.int64)
+            self._stays = {}
+            self._room_stays = {}
+            for booking in bookings:
+                row = rows.get(booking['room_id'])
+                if row is None:
+                    continue
+                stay = (row, to_day(booking['check_in_date']), to_day(booking['check_out_date']))
+                self._stays[booking['id']] = stay
+                self._room_stays.setdefault(row, set()).add(booking['id'])
+                self._mark(*stay)
+            self._loaded_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rooms': len(self.rooms),
+                'stays': len(self._stays),
+                'loaded': self._loaded_at is not None
+            }
+
+
+def _numpy():
+    import numpy
+    return numpy
+
+
+def _overlapping_rooms(storage, check_in, check_out):
+    """Room ids with an active stay sharing a day with the range (one query)"""
+    rows = scan(storage, 'bookings', 'id, room_id', [
+        ('status', 'in', list(ACTIVE_STATUSES)),
+        ('check_in_date', 'lte', date.fromordinal(to_day(check_out)).isoformat()),
+        ('check_out_date', 'gte', date.fromordinal(to_day(check_in)).isoformat())
+    ])
+    return {row['room_id'] for row in rows}
+
+
+_map = PerHotel(OccupancyMap)
+
+
+def get_occupancy_map():
+    """Return the current property's occupancy bitmap"""
+    return _map.get()
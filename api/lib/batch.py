@@ -0,0 +1,88 @@
+"""Helpers shared by the bulk (array body) create handlers"""
+from api.lib.storage import UniqueViolation
+
+# Largest array accepted in one request
+MAX_BATCH_SIZE = 1000
+
+# Values per ``in.(...)`` filter, keeps PostgREST URLs a sane length
+IN_CHUNK_SIZE = 200
+
+
+def chunked(values, size=IN_CHUNK_SIZE):
+    """Yield successive slices of ``values``"""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def select_in(storage, table, columns, column, values, embed=None):
+    """Fetch rows whose ``column`` is in ``values`` using chunked IN filters"""
+    rows = []
+    for chunk in chunked(sorted(set(values))):
+        rows.extend(storage.select(table, columns, {column: chunk}, embed=embed))
+    return rows
+
+
+def insert_unique(storage, table, column, pending, error):
+    """Insert ``(index, data)`` pairs whose ``column`` was checked free beforehand
+
+    Another request may take a value between that check and the insert.
+    The items that lost such a race become ``item_error(index, error)`` and
+    the rest are inserted again. Returns ``(created, rejected)``: the
+    ``(index, row)`` pairs inserted and the error results.
+    """
+    rejected = []
+    while pending:
+        try:
+            rows = storage.insert(table, [data for _, data in pending])
+        except UniqueViolation:
+            taken = {
+                row[column] for row in
+                select_in(storage, table, column, column, [data[column] for _, data in pending])
+            }
+            if not taken:
+                # Not one of ours; the violation is about something else
+                raise
+            rejected.extend(item_error(index, error) for index, data in pending if data[column] in taken)
+            pending = [(index, data) for index, data in pending if data[column] not in taken]
+            continue
+        return [(index, row) for (index, _), row in zip(pending, rows)], rejected
+    return [], rejected
+
+
+def item_error(index, error, details=None, status=400):
+    result = {'index': index, 'status': status, 'error': error}
+    if details is not None:
+        result['details'] = details
+    return result
+
+
+def item_created(index, data):
+    return {'index': index, 'status': 201, 'data': data}
+
+
+def too_large(count, headers):
+    return {
+        'statusCode': 413,
+        'headers': headers,
+        'data': {'error': f'Batch too large ({count} items, max {MAX_BATCH_SIZE})'}
+    }
+
+
+def batch_response(results, headers):
+    """201 when every item was created, 207 when some were, 400 when none were"""
+    created = sum(1 for r in results if r['status'] == 201)
+    failed = len(results) - created
+
+    if failed == 0:
+        status_code = 201
+    elif created:
+        status_code = 207
+    else:
+        status_code = 400
+
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'data': {'created': created, 'failed': failed, 'results': results}
+    }
@@ -0,0 +1,161 @@
+"""Read-through cache for GET list responses
+
+Entries are grouped by resource (``'rooms'``, ``'guests'``, ...) and keyed by
+the handler's parsed query parameters, so ``?skip=0`` and no ``skip`` share
+an entry. Each entry carries a strong ETag; a request whose ``If-None-Match``
+matches gets ``304 Not Modified`` without a body.
+
+Write handlers call ``invalidate`` for every resource whose list output they
+change. The cache is per process: writes served by another instance are only
+seen once the entry expires (``CACHE_TTL`` seconds, ``0`` disables caching).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from api.lib.hotels import PerHotel
+from api.lib.serialization import dumpb
+
+TTL = float(os.environ.get('CACHE_TTL', 30))
+MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 256))
+
+
+def make_etag(data):
+    """Strong validator derived from the serialized response"""
+    # OpenSSL-backed hashlib costs a few ms to import; only cache misses need it
+    import hashlib
+    return '"' + hashlib.sha1(dumpb(data, sort_keys=True)).hexdigest() + '"'
+
+
+class CacheEntry:
+    __slots__ = ('data', 'etag', 'expires', 'cost')
+
+    def __init__(self, data, etag, expires, cost):
+        self.data = data
+        self.etag = etag
+        self.expires = expires
+        self.cost = cost
+
+
+class ResponseCache:
+    """TTL + LRU cache of handler results with per-resource invalidation"""
+
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Bumped on invalidation so a load that raced a write is not stored
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.not_modified = 0
+        self.calls_saved = 0
+
+    def fetch(self, resource, key, loader, cost=1):
+        """Return a cached entry for ``(resource, key)``, calling ``loader`` on a miss
+
+        ``cost`` is the number of storage calls ``loader`` makes; it feeds the
+        ``calls_saved`` counter.
+        """
+        full_key = (resource, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is not None and entry.expires > now:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                self.calls_saved += entry.cost
+                return entry
+            self.misses += 1
+            generation = self._generations.get(resource, 0)
+
+        data = loader()
+        entry = CacheEntry(data, make_etag(data), now + self.ttl, cost)
+        if self.ttl <= 0:
+            return entry
+
+        with self._lock:
+            if self._generations.get(resource, 0) == generation:
+                self._entries[full_key] = entry
+                self._entries.move_to_end(full_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return entry
+
+    def respond(self, entry, headers, request_headers=None):
+        """200 with the cached data, or 304 when the client already has it"""
+        headers = dict(headers)
+        headers['ETag'] = entry.etag
+        # Browsers revalidate on every fetch and get a bodyless 304 when unchanged
+        headers['Cache-Control'] = 'no-cache'
+        headers['Access-Control-Expose-Headers'] = 'ETag'
+
+        if etag_matches(entry.etag, (request_headers or {}).get('if-none-match')):
+            with self._lock:
+                self.not_modified += 1
+            return {
+                'statusCode': 304,
+                'headers': headers,
+                'data': None
+            }
+
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'data': entry.data
+        }
+
+    def invalidate(self, *resources):
+        """Drop every entry belonging to the given resources"""
+        with self._lock:
+            for resource in resources:
+                self._generations[resource] = self._generations.get(resource, 0) + 1
+                stale = [key for key in self._entries if key[0] == resource]
+                for key in stale:
+                    del self._entries[key]
+                self.invalidations += len(stale)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            for resource, _ in self._entries:
+                self._generations[resource] = self._generations.get(resource, 0) + 1
+            self._entries.clear()
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'not_modified': self.not_modified,
+                'calls_saved': self.calls_saved
+            }
+
+
+def etag_matches(etag, if_none_match):
+    """If-None-Match uses the weak comparison, so W/ prefixes are ignored"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return any(tag.removeprefix('W/') == etag for tag in candidates)
+
+
+_cache = PerHotel(ResponseCache)
+
+
+def get_response_cache():
+    """The current property's response cache"""
+    return _cache.get()
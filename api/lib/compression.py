@@ -0,0 +1,129 @@
+"""gzip / brotli for response bodies sent by the Flask app
+
+JSON, NDJSON and text bodies of at least ``COMPRESS_MIN_BYTES`` are sent in
+the best encoding the client's ``Accept-Encoding`` allows: ``br`` when the
+optional ``brotli`` package is installed, otherwise ``gzip``. Streamed
+exports are compressed chunk by chunk and stay streamed. Smaller bodies go
+out as they are; below about a kilobyte the headers cost more than is saved.
+
+The bytes differ per encoding while the content does not, so a compressed
+response carries the weak form of its ETag and ``If-None-Match`` keeps
+matching. The Vercel shim sends plain bodies; Vercel's edge compresses them.
+"""
+import functools
+import os
+import zlib
+
+MIN_SIZE = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+# Quality 11 is for static assets; 4-5 is as fast as gzip -6 and still smaller
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+# Sent as events happen; compressing would hold them back in proxies' buffers
+NEVER_COMPRESSED = ('text/event-stream',)
+
+# Gzip container around a deflate stream
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+@functools.lru_cache(maxsize=None)
+def brotli_module():
+    """The ``brotli`` package, or None when it is not installed"""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def available_encodings():
+    """Encodings this process can produce, most preferred first"""
+    return ('br', 'gzip') if brotli_module() is not None else ('gzip',)
+
+
+def parse_accept_encoding(header):
+    """``'gzip, br;q=0.5'`` -> ``{'gzip': 1.0, 'br': 0.5}``"""
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    """Best encoding the client accepts, or None for identity"""
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body, encoding):
+    """Compress a whole body"""
+    if encoding == 'br':
+        return brotli_module().compress(body, quality=BROTLI_QUALITY)
+    return zlib.compress(body, GZIP_LEVEL, GZIP_WBITS)
+
+
+def compress_stream(chunks, encoding):
+    """Compress text or byte chunks, flushing after each so they still arrive progressively"""
+    if encoding == 'br':
+        compressor = brotli_module().Compressor(quality=BROTLI_QUALITY)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+        process, finish = compressor.compress, compressor.flush
+        flush = functools.partial(compressor.flush, zlib.Z_SYNC_FLUSH)
+
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if chunk:
+            yield process(chunk) + flush()
+    yield finish()
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES) and mimetype not in NEVER_COMPRESSED
+
+
+def compress_response(response, accept_encoding):
+    """Compress a Flask response in place when it is worth it; returns it"""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers or not is_compressible(response.mimetype)):
+        return response
+
+    # Whether or not this one is compressed, the same URL may be
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+    else:
+        body = response.get_data()
+        if len(body) < MIN_SIZE:
+            return response
+        response.set_data(compress(body, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response.headers['ETag'] = 'W/' + etag
+    return response
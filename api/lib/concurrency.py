@@ -0,0 +1,48 @@
+"""Overlap independent storage round trips
+
+Both storage backends are blocking but safe to share across threads (httpx
+for Supabase, a connection pool for SQLite), so lookups that do not depend
+on each other run on a small shared thread pool instead of one after the
+other. The pool is created on first use through the registry.
+"""
+import contextvars
+import os
+
+from api.lib import registry
+
+# Threads shared by every handler in the process
+IO_WORKERS = int(os.environ.get('IO_WORKERS', 8))
+
+
+def create_executor():
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='storage-io')
+
+
+registry.register('executor', create_executor)
+
+
+def get_executor():
+    """Return the process-wide thread pool, creating it on first use"""
+    return registry.get('executor')
+
+
+def gather(*calls):
+    """Run zero-argument callables concurrently; return their results in order
+
+    The first call runs on the current thread, the others in copies of its
+    context so context variables set for the request still apply. Every
+    call finishes before this returns, and the first exception raised (in
+    argument order) is re-raised.
+    """
+    if len(calls) < 2:
+        return [call() for call in calls]
+
+    executor = get_executor()
+    futures = [executor.submit(contextvars.copy_context().run, call) for call in calls[1:]]
+    try:
+        first = calls[0]()
+    finally:
+        for future in futures:
+            future.exception()
+    return [first] + [future.result() for future in futures]
@@ -0,0 +1,120 @@
+"""In-process change feed behind ``/api/events``
+
+Write handlers publish what they changed, next to their cache invalidation:
+``created`` and ``updated`` carry the row (or just the changed columns and
+``id``), ``deleted`` only the ``id``. The feed keeps the last
+``EVENTS_BUFFER`` events in memory, numbered in publish order, so a client
+that reconnects or polls gets the delta instead of refetching its lists.
+
+Event ids are ``<epoch>-<seq>``, the epoch being random per process. An id
+issued by another process (another serverless instance, or before a
+restart) or already dropped from the buffer cannot be resumed from; the
+caller is told to reset and reload instead.
+
+Each property has its own feed. The factory is registered as
+``change_feed``; a shared implementation (for example Postgres
+``LISTEN``/``NOTIFY``) can be registered in its place as long as it offers
+the same methods.
+"""
+import itertools
+import os
+import threading
+from collections import deque
+
+from api.lib import registry
+from api.lib.hotels import PerHotel
+
+BUFFER = int(os.environ.get('EVENTS_BUFFER', 1000))
+
+OPERATIONS = ('created', 'updated', 'deleted')
+
+
+class ChangeFeed:
+    """Bounded, ordered log of change events with blocking reads"""
+
+    def __init__(self, size=BUFFER):
+        self.epoch = os.urandom(4).hex()
+        self._events = deque(maxlen=size)
+        self._seq = 0
+        self._changed = threading.Condition()
+        self.published = 0
+        self.streams = 0
+
+    def publish(self, resource, operation, rows):
+        """Append one ``operation`` event per row and wake every waiting reader"""
+        if operation not in OPERATIONS:
+            raise ValueError(f'Unknown operation: {operation}')
+        with self._changed:
+            for row in rows:
+                self._seq += 1
+                self._events.append((self._seq, {
+                    'id': f'{self.epoch}-{self._seq}',
+                    'resource': resource,
+                    'op': operation,
+                    # A snapshot; handlers and caches may keep using the row
+                    'data': dict(row)
+                }))
+                self.published += 1
+            self._changed.notify_all()
+
+    @property
+    def position(self):
+        """Sequence number of the latest event (0 before the first)"""
+        return self._seq
+
+    def event_id(self, seq):
+        return f'{self.epoch}-{seq}'
+
+    def parse(self, event_id):
+        """Sequence number for an id this process issued, else None"""
+        epoch, _, seq = (event_id or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self._seq:
+            return None
+        return int(seq)
+
+    def since(self, seq):
+        """``(seq, event)`` pairs after ``seq``, or None if some were already dropped"""
+        with self._changed:
+            return self._after(seq)
+
+    def wait(self, seq, timeout):
+        """:meth:`since`, blocking up to ``timeout`` seconds for something new"""
+        with self._changed:
+            self._changed.wait_for(lambda: self._seq > seq, timeout)
+            return self._after(seq)
+
+    def _after(self, seq):
+        if seq >= self._seq:
+            return []
+        first = self._events[0][0]
+        if seq < first - 1:
+            return None
+        return list(itertools.islice(self._events, seq - first + 1, None))
+
+    def stream_opened(self):
+        with self._changed:
+            self.streams += 1
+
+    def stream_closed(self):
+        with self._changed:
+            self.streams -= 1
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._changed:
+            return {
+                'buffered': len(self._events),
+                'published': self.published,
+                'streams': self.streams
+            }
+
+
+registry.register('change_feed', ChangeFeed)
+
+# Built through the registry, but one per property rather than per process
+_feeds = PerHotel(lambda: registry.build('change_feed'))
+
+
+def get_change_feed():
+    """The current property's change feed"""
+    return _feeds.get()
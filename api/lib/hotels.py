@@ -0,0 +1,152 @@
+"""Which property (hotel) a request is for, and state kept per property
+
+``HOTELS`` lists the properties a deployment serves, each optionally with
+a backend of its own::
+
+    HOTELS=downtown,airport,harbour=sqlite:/data/harbour.db,lakeside=supabase:LAKESIDE
+
+``sqlite:<path>`` is a local database file and ``supabase:<PREFIX>`` a
+separate project, its credentials read from ``<PREFIX>_SUPABASE_URL`` and
+``<PREFIX>_SUPABASE_SERVICE_KEY``. Properties without one share the default
+backend (``STORAGE_BACKEND``), where a ``hotel_id`` column tells their rows
+apart (``sql/hotel_partitions.sql``). Left unset there is a single property,
+``DEFAULT_HOTEL``, and nothing is partitioned.
+
+A request names its property with the ``X-Hotel-Id`` header or the
+``hotel_id`` query parameter, or gets ``DEFAULT_HOTEL`` (the first in
+``HOTELS``). Handlers read it from :data:`current_hotel`, a context
+variable, so threads started through ``concurrency.gather`` see it too.
+Caches and indexes are :class:`PerHotel`, so a busy property only ever
+evicts or reloads its own.
+"""
+from contextlib import contextmanager
+import contextvars
+import functools
+import os
+import threading
+
+from api.lib.http import allow_request_header
+
+# Letters, digits, '-' and '_', at most 64 of them (no ``re``/``string``: cold starts)
+HOTEL_ID_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_')
+HOTEL_ID_LENGTH = 64
+HEADER = 'x-hotel-id'
+PARAM = 'hotel_id'
+
+
+def parse_hotels(value, default='default'):
+    """``'a,b=sqlite:b.db'`` -> ``{'a': None, 'b': ('sqlite', 'b.db')}``"""
+    hotels = {}
+    for item in value.split(','):
+        name, _, backend = item.strip().partition('=')
+        if not name:
+            continue
+        if len(name) > HOTEL_ID_LENGTH or not HOTEL_ID_CHARS.issuperset(name):
+            raise ValueError(f'Invalid hotel id in HOTELS: {name!r}')
+        if backend:
+            kind, _, target = backend.partition(':')
+            if kind not in ('sqlite', 'supabase') or not target:
+                raise ValueError(f"Expected sqlite:<path> or supabase:<PREFIX> for hotel '{name}', got {backend!r}")
+            hotels[name] = (kind, target)
+        else:
+            hotels[name] = None
+    return hotels or {default: None}
+
+
+HOTELS = parse_hotels(os.environ.get('HOTELS', ''), os.environ.get('DEFAULT_HOTEL') or 'default')
+DEFAULT_HOTEL = os.environ.get('DEFAULT_HOTEL') or next(iter(HOTELS))
+if DEFAULT_HOTEL not in HOTELS:
+    raise ValueError(f"DEFAULT_HOTEL '{DEFAULT_HOTEL}' is not listed in HOTELS")
+
+# More than one property in the default backend means filtering by hotel_id
+PARTITIONED = sum(1 for backend in HOTELS.values() if backend is None) > 1
+
+current_hotel = contextvars.ContextVar('hotel_id', default=DEFAULT_HOTEL)
+
+
+class UnknownHotel(ValueError):
+    """Raised for a hotel id this deployment does not serve"""
+
+
+def backend_options(hotel_id):
+    """``(backend, options)`` for ``create_storage``, or None for the shared default backend"""
+    backend = HOTELS[hotel_id]
+    if backend is None:
+        return None
+    kind, target = backend
+    if kind == 'sqlite':
+        return 'sqlite', {'path': target}
+    return 'supabase', {
+        'url': os.environ.get(f'{target}_SUPABASE_URL'),
+        'key': os.environ.get(f'{target}_SUPABASE_SERVICE_KEY')
+    }
+
+
+def hotel_from_request(params, headers=None):
+    """The property a request names, or :data:`DEFAULT_HOTEL`"""
+    hotel_id = (headers or {}).get(HEADER) or (params or {}).get(PARAM)
+    if not hotel_id:
+        return DEFAULT_HOTEL
+    if hotel_id not in HOTELS:
+        raise UnknownHotel(f'Unknown hotel: {hotel_id}')
+    return hotel_id
+
+
+@contextmanager
+def use_hotel(hotel_id):
+    """Run the enclosed code for ``hotel_id`` (sweeps, scripts, benchmarks)"""
+    if hotel_id not in HOTELS:
+        raise UnknownHotel(f'Unknown hotel: {hotel_id}')
+    token = current_hotel.set(hotel_id)
+    try:
+        yield hotel_id
+    finally:
+        current_hotel.reset(token)
+
+
+def for_hotel(dispatch):
+    """Decorate a handler's ``dispatch`` to run for the property the request names"""
+
+    @functools.wraps(dispatch)
+    def wrapper(method, query_params, body, request_headers=None):
+        try:
+            hotel_id = hotel_from_request(query_params, request_headers)
+        except UnknownHotel as e:
+            return {
+                'statusCode': 404,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'data': {'error': str(e)}
+            }
+        token = current_hotel.set(hotel_id)
+        try:
+            response = dispatch(method, query_params, body, request_headers)
+        finally:
+            current_hotel.reset(token)
+        return allow_request_header(response, 'X-Hotel-Id')
+
+    return wrapper
+
+
+class PerHotel:
+    """One instance of ``factory`` per property, built on first use"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The instance for :data:`current_hotel`"""
+        hotel_id = current_hotel.get()
+        instance = self._instances.get(hotel_id)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(hotel_id)
+                if instance is None:
+                    instance = self._instances[hotel_id] = self._factory()
+        return instance
+
+    def items(self):
+        """``(hotel_id, instance)`` for every property used so far"""
+        with self._lock:
+            return list(self._instances.items())
@@ -0,0 +1,54 @@
+"""Request/response plumbing shared by the Flask app and the Vercel entry points
+
+Handlers return ``{'statusCode', 'headers', 'data'}`` where ``data`` is the
+unserialized result. Flask serializes it once with ``jsonify``; the Vercel
+shim below turns it into the JSON ``body`` the serverless runtime expects.
+Both encode through :mod:`api.lib.serialization`.
+Exports return an iterable of text chunks under ``'stream'`` instead, which
+Flask sends as a chunked response.
+"""
+import json
+
+from api.lib.serialization import dumps_if_loaded
+
+
+def parse_event(event):
+    """Split a Vercel event into ``(method, params, body, headers)``"""
+    method = event.get('httpMethod', event.get('method', 'GET'))
+    params = event.get('queryStringParameters', {}) or {}
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    raw = event.get('body') or '{}'
+    try:
+        body = json.loads(raw) if isinstance(raw, str) else raw
+    except ValueError:
+        # Treated like an empty body, so validation reports what is missing
+        body = {}
+    return method, params, body, headers
+
+
+def allow_request_header(response, name):
+    """Add ``name`` to a response's ``Access-Control-Allow-Headers``, if it has one"""
+    headers = response.get('headers') or {}
+    allowed = headers.get('Access-Control-Allow-Headers')
+    if allowed and name not in allowed:
+        # A copy: cached responses may share their headers dict
+        response['headers'] = {**headers, 'Access-Control-Allow-Headers': f'{allowed}, {name}'}
+    return response
+
+
+def to_vercel(response):
+    """Serialize a handler response for the Vercel runtime"""
+    if 'stream' in response:
+        # The Python runtime has no streaming responses; send one body
+        return {
+            'statusCode': response['statusCode'],
+            'headers': response['headers'],
+            'body': ''.join(response['stream'])
+        }
+    data = response.get('data')
+    return {
+        'statusCode': response['statusCode'],
+        'headers': response['headers'],
+        'body': dumps_if_loaded(data) if data is not None else ''
+    }
+
@@ -0,0 +1,343 @@
+"""Idempotency-Key support for POST and PUT handlers
+
+A client that retries a write after a timeout cannot tell whether the first
+attempt ran. Sending the same ``Idempotency-Key`` header on every attempt
+makes the retry safe: the first request to finish stores its response, and
+later requests with that key get the stored response back (marked
+``Idempotent-Replayed: true``) without touching the database.
+
+* Duplicates arriving while the first is still running wait for it, up to
+  ``IDEMPOTENCY_WAIT_MS``, and are then answered with its response; only
+  one of them executes. Past the wait they get ``409``.
+* A key is bound to its request (method, route, parameters and body); reusing
+  it for a different request is ``422``.
+* Keys are scoped to the property and the resource, and kept for
+  ``IDEMPOTENCY_TTL`` seconds.
+* Server errors and ``429`` are not stored, so a retry runs again.
+
+Records live in a bounded in-process LRU by default. ``IDEMPOTENCY_STORE``
+names a SQLite file instead, shared by every worker on the host, which also
+coalesces duplicates that land on different workers. Serverless instances
+each keep their own.
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from api.lib import registry
+from api.lib.hotels import current_hotel
+from api.lib.http import allow_request_header
+from api.lib.serialization import dumpb, loads
+
+HEADER = 'idempotency-key'
+METHODS = ('POST', 'PUT')
+MAX_KEY_LENGTH = 255
+
+TTL = float(os.environ.get('IDEMPOTENCY_TTL', 86400))
+MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', 10000))
+WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_MS', 10000)) / 1000
+
+# A claim left behind by a crashed worker blocks its key for this long
+LEASE_SECONDS = 60
+
+# How often a duplicate checks the shared store for the first one's response
+POLL_SECONDS = 0.05
+
+
+def fingerprint(method, params, body):
+    """Digest of what the key was first used for"""
+    # OpenSSL-backed hashlib costs a few ms to import; only keyed writes need it
+    import hashlib
+    return hashlib.sha256(dumpb([method, params, body], sort_keys=True)).hexdigest()
+
+
+def storable(response):
+    """Whether a retry should get this response back rather than run again"""
+    return 'stream' not in response and response.get('statusCode', 200) < 500 and response.get('statusCode') != 429
+
+
+class MemoryStore:
+    """Records in this process only, least recently used evicted first
+
+    Responses are kept serialized, like in :class:`SQLiteStore`: handlers go
+    on using the objects they returned, and a replay must not see later
+    changes to them.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._records = OrderedDict()
+        self.evictions = 0
+
+    def claim(self, key, fingerprint, now):
+        """None when the caller now owns ``key``, else ``(fingerprint, response or None while running)``"""
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record[2] > now:
+                self._records.move_to_end(key)
+                return record[0], loads(record[1]) if record[1] is not None else None
+            self._store(key, (fingerprint, None, now + LEASE_SECONDS))
+            return None
+
+    def get(self, key, now):
+        with self._lock:
+            record = self._records.get(key)
+            if record is None or record[2] <= now:
+                return None
+            return record[0], loads(record[1]) if record[1] is not None else None
+
+    def complete(self, key, fingerprint, response, expires):
+        stored = dumpb(response)
+        with self._lock:
+            self._store(key, (fingerprint, stored, expires))
+
+    def release(self, key):
+        with self._lock:
+            self._records.pop(key, None)
+
+    def _store(self, key, record):
+        self._records[key] = record
+        self._records.move_to_end(key)
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+            self.evictions += 1
+
+
+# Take the key, or take it over once the previous record has expired
+CLAIM_SQL = """
+INSERT INTO records (key, fingerprint, response, expires) VALUES (:key, :fingerprint, NULL, :lease)
+ON CONFLICT (key) DO UPDATE SET fingerprint = excluded.fingerprint, response = NULL, expires = excluded.expires
+WHERE records.expires <= :now
+RETURNING key
+"""
+
+
+class SQLiteStore:
+    """Records in a SQLite file shared by every process on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self.evictions = 0
+        self._local = threading.local()
+        self._pruned = time.time()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            import sqlite3
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS records ('
+                'key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, response BLOB, expires REAL NOT NULL'
+                ') WITHOUT ROWID'
+            )
+            self._local.connection = connection
+        return connection
+
+    def claim(self, key, fingerprint, now):
+        """None when the caller now owns ``key``, else ``(fingerprint, response or None while running)``"""
+        connection = self._connection()
+        if now - self._pruned > LEASE_SECONDS:
+            self._pruned = now
+            self.evictions += connection.execute('DELETE FROM records WHERE expires <= ?', (now,)).rowcount
+        while True:
+            claimed = connection.execute(
+                CLAIM_SQL, {'key': key, 'fingerprint': fingerprint, 'lease': now + LEASE_SECONDS, 'now': now}
+            ).fetchone()
+            if claimed is not None:
+                return None
+            record = self.get(key, now)
+            # Released between the two statements: try to take it again
+            if record is not None:
+                return record
+
+    def get(self, key, now):
+        row = self._connection().execute(
+            'SELECT fingerprint, response FROM records WHERE key = ? AND expires > ?', (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], loads(row[1]) if row[1] is not None else None
+
+    def complete(self, key, fingerprint, response, expires):
+        self._connection().execute(
+            'UPDATE records SET response = ?, expires = ? WHERE key = ? AND fingerprint = ?',
+            (dumpb(response), expires, key, fingerprint)
+        )
+
+    def release(self, key):
+        self._connection().execute('DELETE FROM records WHERE key = ? AND response IS NULL', (key,))
+
+
+def create_store():
+    target = os.environ.get('IDEMPOTENCY_STORE', '')
+    if not target or target == 'memory':
+        return MemoryStore()
+    return SQLiteStore(target)
+
+
+registry.register('idempotency_store', create_store)
+
+
+class Idempotency:
+    """Runs each keyed write once and replays its response to every retry"""
+
+    def __init__(self, ttl=TTL, wait=WAIT_SECONDS):
+        self.ttl = ttl
+        self.wait = wait
+        self._lock = threading.Lock()
+        # key -> Event set when the request running it in this process finishes
+        self._running = {}
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.in_progress = 0
+        self.mismatched = 0
+        self.store_errors = 0
+
+    def run(self, key, fingerprint, execute):
+        """The stored response for ``key``, or ``execute()``'s, stored for next time"""
+        deadline = time.monotonic() + self.wait
+        waited = False
+        while True:
+            with self._lock:
+                running = self._running.get(key)
+                if running is None:
+                    running = self._running[key] = threading.Event()
+                    break
+                if not waited:
+                    waited = True
+                    self.coalesced += 1
+            # Another thread here has the key; its response is stored when it is done
+            if not running.wait(max(0.0, deadline - time.monotonic())):
+                return self._in_progress()
+
+        try:
+            return self._run_once(key, fingerprint, execute, deadline)
+        finally:
+            with self._lock:
+                del self._running[key]
+            running.set()
+
+    def _run_once(self, key, fingerprint, execute, deadline):
+        store = registry.get('idempotency_store')
+        try:
+            record = store.claim(key, fingerprint, time.time())
+            # Another worker has the key: wait for its response to be stored
+            while record is not None and record[1] is None and time.monotonic() < deadline:
+                time.sleep(POLL_SECONDS)
+                record = store.get(key, time.time())
+                if record is None:
+                    record = store.claim(key, fingerprint, time.time())
+        except Exception as e:
+            # Losing replays must not take writes down with it
+            print(f'Idempotency store error: {e}')
+            with self._lock:
+                self.store_errors += 1
+            return self._execute(None, key, fingerprint, execute)
+
+        if record is None:
+            return self._execute(store, key, fingerprint, execute)
+        stored_fingerprint, response = record
+        if stored_fingerprint != fingerprint:
+            with self._lock:
+                self.mismatched += 1
+            return error_response(422, 'Idempotency-Key was already used for a different request')
+        if response is None:
+            return self._in_progress()
+        with self._lock:
+            self.replayed += 1
+        return replay(response)
+
+    def _execute(self, store, key, fingerprint, execute):
+        with self._lock:
+            self.executed += 1
+        try:
+            response = execute()
+        except BaseException:
+            if store is not None:
+                store.release(key)
+            raise
+        if store is None:
+            return response
+        try:
+            if storable(response):
+                # A copy: decorators above this one may still adjust the headers
+                store.complete(key, fingerprint, dict(response), time.time() + self.ttl)
+            else:
+                store.release(key)
+        except Exception as e:
+            print(f'Idempotency store error: {e}')
+            with self._lock:
+                self.store_errors += 1
+        return response
+
+    def _in_progress(self):
+        with self._lock:
+            self.in_progress += 1
+        return error_response(409, 'A request with this Idempotency-Key is still in progress')
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            stats = {
+                'executed': self.executed,
+                'replayed': self.replayed,
+                'coalesced': self.coalesced,
+                'in_progress': self.in_progress,
+                'mismatched': self.mismatched,
+                'store_errors': self.store_errors
+            }
+        # Built on the first keyed write; reading the counter should not build it
+        stats['evictions'] = registry.get('idempotency_store').evictions if 'idempotency_store' in registry.loaded() else 0
+        return stats
+
+
+def replay(response):
+    """A stored response, marked as a replay"""
+    headers = dict(response.get('headers') or {})
+    headers['Idempotent-Replayed'] = 'true'
+    headers['Access-Control-Expose-Headers'] = 'Idempotent-Replayed'
+    return {**response, 'headers': headers}
+
+
+def error_response(status, message):
+    return {
+        'statusCode': status,
+        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+        'data': {'error': message}
+    }
+
+
+_idempotency = Idempotency()
+
+
+def get_idempotency():
+    """Process-wide idempotency records"""
+    return _idempotency
+
+
+def idempotent(dispatch):
+    """Decorate a handler's ``dispatch`` to honour ``Idempotency-Key`` on POST and PUT"""
+    resource = dispatch.__module__.rsplit('.', 1)[-1]
+
+    @functools.wraps(dispatch)
+    def wrapper(method, query_params, body, request_headers=None):
+        if method == 'OPTIONS':
+            return allow_request_header(dispatch(method, query_params, body, request_headers), 'Idempotency-Key')
+        key = (request_headers or {}).get(HEADER)
+        if not key or method not in METHODS:
+            return dispatch(method, query_params, body, request_headers)
+        if len(key) > MAX_KEY_LENGTH:
+            return error_response(400, f'Idempotency-Key is longer than {MAX_KEY_LENGTH} characters')
+        return get_idempotency().run(
+            f'{current_hotel.get()}|{resource}|{key}',
+            fingerprint(method, query_params, body),
+            lambda: dispatch(method, query_params, body, request_headers)
+        )
+
+    return wrapper
@@ -0,0 +1,209 @@
+"""Per-room sorted interval index for booking conflict detection"""
+from bisect import bisect_right
+from datetime import date
+import os
+import threading
+import time
+
+from api.lib.hotels import PerHotel
+
+ACTIVE_STATUSES = ('booked', 'checked_in')
+
+# A room's intervals are reloaded from the database once they are older than
+# this, so bookings written by another process are eventually picked up.
+INDEX_TTL = float(os.environ.get('CONFLICT_INDEX_TTL', 30))
+
+# Loads of one room retried when a write keeps racing them
+LOAD_ATTEMPTS = 3
+
+
+def to_day(value):
+    """Convert a date or ISO date/datetime string to an ordinal day number"""
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(value[:10]).toordinal()
+
+
+class RoomIntervals:
+    """Bookings for one room, kept sorted by check-in day
+
+    ``max_ends[i]`` is the latest check-out among the first ``i + 1``
+    intervals, so an overlap test is two binary searches even if legacy
+    data contains overlapping stays.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        self.max_ends = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, booking_id, start, end):
+        """Insert a stay; ``start`` and ``end`` are ordinal days"""
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, booking_id)
+        self.max_ends.insert(i, 0)
+        self._refresh_max(i)
+
+    def remove(self, booking_id):
+        """Drop a stay; returns False if it was not indexed"""
+        try:
+            i = self.ids.index(booking_id)
+        except ValueError:
+            return False
+        del self.starts[i], self.ends[i], self.ids[i], self.max_ends[i]
+        self._refresh_max(i)
+        return True
+
+    def find_overlap(self, start, end, exclude=None):
+        """Return the id of a stay sharing any day with [start, end], or None, ignoring ``exclude``"""
+        # Only stays that begin on or before ``end`` can overlap
+        i = bisect_right(self.starts, end)
+        if i == 0 or self.max_ends[i - 1] < start:
+            return None
+        # Walk back to the offending stay; for non-overlapping data this is
+        # the first candidate checked
+        for j in range(i - 1, -1, -1):
+            if self.ends[j] >= start and self.ids[j] != exclude:
+                return self.ids[j]
+        return None
+
+    def _refresh_max(self, i):
+        running = self.max_ends[i - 1] if i > 0 else 0
+        for j in range(i, len(self.ends)):
+            running = max(running, self.ends[j])
+            self.max_ends[j] = running
+
+
+class ConflictIndex:
+    """Lazily loaded :class:`RoomIntervals` for every room touched
+
+    Every change to a room bumps its generation. A load that started
+    before a change is not stored: it may miss the booking just added or
+    still hold the one just released.
+    """
+
+    def __init__(self, ttl=INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._rooms = {}
+        self._generations = {}
+        # Bumped by invalidate() of every room
+        self._epoch = 0
+        self.discarded_loads = 0
+
+    def find_conflict(self, storage, room_id, check_in, check_out, exclude=None):
+        """Return the id of an active booking other than ``exclude`` overlapping the stay, or None"""
+        intervals = self._room(storage, room_id)
+        with self._lock:
+            return intervals.find_overlap(to_day(check_in), to_day(check_out), exclude)
+
+    def booking_added(self, room_id, booking_id, check_in, check_out):
+        with self._lock:
+            self._bump(room_id)
+            entry = self._rooms.get(room_id)
+            if entry is not None:
+                entry[0].add(booking_id, to_day(check_in), to_day(check_out))
+
+    def booking_released(self, room_id, booking_id):
+        """Forget a booking that was checked out or cancelled"""
+        with self._lock:
+            self._bump(room_id)
+            entry = self._rooms.get(room_id)
+            if entry is not None:
+                entry[0].remove(booking_id)
+
+    def invalidate(self, room_id=None):
+        """Reload one room, or every room, on next use"""
+        with self._lock:
+            if room_id is None:
+                self._epoch += 1
+                self._rooms.clear()
+            else:
+                self._bump(room_id)
+                self._rooms.pop(room_id, None)
+
+    def preload(self, storage, room_ids, chunk_size=200):
+        """Load every stale room in ``room_ids`` with one query per chunk"""
+        with self._lock:
+            now = time.monotonic()
+            missing = sorted({
+                room_id for room_id in room_ids
+                if room_id not in self._rooms or now - self._rooms[room_id][1] > self.ttl
+            })
+
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            with self._lock:
+                generations = {room_id: self._generation(room_id) for room_id in chunk}
+            rows = storage.select(
+                'bookings', 'id, room_id, check_in_date, check_out_date',
+                {'room_id': chunk, 'status': list(ACTIVE_STATUSES)}
+            )
+            by_room = {room_id: [] for room_id in chunk}
+            for row in rows:
+                by_room.setdefault(row['room_id'], []).append(row)
+            for room_id, room_rows in by_room.items():
+                # Rooms written to meanwhile are loaded again on first use
+                self._store(room_id, room_rows, generations.get(room_id, self._generation(room_id)))
+
+    def _room(self, storage, room_id):
+        for _ in range(LOAD_ATTEMPTS):
+            with self._lock:
+                entry = self._rooms.get(room_id)
+                if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                    return entry[0]
+                generation = self._generation(room_id)
+
+            rows = storage.select(
+                'bookings', 'id, check_in_date, check_out_date',
+                {'room_id': room_id, 'status': list(ACTIVE_STATUSES)}
+            )
+            intervals = self._store(room_id, rows, generation)
+            if intervals is not None:
+                return intervals
+        # Still racing writes: answer from the last load without keeping it
+        return _build(rows)
+
+    def _store(self, room_id, rows, generation):
+        """Cache the loaded intervals unless the room changed since ``generation``; None if it did"""
+        intervals = _build(rows)
+        with self._lock:
+            if self._generation(room_id) != generation:
+                self.discarded_loads += 1
+                return None
+            self._rooms[room_id] = (intervals, time.monotonic())
+        return intervals
+
+    def _generation(self, room_id):
+        return self._epoch, self._generations.get(room_id, 0)
+
+    def _bump(self, room_id):
+        self._generations[room_id] = self._generations.get(room_id, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rooms': len(self._rooms),
+                'bookings': sum(len(intervals) for intervals, _ in self._rooms.values()),
+                'discarded_loads': self.discarded_loads
+            }
+
+
+def _build(rows):
+    intervals = RoomIntervals()
+    for row in sorted(rows, key=lambda r: r['check_in_date']):
+        intervals.add(row['id'], to_day(row['check_in_date']), to_day(row['check_out_date']))
+    return intervals
+
+_index = PerHotel(ConflictIndex)
+
+
+def get_conflict_index():
+    """Return the current property's booking conflict index"""
+    return _index.get()
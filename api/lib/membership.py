@@ -0,0 +1,228 @@
+"""Known guest and room keys, so write-path checks can skip the database
+
+Creating a guest or room checks its email or room number is free, and a
+booking checks its guest exists. Most of those answers are already known
+in-process:
+
+* guest and room ids and room numbers are kept in sets
+* guest emails, which grow with every stay, go in a Bloom filter (about
+  1.2 bytes per email at ``ERROR_RATE`` false positives)
+
+:meth:`KnownKeys.is_new` answers "free" without a query when the value is
+in neither, and :meth:`KnownKeys.exists` answers "exists" without a query
+when an id is in its set. Anything else, including a Bloom false positive,
+falls back to one ``LIMIT 1`` probe. An answer can be stale only because of
+another process's writes: a value it created since the last load looks
+free, and a guest it deleted still looks present. The unique and foreign
+key constraints catch both at insert time, and the handlers report them
+like the probe would have.
+
+A table is loaded in the background, once, after its first check, and
+reloaded the same way after ``MEMBERSHIP_TTL`` seconds or once the Bloom
+filter holds more emails than it was sized for. Until a load finishes,
+checks on that table are probed, so no write waits for a full scan. The
+write handlers keep loaded tables current, including writes made while a
+load was running.
+"""
+import contextvars
+import math
+import os
+import threading
+import time
+
+from api.lib.concurrency import get_executor
+from api.lib.hotels import PerHotel
+from api.lib.pagination import scan
+
+MEMBERSHIP_TTL = float(os.environ.get('MEMBERSHIP_TTL', 300))
+
+# Bloom filter false positive rate; each costs one probe
+ERROR_RATE = 0.01
+
+# Smallest Bloom filter, and room to grow before it is resized
+MIN_CAPACITY = 1024
+GROWTH = 2
+
+# table -> {column: 'set' or 'bloom'}
+KEYS = {
+    'guests': {'id': 'set', 'email': 'bloom'},
+    'rooms': {'id': 'set', 'room_number': 'set'},
+}
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over hashable values"""
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Double hashing (Kirsch-Mitzenmacher) from the two halves of one hash;
+        # str hashes are per-process salted, which is fine in-process
+        h = hash(value) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class KnownKeys:
+    """Ids, emails and room numbers this process knows to exist"""
+
+    def __init__(self, ttl=MEMBERSHIP_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # table -> {column: set or BloomFilter}
+        self._keys = {}
+        self._loaded_at = {}
+        # table -> changes made while its load runs, replayed onto the result
+        self._loading = {}
+        self.loads = 0
+        self.probes_skipped = 0
+        self.probes = 0
+        self.false_positives = 0
+
+    def is_new(self, storage, table, column, value):
+        """Whether no ``table`` row has ``column = value``, probing only when it may have"""
+        keys = self._ensure(storage, table)
+        if keys is not None and value not in keys[column]:
+            with self._lock:
+                self.probes_skipped += 1
+            return True
+        found = storage.exists(table, {column: value})
+        with self._lock:
+            self.probes += 1
+            # Only a Bloom filter can claim a value that is not there
+            if keys is not None and isinstance(keys[column], BloomFilter):
+                self.false_positives += not found
+        return not found
+
+    def exists(self, storage, table, value):
+        """Whether the ``table`` row with id ``value`` exists, probing only when it is not known"""
+        keys = self._ensure(storage, table)
+        if keys is not None and value in keys['id']:
+            with self._lock:
+                self.probes_skipped += 1
+            return True
+        found = storage.exists(table, {'id': value})
+        with self._lock:
+            self.probes += 1
+        if found:
+            self.added(table, [{'id': value}])
+        return found
+
+    def added(self, table, rows):
+        """Record rows created, or updated to new key values"""
+        with self._lock:
+            self._apply(table, _add, rows)
+
+    def removed(self, table, rows):
+        """Forget deleted rows; Bloom filters cannot, so those values are probed until the next load"""
+        with self._lock:
+            self._apply(table, _discard, rows)
+
+    def _apply(self, table, change, rows):
+        rows = list(rows)
+        if table in self._loading:
+            self._loading[table].append((change, rows))
+        keys = self._keys.get(table)
+        if keys is not None:
+            change(keys, rows)
+
+    def invalidate(self, table=None):
+        """Reload ``table`` (every table by default) on next use"""
+        with self._lock:
+            for name in [table] if table else list(self._loaded_at):
+                self._loaded_at.pop(name, None)
+
+    def _ensure(self, storage, table):
+        """The table's keys, or None (probe instead) while they are loaded in the background"""
+        now = time.monotonic()
+        with self._lock:
+            keys = self._keys.get(table)
+            loaded_at = self._loaded_at.get(table)
+            if keys is not None and loaded_at is not None and now - loaded_at < self.ttl and not _overfull(keys):
+                return keys
+            # Cold or stale: one load at a time per table, off the request path
+            if table not in self._loading:
+                self._loading[table] = []
+                get_executor().submit(contextvars.copy_context().run, self._load, storage, table)
+            return None
+
+    def _load(self, storage, table):
+        started = time.monotonic()
+        try:
+            columns = KEYS[table]
+            rows = list(scan(storage, table, tuple(columns)))
+            keys = {}
+            for column, kind in columns.items():
+                if kind == 'set':
+                    keys[column] = {row[column] for row in rows}
+                else:
+                    keys[column] = BloomFilter(max(MIN_CAPACITY, GROWTH * len(rows)))
+                    for row in rows:
+                        keys[column].add(row[column])
+        except Exception as e:
+            print(f'Known keys load of {table} failed: {e}')
+            with self._lock:
+                self._loading.pop(table, None)
+            return
+
+        with self._lock:
+            for change, changed in self._loading.pop(table, ()):
+                change(keys, changed)
+            self._keys[table] = keys
+            self._loaded_at[table] = started
+            self.loads += 1
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            checks = self.probes + self.probes_skipped
+            return {
+                'loads': self.loads,
+                'probes': self.probes,
+                'probes_skipped': self.probes_skipped,
+                'skip_ratio': round(self.probes_skipped / checks, 4) if checks else 0.0,
+                'false_positives': self.false_positives,
+                'known': sum(
+                    len(known) if isinstance(known, set) else known.count
+                    for keys in self._keys.values() for known in keys.values()
+                )
+            }
+
+
+def _add(keys, rows):
+    for row in rows:
+        for column, known in keys.items():
+            if row.get(column) is not None:
+                known.add(row[column])
+
+
+def _discard(keys, rows):
+    for row in rows:
+        for column, known in keys.items():
+            if isinstance(known, set):
+                known.discard(row.get(column))
+
+
+def _overfull(keys):
+    return any(isinstance(known, BloomFilter) and known.count > known.capacity for known in keys.values())
+
+
+_known = PerHotel(KnownKeys)
+
+
+def get_known_keys():
+    """The current property's known keys"""
+    return _known.get()
@@ -0,0 +1,266 @@
+"""Request timing, upstream-call tracing and Prometheus text exposition
+
+``app.py`` opens a :class:`RequestTrace` around every API handler and the
+storage backends report each round trip (one PostgREST request, one SQLite
+statement) through :func:`upstream_call`. The trace lives in a context
+variable, and ``concurrency.gather`` copies the context into its pool
+threads, so overlapped lookups are attributed to the request that made them.
+
+Per route the process keeps latency, upstream calls per request and
+request/response size histograms; per ``(backend, table, operation)`` it keeps
+upstream latency and error counts. ``/api/metrics`` renders them with
+:func:`render`. Requests slower than ``SLOW_REQUEST_MS`` (``0`` disables) are
+logged with their call breakdown.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 0))
+
+# Histogram upper bounds; seconds and bytes as Prometheus expects
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+UPSTREAM_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+CALL_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 32)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+PREFIX = 'hotel'
+
+_current = contextvars.ContextVar('request_trace', default=None)
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class RequestTrace:
+    """Upstream calls made while handling one request"""
+
+    __slots__ = ('route', 'method', 'started', 'calls')
+
+    def __init__(self, route, method):
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        # (backend, table, operation, seconds); appended from pool threads too
+        self.calls = []
+
+    def breakdown(self):
+        """``{(backend, table, operation): [count, seconds]}`` in first-call order"""
+        grouped = {}
+        for backend, table, operation, seconds in list(self.calls):
+            entry = grouped.setdefault((backend, table, operation), [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+        return grouped
+
+
+class Metrics:
+    """Process-wide counters and histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests = {}
+        self.latency = {}
+        self.upstream_per_request = {}
+        self.request_bytes = {}
+        self.response_bytes = {}
+        self.upstream_latency = {}
+        self.upstream_errors = {}
+        self.slow_requests = 0
+
+    def start(self, route, method):
+        """Begin tracing a request; pass the result to :meth:`finish`"""
+        trace = RequestTrace(route, method)
+        return trace, _current.set(trace)
+
+    def finish(self, started, status, request_size=None, response_size=None):
+        """Record a finished request and log it when it was slow"""
+        trace, token = started
+        _current.reset(token)
+        elapsed = time.perf_counter() - trace.started
+        key = (trace.route, trace.method)
+        with self._lock:
+            status_key = key + (str(status),)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            self._histogram(self.latency, key, LATENCY_BUCKETS).observe(elapsed)
+            self._histogram(self.upstream_per_request, key, CALL_BUCKETS).observe(len(trace.calls))
+            if request_size:
+                self._histogram(self.request_bytes, key, SIZE_BUCKETS).observe(request_size)
+            if response_size is not None:
+                self._histogram(self.response_bytes, key, SIZE_BUCKETS).observe(response_size)
+            slow = SLOW_REQUEST_MS > 0 and elapsed * 1000 >= SLOW_REQUEST_MS
+            if slow:
+                self.slow_requests += 1
+        if slow:
+            log_slow_request(trace, status, elapsed)
+
+    def record_call(self, backend, table, operation, seconds, failed=False):
+        trace = _current.get()
+        if trace is not None:
+            trace.calls.append((backend, table, operation, seconds))
+        key = (backend, table, operation)
+        with self._lock:
+            self._histogram(self.upstream_latency, key, UPSTREAM_BUCKETS).observe(seconds)
+            if failed:
+                self.upstream_errors[key] = self.upstream_errors.get(key, 0) + 1
+
+    @staticmethod
+    def _histogram(store, key, bounds):
+        histogram = store.get(key)
+        if histogram is None:
+            histogram = store[key] = Histogram(bounds)
+        return histogram
+
+    def snapshot(self):
+        """Copies of the counters, safe to render without holding the lock"""
+        with self._lock:
+            copy = {}
+            for name in ('requests', 'upstream_errors'):
+                copy[name] = dict(getattr(self, name))
+            for name in ('latency', 'upstream_per_request', 'request_bytes', 'response_bytes', 'upstream_latency'):
+                copy[name] = {
+                    key: (h.bounds, list(h.counts), h.total, h.count) for key, h in getattr(self, name).items()
+                }
+            copy['slow_requests'] = self.slow_requests
+            copy['started'] = self.started
+            return copy
+
+
+@contextmanager
+def upstream_call(backend, table, operation):
+    """Time one round trip to the data store"""
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _metrics.record_call(backend, table, operation, time.perf_counter() - started, failed)
+
+
+def log_slow_request(trace, status, elapsed):
+    upstream = sum(seconds for _, _, _, seconds in list(trace.calls))
+    parts = [
+        f'{count}x {backend} {operation} {table} {seconds * 1000:.1f} ms'
+        for (backend, table, operation), (count, seconds) in trace.breakdown().items()
+    ]
+    print(
+        f'Slow request: {trace.method} {trace.route} -> {status} in {elapsed * 1000:.1f} ms, '
+        f'{len(trace.calls)} upstream calls ({upstream * 1000:.1f} ms)'
+        + (': ' + '; '.join(parts) if parts else '')
+    )
+
+
+# Prometheus text format (version 0.0.4)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Exposition:
+    """Builds the text body one metric family at a time"""
+
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, help_text):
+        self.lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+        self.lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+
+    def sample(self, name, value, names=(), values=()):
+        self.lines.append(f'{PREFIX}_{name}{_labels(names, values)} {_number(value)}')
+
+    def scalar(self, name, kind, help_text, value):
+        self.family(name, kind, help_text)
+        self.sample(name, value)
+
+    def counters(self, name, help_text, names, store):
+        self.family(name, 'counter', help_text)
+        for values, value in sorted(store.items()):
+            self.sample(name, value, names, values)
+
+    def histograms(self, name, help_text, names, store):
+        self.family(name, 'histogram', help_text)
+        for values, (bounds, counts, total, count) in sorted(store.items()):
+            cumulative = 0
+            for bound, bucket in zip(bounds, counts):
+                cumulative += bucket
+                self.lines.append(
+                    f'{PREFIX}_{name}_bucket{_labels(names, values, ("le", _number(float(bound))))} {cumulative}'
+                )
+            self.lines.append(f'{PREFIX}_{name}_bucket{_labels(names, values, ("le", "+Inf"))} {count}')
+            self.sample(f'{name}_sum', total, names, values)
+            self.sample(f'{name}_count', count, names, values)
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def render(extra=None):
+    """Prometheus text for the request metrics plus ``extra`` gauges
+
+    ``extra`` maps a metric name to ``(kind, help, value)``.
+    """
+    data = _metrics.snapshot()
+    out = Exposition()
+    route = ('route', 'method')
+    out.counters('http_requests_total', 'API requests handled', ('route', 'method', 'status'), data['requests'])
+    out.histograms('http_request_duration_seconds', 'Time spent in the API handler', route, data['latency'])
+    out.histograms('http_upstream_calls', 'Data store round trips per request', route, data['upstream_per_request'])
+    out.histograms('http_request_size_bytes', 'Request body size', route, data['request_bytes'])
+    out.histograms('http_response_size_bytes', 'Response body size (streamed exports excluded)', route,
+                   data['response_bytes'])
+    upstream = ('backend', 'table', 'operation')
+    out.histograms('upstream_call_duration_seconds', 'Data store round trip time', upstream,
+                   data['upstream_latency'])
+    out.counters('upstream_errors_total', 'Data store calls that raised', upstream, data['upstream_errors'])
+    out.scalar('slow_requests_total', 'counter', f'Requests slower than SLOW_REQUEST_MS ({SLOW_REQUEST_MS:g} ms)',
+               data['slow_requests'])
+    out.scalar('process_start_time_seconds', 'gauge', 'Unix time the metrics were started', data['started'])
+    for name, (kind, help_text, value) in (extra or {}).items():
+        out.scalar(name, kind, help_text, value)
+    return out.text()
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Return the process-wide request metrics"""
+    return _metrics
@@ -0,0 +1,89 @@
+"""Keyset (cursor) pagination for the list endpoints
+
+Lists are ordered newest first by ``(created_at, id)``. A cursor is the
+opaque, URL-safe encoding of that pair for the last row of a page; the next
+page starts strictly after it, so every page is a single index range scan
+no matter how deep, and rows inserted meanwhile are neither skipped nor
+repeated.
+
+Passing ``cursor`` (empty for the first page) switches a list endpoint to
+the ``{'items': [...], 'next_cursor': ...}`` envelope. Without it the
+endpoint keeps returning a bare array paged by ``skip``.
+"""
+import base64
+import json
+
+LIST_ORDER = ('-created_at', '-id')
+
+# Columns a cursor is built from, read even when ``fields`` leaves them out
+CURSOR_COLUMNS = ('created_at', 'id')
+
+# PostgREST caps a single response at 1000 rows
+SCAN_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor this API did not issue"""
+
+
+def encode_cursor(row):
+    raw = json.dumps([row['created_at'], row['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the ``(created_at, id)`` position encoded in ``cursor``"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+    if not isinstance(created_at, str) or not isinstance(row_id, int):
+        raise InvalidCursor('Invalid cursor')
+    return created_at, row_id
+
+
+def with_cursor_columns(columns):
+    """``columns`` plus any :data:`CURSOR_COLUMNS` it lacks, and those added"""
+    if columns in (None, '*'):
+        return '*', ()
+    added = tuple(column for column in CURSOR_COLUMNS if column not in columns)
+    return (*columns, *added), added
+
+
+def drop_columns(rows, names):
+    """``rows`` without the keys in ``names``"""
+    if not names:
+        return rows
+    return [{key: value for key, value in row.items() if key not in names} for row in rows]
+
+
+def list_page(storage, table, limit, skip=0, cursor=None, columns='*', **select_options):
+    """Fetch one page of ``table`` newest first
+
+    With ``cursor=None`` this is the legacy offset page (a list). Otherwise
+    one extra row is read to tell whether another page exists.
+    """
+    if cursor is None:
+        return storage.select(table, columns, order=LIST_ORDER, limit=limit, offset=skip, **select_options)
+
+    after = decode_cursor(cursor) if cursor else None
+    fetch, added = with_cursor_columns(columns)
+    rows = storage.select(table, fetch, order=LIST_ORDER, limit=limit + 1, after=after, **select_options)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'items': drop_columns(rows, added),
+        'next_cursor': encode_cursor(rows[-1]) if has_more and rows else None
+    }
+
+
+def scan(storage, table, columns='*', filters=None, page_size=SCAN_PAGE_SIZE, **select_options):
+    """Yield every matching row, reading keyset pages in ``id`` order"""
+    after = None
+    while True:
+        rows = storage.select(table, columns, filters, order='id', limit=page_size, after=after, **select_options)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after = (rows[-1]['id'],)
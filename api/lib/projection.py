@@ -0,0 +1,111 @@
+"""Sparse fieldsets and side-loaded relations for the list endpoints
+
+``?fields=id,status,check_in_date`` limits each row to the named columns and
+the select sent to the data store asks for just those, so trimmed columns
+are never read or transferred. ``id`` is always returned. On bookings a
+relation name keeps its embedded object (``guest``, ``room``), a dotted name
+picks its columns (``guest.name``), and leaving both out drops the embed.
+
+``?shape=normalized`` returns each related guest and room once instead of
+once per booking::
+
+    {"data": [{"id": 1, "guest_id": 3, ...}],
+     "included": {"guests": {"3": {...}}, "rooms": {"12": {...}}}}
+
+Cursor pages add ``next_cursor`` next to ``data``.
+"""
+from api.lib.storage.schema import COLUMNS, RELATIONS, parse_columns
+
+SHAPES = ('nested', 'normalized')
+
+
+class InvalidFields(ValueError):
+    """Raised for a ``fields`` or ``shape`` value this API does not know"""
+
+
+class Projection:
+    """What a list request selects: columns, embeds and response shape"""
+
+    __slots__ = ('table', 'columns', 'embed', 'normalized')
+
+    def __init__(self, table, columns='*', embed=None, normalized=False):
+        self.table = table
+        self.columns = columns
+        self.embed = embed or None
+        self.normalized = normalized
+
+    @property
+    def key(self):
+        """Hashable form for the response cache key"""
+        embed = tuple(sorted(self.embed.items())) if self.embed else ()
+        return self.columns, embed, self.normalized
+
+    def shape(self, page):
+        """Turn a :func:`~api.lib.pagination.list_page` result into the response"""
+        if not self.normalized:
+            return page
+        if isinstance(page, list):
+            return {'data': page, 'included': side_load(self.table, page, self.embed)}
+        return {
+            'data': page['items'],
+            'included': side_load(self.table, page['items'], self.embed),
+            'next_cursor': page['next_cursor']
+        }
+
+
+def parse_projection(table, params, embed=None):
+    """Read ``fields`` and ``shape`` from ``params``; ``embed`` is the default embed"""
+    shape = params.get('shape') or 'nested'
+    if shape not in SHAPES:
+        raise InvalidFields(f"shape must be one of: {', '.join(SHAPES)}")
+    normalized = shape == 'normalized'
+    if normalized and not embed:
+        raise InvalidFields(f'shape=normalized is not supported for {table}')
+
+    requested = [name.strip() for name in (params.get('fields') or '').split(',') if name.strip()]
+    if not requested:
+        return Projection(table, '*', embed, normalized)
+
+    relations = RELATIONS.get(table, {})
+    columns = ['id']
+    picked = {}
+    unknown = []
+    for name in requested:
+        alias, _, column = name.partition('.')
+        if alias in relations and alias in (embed or {}):
+            if column:
+                if column not in COLUMNS[relations[alias][0]]:
+                    unknown.append(name)
+                    continue
+                picked.setdefault(alias, ['id']).append(column)
+            else:
+                picked.setdefault(alias, ['id']).extend(parse_columns(relations[alias][0], embed[alias]))
+        elif name in COLUMNS[table]:
+            columns.append(name)
+        else:
+            unknown.append(name)
+    if unknown:
+        raise InvalidFields(f"Unknown field(s) for {table}: {', '.join(unknown)}")
+
+    if normalized:
+        # Each row points into ``included`` through its foreign keys
+        columns.extend(relations[alias][1] for alias in picked)
+
+    return Projection(
+        table,
+        tuple(dict.fromkeys(columns)),
+        {alias: ', '.join(dict.fromkeys(names)) for alias, names in picked.items()},
+        normalized
+    )
+
+
+def side_load(table, rows, embed):
+    """Move embedded objects out of ``rows`` into ``{related table: {id: row}}``"""
+    relations = RELATIONS[table]
+    included = {relations[alias][0]: {} for alias in embed or {}}
+    for row in rows:
+        for alias in embed or {}:
+            related = row.pop(alias, None)
+            if related is not None:
+                included[relations[alias][0]].setdefault(str(related['id']), related)
+    return included
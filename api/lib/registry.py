@@ -0,0 +1,66 @@
+"""Process-wide registry of lazily created clients and connections
+
+Factories are registered at import time (cheap); the object itself is built
+on the first ``get`` so a cold start only pays for what the request touches.
+"""
+import threading
+
+_factories = {}
+_instances = {}
+_lock = threading.RLock()
+
+
+def register(name, factory):
+    """Declare how to build ``name``; replaces any previous factory"""
+    with _lock:
+        _factories[name] = factory
+
+
+def get(name):
+    """Return the shared instance for ``name``, creating it on first use"""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        instance = _instances.get(name)
+        if instance is None:
+            if name not in _factories:
+                raise KeyError(f'Nothing registered as {name!r}')
+            instance = _instances[name] = _factories[name]()
+        return instance
+
+
+def build(name):
+    """A new, unshared instance from ``name``'s factory"""
+    with _lock:
+        factory = _factories.get(name)
+    if factory is None:
+        raise KeyError(f'Nothing registered as {name!r}')
+    return factory()
+
+
+def replace(name, instance):
+    """Install ``instance`` directly and return whatever was there before"""
+    with _lock:
+        previous = _instances.get(name)
+        if instance is None:
+            _instances.pop(name, None)
+        else:
+            _instances[name] = instance
+        return previous
+
+
+def reset(name=None):
+    """Drop one instance (or all) so the next ``get`` rebuilds it"""
+    with _lock:
+        names = [name] if name is not None else list(_instances)
+        for key in names:
+            instance = _instances.pop(key, None)
+            close = getattr(instance, 'close', None)
+            if callable(close):
+                close()
+
+
+def loaded():
+    """Names of the instances created so far"""
+    return sorted(_instances)
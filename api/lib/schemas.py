@@ -0,0 +1,34 @@
+"""Marshmallow schemas for request bodies
+
+Imported on first validation through :mod:`api.lib.validation`, so endpoints
+that never validate (health, stats, plain GETs) do not pay for marshmallow.
+"""
+from marshmallow import Schema, fields, validate
+
+
+class GuestSchema(Schema):
+    name = fields.Str(required=True)
+    email = fields.Email(required=True)
+    phone = fields.Str(required=True)
+    address = fields.Str(allow_none=True)
+    id_proof = fields.Str(allow_none=True)
+
+
+class RoomSchema(Schema):
+    room_number = fields.Str(required=True)
+    room_type = fields.Str(required=True, validate=validate.OneOf(['single', 'double', 'suite', 'dorm']))
+    capacity = fields.Int(required=True, validate=validate.Range(min=1))
+    price_per_night = fields.Float(required=True, validate=validate.Range(min=0))
+
+
+class BookingSchema(Schema):
+    guest_id = fields.Int(required=True, validate=validate.Range(min=1))
+    room_id = fields.Int(required=True, validate=validate.Range(min=1))
+    check_in_date = fields.Date(required=True)
+    check_out_date = fields.Date(required=True)
+    total_amount = fields.Float(required=True, validate=validate.Range(min=0))
+
+
+class RoomUpdateSchema(RoomSchema):
+    """Fields a PUT may change; loaded with ``partial=True``"""
+    is_available = fields.Bool()
@@ -0,0 +1,267 @@
+"""In-process trigram index for guest search and type-ahead
+
+Every guest's name, email and phone are normalized (case and accents folded,
+phone reduced to digits) and broken into trigrams. A query word narrows the
+candidates to guests holding all of its trigrams, then an exact substring
+check keeps only real matches. This is not the old ``ILIKE '%x%'`` search:
+
+* every word of a multi-word query must match, each in any field, rather
+  than the whole query matching as one substring
+* one- and two-letter words match only the start of a word
+* a query with no literal match falls back to trigram similarity, which
+  tolerates typos, so it can return guests ``ILIKE`` would not
+
+The index is loaded on first use, updated by the guest write handlers and
+reloaded after ``SEARCH_INDEX_TTL`` seconds to pick up writes made by other
+processes.
+"""
+import heapq
+import os
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from api.lib.hotels import PerHotel
+from api.lib.pagination import scan
+
+INDEX_TTL = float(os.environ.get('SEARCH_INDEX_TTL', 300))
+
+# Share of the query's trigrams a fuzzy match must contain
+MIN_SIMILARITY = 0.5
+
+PHONE_PUNCTUATION = set('+-().')
+
+# Per-word scores; the best field wins and words add up
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = 100, 80, 60, 40, 20
+
+
+def normalize_text(value):
+    """Lowercase, strip accents and collapse whitespace"""
+    if not value:
+        return ''
+    if value.isascii():
+        return ' '.join(value.lower().split())
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    folded = ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+    return ' '.join(folded.split())
+
+
+def normalize_phone(value):
+    """Digits only, so '+1 (555) 010-2030' and '15550102030' compare equal"""
+    return ''.join(ch for ch in str(value or '') if ch.isdigit())
+
+
+def phone_digits(word):
+    """Digits of a query word that looks like (part of) a phone number, else ''"""
+    if all(ch.isdigit() or ch in PHONE_PUNCTUATION for ch in word):
+        return normalize_phone(word)
+    return ''
+
+
+def trigrams(text):
+    """Trigrams of each word, padded so word starts get their own grams"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def word_grams(word):
+    """Grams every field containing ``word`` is guaranteed to hold"""
+    if len(word) >= 3:
+        return {word[i:i + 3] for i in range(len(word) - 2)}
+    # Too short for an inner trigram: match the start of a word instead
+    return {('  ' + word)[-3:]}
+
+
+class GuestDoc:
+    __slots__ = ('id', 'name', 'email', 'phone', 'created_at', 'n_name', 'n_email', 'n_phone', 'grams')
+
+    def __init__(self, row):
+        self.id = row['id']
+        self.name = row.get('name')
+        self.email = row.get('email')
+        self.phone = row.get('phone')
+        self.created_at = row.get('created_at')
+        self.n_name = normalize_text(self.name)
+        self.n_email = normalize_text(self.email)
+        self.n_phone = normalize_phone(self.phone)
+        # Email and phone are single words, so substrings across '.' or '@' match too
+        self.grams = trigrams(self.n_name) | trigrams(self.n_email) | trigrams(self.n_phone)
+
+    def score_word(self, word, digits):
+        best = 0
+        for field in (self.n_name, self.n_email):
+            best = max(best, _field_score(field, word))
+        if digits and self.n_phone:
+            best = max(best, _field_score(self.n_phone, digits))
+        return best
+
+    def as_suggestion(self):
+        return {'id': self.id, 'name': self.name, 'email': self.email, 'phone': self.phone}
+
+
+def _field_score(field, word):
+    if not field or not word:
+        return 0
+    if field == word:
+        return EXACT
+    if field.startswith(word):
+        return PREFIX
+    if ' ' + word in field:
+        return WORD_PREFIX
+    if len(word) >= 3 and word in field:
+        return SUBSTRING
+    return 0
+
+
+class GuestSearchIndex:
+    """Trigram postings over every guest, kept in sync by the write handlers"""
+
+    def __init__(self, ttl=INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._docs = {}
+        self._postings = {}
+        self._loaded_at = None
+
+    def search(self, storage, query, limit=None):
+        """Guest docs matching ``query``, best match first (top ``limit`` only if given)"""
+        words = normalize_text(query).split()
+        if not words:
+            return []
+        self._ensure(storage)
+
+        with self._lock:
+            ranked = self._exact(words)
+            if not ranked:
+                ranked = self._fuzzy(' '.join(words))
+
+        def rank(item):
+            return (-item[0], len(item[1].n_name), -item[1].id)
+        if limit is not None:
+            return [doc for _, doc in heapq.nsmallest(limit, ranked, key=rank)]
+        ranked.sort(key=rank)
+        return [doc for _, doc in ranked]
+
+    def suggest(self, storage, query, limit=8):
+        """Top ``limit`` matches as small dicts for type-ahead"""
+        return [doc.as_suggestion() for doc in self.search(storage, query, limit)]
+
+    def guest_added(self, row):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._add(GuestDoc(row))
+
+    def guests_added(self, rows):
+        with self._lock:
+            if self._loaded_at is not None:
+                for row in rows:
+                    self._add(GuestDoc(row))
+
+    def guest_removed(self, guest_id):
+        with self._lock:
+            doc = self._docs.pop(int(guest_id), None)
+            if doc is not None:
+                for gram in doc.grams:
+                    posting = self._postings.get(gram)
+                    if posting is not None:
+                        posting.discard(doc.id)
+                        if not posting:
+                            del self._postings[gram]
+
+    def invalidate(self):
+        """Reload every guest on next use"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _exact(self, words):
+        candidates = None
+        for word in words:
+            digits = phone_digits(word)
+            ids = self._candidates(word_grams(word))
+            if digits and digits != word:
+                ids = ids | self._candidates(word_grams(digits))
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+
+        terms = [(word, phone_digits(word)) for word in words]
+        ranked = []
+        for guest_id in candidates:
+            doc = self._docs[guest_id]
+            total = 0
+            for word, digits in terms:
+                score = doc.score_word(word, digits)
+                if not score:
+                    break
+                total += score
+            else:
+                ranked.append((total, doc))
+        return ranked
+
+    def _fuzzy(self, text):
+        query_grams = trigrams(text)
+        if len(text) < 3 or not query_grams:
+            return []
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._postings.get(gram, ()))
+        needed = MIN_SIMILARITY * len(query_grams)
+        ranked = []
+        for guest_id, count in shared.items():
+            if count < needed:
+                continue
+            doc = self._docs[guest_id]
+            ranked.append((FUZZY * count / len(query_grams), doc))
+        return ranked
+
+    def _candidates(self, grams):
+        # Intersect the rarest postings first so common grams cost little
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        if not postings or not postings[0]:
+            return set()
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+
+    def _add(self, doc):
+        if doc.id in self._docs:
+            self.guest_removed(doc.id)
+        self._docs[doc.id] = doc
+        for gram in doc.grams:
+            self._postings.setdefault(gram, set()).add(doc.id)
+
+    def _ensure(self, storage):
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at <= self.ttl:
+                return
+
+        docs = [GuestDoc(row) for row in scan(storage, 'guests', 'id, name, email, phone, created_at')]
+
+        with self._lock:
+            self._docs = {}
+            self._postings = {}
+            for doc in docs:
+                self._add(doc)
+            self._loaded_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'documents': len(self._docs),
+                'trigrams': len(self._postings),
+                'loaded': self._loaded_at is not None
+            }
+
+_index = PerHotel(GuestSearchIndex)
+
+
+def get_guest_index():
+    """Return the current property's guest search index"""
+    return _index.get()
@@ -0,0 +1,66 @@
+"""Pluggable storage backends
+
+``STORAGE_BACKEND`` selects the implementation: ``supabase`` (default) or
+``sqlite`` for the embedded local engine. Both the backend and the raw
+Supabase client live in the shared registry and are built on first use.
+
+:func:`get_storage` routes by the current property (``api/lib/hotels.py``):
+a property configured with a backend of its own gets that one, the others
+the default backend, filtered by ``hotel_id`` when they share it.
+"""
+import functools
+import os
+
+from api.lib import registry
+from api.lib.hotels import HOTELS, PARTITIONED, backend_options, current_hotel
+from api.lib.storage.base import MissingReference, Storage, StorageError, UniqueViolation
+
+BACKENDS = ('supabase', 'sqlite')
+
+
+def create_storage(backend=None, **options):
+    """Build a new backend instance"""
+    backend = backend or os.environ.get('STORAGE_BACKEND', 'supabase')
+    if backend == 'supabase':
+        from api.lib.storage.supabase_backend import SupabaseStorage
+        return SupabaseStorage(**options)
+    if backend == 'sqlite':
+        from api.lib.storage.sqlite_backend import SQLiteStorage
+        return SQLiteStorage(**options)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}', expected one of: {', '.join(BACKENDS)}")
+
+
+def create_supabase_client():
+    """Build the Supabase client; importing supabase is the slow part"""
+    from supabase import create_client
+    return create_client(os.environ.get('SUPABASE_URL'), os.environ.get('SUPABASE_SERVICE_KEY'))
+
+
+def create_hotel_storage(hotel_id):
+    """Build the backend a property has to itself"""
+    backend, options = backend_options(hotel_id)
+    return create_storage(backend, **options)
+
+
+registry.register('storage', create_storage)
+registry.register('supabase', create_supabase_client)
+for _hotel_id, _backend in HOTELS.items():
+    if _backend is not None:
+        registry.register(f'storage:{_hotel_id}', functools.partial(create_hotel_storage, _hotel_id))
+
+
+def get_storage():
+    """Return the current property's storage backend, creating it on first use"""
+    hotel_id = current_hotel.get()
+    if HOTELS[hotel_id] is not None:
+        return registry.get(f'storage:{hotel_id}')
+    storage = registry.get('storage')
+    if PARTITIONED:
+        from api.lib.storage.partition import ScopedStorage
+        return ScopedStorage(storage, hotel_id)
+    return storage
+
+
+def set_storage(storage):
+    """Swap the default backend (benchmarks, tests) and return the old one"""
+    return registry.replace('storage', storage)
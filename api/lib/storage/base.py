@@ -0,0 +1,154 @@
+"""Storage interface the API handlers talk to"""
+from collections.abc import Mapping
+
+# Comparison operators understood by every backend
+OPERATORS = ('eq', 'neq', 'lt', 'lte', 'gt', 'gte', 'in', 'ilike', 'is')
+
+
+class StorageError(Exception):
+    """Raised when the backend rejects a query"""
+
+
+class UniqueViolation(StorageError):
+    """Raised when a write breaks a unique constraint"""
+
+
+class MissingReference(StorageError):
+    """Raised when a write refers to a row that does not exist (foreign key)"""
+
+
+def normalize_filters(filters):
+    """Return filters as a list of ``(column, operator, value)`` triples
+
+    A mapping is shorthand for equality, or ``in`` when the value is a
+    list, tuple or set.
+    """
+    if not filters:
+        return []
+    if isinstance(filters, Mapping):
+        filters = [
+            (column, 'in' if isinstance(value, (list, tuple, set, frozenset)) else 'eq', value)
+            for column, value in filters.items()
+        ]
+    normalized = []
+    for column, op, value in filters:
+        if op not in OPERATORS:
+            raise ValueError(f'Unsupported filter operator: {op}')
+        if op == 'in':
+            value = list(value)
+        normalized.append((column, op, value))
+    return normalized
+
+
+def parse_order(order):
+    """Turn ``['-created_at', 'id']`` into ``[('created_at', True), ('id', False)]``"""
+    if not order:
+        return []
+    if isinstance(order, str):
+        order = [order]
+    return [(o[1:], True) if o.startswith('-') else (o, False) for o in order]
+
+
+def keyset_clauses(ordering, after):
+    """Expand a keyset position into OR-ed groups of ``(column, op, value)``
+
+    For ``[('created_at', True), ('id', True)]`` and ``('t', 7)`` this is
+    ``created_at < t OR (created_at = t AND id < 7)``.
+    """
+    if len(after) != len(ordering):
+        raise ValueError('Keyset position needs one value per order column')
+    groups = []
+    for depth, (column, desc) in enumerate(ordering):
+        group = [(prior, 'eq', value) for (prior, _), value in zip(ordering[:depth], after)]
+        group.append((column, 'lt' if desc else 'gt', after[depth]))
+        groups.append(group)
+    return groups
+
+
+class Storage:
+    """Row-oriented access to the guests, rooms and bookings tables
+
+    Every method returns plain dicts shaped like the Supabase REST
+    responses, so handlers do not care which backend is active.
+    """
+
+    name = 'base'
+
+    def select(self, table, columns='*', filters=None, order=None, limit=None, offset=0,
+               embed=None, search=None, after=None):
+        """Fetch rows
+
+        ``embed`` maps relation aliases from ``schema.RELATIONS`` to the
+        columns to include, e.g. ``{'guest': 'id, name'}``. ``search`` is a
+        ``(columns, term)`` pair matched case-insensitively against any of
+        the columns. ``after`` holds one value per ``order`` column (the last
+        row already seen) and keeps only rows strictly past it, for keyset
+        pagination.
+        """
+        raise NotImplementedError
+
+    def insert(self, table, rows, embed=None):
+        """Insert one row (dict) or many (list) and return the stored rows
+
+        ``embed`` attaches related rows to the result as in :meth:`select`,
+        saving a read-back after the write.
+        """
+        raise NotImplementedError
+
+    def update(self, table, values, filters):
+        """Update matching rows and return them"""
+        raise NotImplementedError
+
+    def delete(self, table, filters):
+        """Delete matching rows and return them"""
+        raise NotImplementedError
+
+    def count(self, table, filters=None):
+        """Number of matching rows"""
+        raise NotImplementedError
+
+    def sum(self, table, column, filters=None):
+        """Sum of ``column`` over matching rows"""
+        raise NotImplementedError
+
+    def transition_booking(self, booking_id, from_statuses, status, stamp=None, release_room=False):
+        """Move a booking to ``status`` only if it is in one of ``from_statuses``
+
+        The status check and the update are one conditional statement, so
+        two concurrent requests cannot both win. ``stamp`` names a column set
+        to the current UTC time; ``release_room`` marks the booking's room
+        available again. Returns ``(booking, status, room_released)``: the
+        updated row and its new status, or ``None`` and the current status
+        (``None`` as well when the booking does not exist). ``room_released``
+        is whether the room went from unavailable to available, or ``None``
+        when the backend cannot tell.
+        """
+        values = {'status': status}
+        if stamp:
+            from datetime import datetime  # off the import path of every handler
+            values[stamp] = datetime.utcnow().isoformat()
+        rows = self.update('bookings', values, [('id', 'eq', booking_id), ('status', 'in', list(from_statuses))])
+        if not rows:
+            current = self.first('bookings', 'status', {'id': booking_id})
+            return None, current['status'] if current else None, False
+
+        booking = rows[0]
+        released = False
+        if release_room:
+            released = bool(self.update('rooms', {'is_available': True}, [
+                ('id', 'eq', booking['room_id']),
+                ('is_available', 'eq', False)
+            ]))
+        return booking, booking['status'], released
+
+    def first(self, table, columns='*', filters=None):
+        """Return the first matching row or None"""
+        rows = self.select(table, columns, filters=filters, limit=1)
+        return rows[0] if rows else None
+
+    def exists(self, table, filters=None):
+        """Whether any row matches, read as one ``LIMIT 1`` row of ids"""
+        return self.first(table, 'id', filters) is not None
+
+    def close(self):
+        """Release connections held by the backend"""
@@ -0,0 +1,69 @@
+"""One property's rows in a backend shared with other properties"""
+from api.lib.storage.base import Storage, normalize_filters
+from api.lib.storage.schema import PARTITION_COLUMN
+
+
+class ScopedStorage(Storage):
+    """Adds ``hotel_id = <property>`` to every read and write of ``inner``
+
+    Inserts are stamped with the property and the column is dropped from
+    returned rows, so handlers see the same rows as on an unshared backend.
+    Ids stay unique across the whole table, which keeps embeds (joined by
+    id) inside the property their parent row belongs to.
+    """
+
+    def __init__(self, inner, hotel_id):
+        self.inner = inner
+        self.hotel_id = hotel_id
+
+    @property
+    def name(self):
+        return self.inner.name
+
+    def __getattr__(self, attribute):
+        # transaction(), close(), path, client, ...
+        return getattr(self.inner, attribute)
+
+    def _scope(self, filters):
+        return normalize_filters(filters) + [(PARTITION_COLUMN, 'eq', self.hotel_id)]
+
+    def select(self, table, columns='*', filters=None, order=None, limit=None, offset=0,
+               embed=None, search=None, after=None):
+        return _strip(self.inner.select(
+            table, columns, self._scope(filters), order, limit, offset, embed=embed, search=search, after=after
+        ))
+
+    def insert(self, table, rows, embed=None):
+        rows = [rows] if isinstance(rows, dict) else rows
+        return _strip(self.inner.insert(table, [{**row, PARTITION_COLUMN: self.hotel_id} for row in rows], embed))
+
+    def update(self, table, values, filters):
+        values = {column: value for column, value in values.items() if column != PARTITION_COLUMN}
+        return _strip(self.inner.update(table, values, self._scope(filters)))
+
+    def delete(self, table, filters):
+        return _strip(self.inner.delete(table, self._scope(filters)))
+
+    def count(self, table, filters=None):
+        return self.inner.count(table, self._scope(filters))
+
+    def sum(self, table, column, filters=None):
+        return self.inner.sum(table, column, self._scope(filters))
+
+    def transition_booking(self, booking_id, from_statuses, status, stamp=None, release_room=False):
+        # The backends' one-round-trip versions do not know about properties,
+        # so use the conditional updates, atomic where the backend has transactions
+        transaction = getattr(self.inner, 'transaction', None)
+        if transaction is None:
+            return Storage.transition_booking(self, booking_id, from_statuses, status, stamp, release_room)
+        with transaction():
+            return Storage.transition_booking(self, booking_id, from_statuses, status, stamp, release_room)
+
+
+def _strip(rows):
+    # Copies; a backend may hand out rows it still holds
+    return [
+        {column: value for column, value in row.items() if column != PARTITION_COLUMN}
+        if PARTITION_COLUMN in row else row
+        for row in rows
+    ]
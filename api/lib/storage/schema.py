@@ -0,0 +1,53 @@
+"""Table layout shared by the storage backends"""
+
+# Columns each table exposes, in the order the local engine creates them
+COLUMNS = {
+    'guests': ('id', 'name', 'email', 'phone', 'address', 'id_proof', 'created_at'),
+    'rooms': ('id', 'room_number', 'room_type', 'capacity', 'price_per_night', 'is_available', 'created_at'),
+    'bookings': (
+        'id', 'guest_id', 'room_id', 'check_in_date', 'check_out_date', 'total_amount',
+        'status', 'actual_check_in', 'actual_check_out', 'created_at'
+    ),
+}
+
+# Property of each row where several share a backend (see api/lib/hotels.py).
+# Accepted in filters and inserts but not part of '*'; rows never show it.
+PARTITION_COLUMN = 'hotel_id'
+
+# Stored as 0/1 by SQLite, returned as bool
+BOOLEAN_COLUMNS = {'is_available'}
+
+# Embeddable relations: alias -> (table, foreign key on the parent)
+RELATIONS = {
+    'bookings': {
+        'guest': ('guests', 'guest_id'),
+        'room': ('rooms', 'room_id'),
+    },
+}
+
+# Related columns embedded in booking responses
+BOOKING_EMBED = {'guest': 'id, name, email', 'room': 'id, room_number, room_type'}
+BOOKING_LIST_EMBED = {'guest': 'id, name, email', 'room': 'id, room_number, room_type, price_per_night'}
+
+
+def check_table(table):
+    if table not in COLUMNS:
+        raise ValueError(f'Unknown table: {table}')
+
+
+def check_columns(table, columns):
+    """Reject column names that are not part of the table"""
+    unknown = [c for c in columns if c not in COLUMNS[table] and c != PARTITION_COLUMN]
+    if unknown:
+        raise ValueError(f"Unknown column(s) for {table}: {', '.join(unknown)}")
+
+
+def parse_columns(table, columns):
+    """Turn a select list such as ``'id, name'`` or ``'*'`` into a tuple"""
+    if columns in (None, '*'):
+        return COLUMNS[table]
+    if isinstance(columns, str):
+        columns = [c.strip() for c in columns.split(',') if c.strip()]
+    columns = tuple(columns)
+    check_columns(table, columns)
+    return columns
@@ -0,0 +1,374 @@
+"""Embedded SQLite storage for local installs, CI and benchmarks"""
+from contextlib import contextmanager
+import os
+import queue
+import re
+import sqlite3
+import threading
+
+from api.lib.hotels import DEFAULT_HOTEL
+from api.lib.metrics import upstream_call
+from api.lib.storage.base import (
+    MissingReference, Storage, StorageError, UniqueViolation, keyset_clauses, normalize_filters, parse_order
+)
+from api.lib.storage.schema import (
+    BOOLEAN_COLUMNS, COLUMNS, PARTITION_COLUMN, RELATIONS, check_columns, check_table, parse_columns
+)
+
+NOW = "(strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))"
+
+# Rows written without a property belong to the default one
+PARTITION = f"{PARTITION_COLUMN} TEXT NOT NULL DEFAULT '{DEFAULT_HOTEL}'"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS guests (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    address TEXT,
+    id_proof TEXT,
+    created_at TEXT NOT NULL DEFAULT {NOW},
+    {PARTITION}
+);
+
+CREATE TABLE IF NOT EXISTS rooms (
+    id INTEGER PRIMARY KEY,
+    room_number TEXT NOT NULL,
+    room_type TEXT NOT NULL CHECK (room_type IN ('single', 'double', 'suite', 'dorm')),
+    capacity INTEGER NOT NULL,
+    price_per_night REAL NOT NULL,
+    is_available INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT NOT NULL DEFAULT {NOW},
+    {PARTITION}
+);
+
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY,
+    guest_id INTEGER NOT NULL REFERENCES guests(id),
+    room_id INTEGER NOT NULL REFERENCES rooms(id),
+    check_in_date TEXT NOT NULL,
+    check_out_date TEXT NOT NULL,
+    total_amount REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'booked',
+    actual_check_in TEXT,
+    actual_check_out TEXT,
+    created_at TEXT NOT NULL DEFAULT {NOW},
+    {PARTITION}
+);
+"""
+
+# Created after the migration below, which adds hotel_id to older files.
+# Emails and room numbers are unique per property; files created before
+# properties keep their global UNIQUE constraints as well.
+INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_guests_hotel_email ON guests (hotel_id, email);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rooms_hotel_number ON rooms (hotel_id, room_number);
+CREATE INDEX IF NOT EXISTS idx_guests_created ON guests (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_rooms_created ON rooms (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_rooms_type_available ON rooms (room_type, is_available);
+CREATE INDEX IF NOT EXISTS idx_bookings_created ON bookings (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_bookings_room_status ON bookings (room_id, status, check_in_date);
+CREATE INDEX IF NOT EXISTS idx_bookings_guest ON bookings (guest_id);
+CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings (status, check_in_date);
+CREATE INDEX IF NOT EXISTS idx_bookings_guest_created ON bookings (guest_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_bookings_status_created ON bookings (status, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_guests_hotel_created ON guests (hotel_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_rooms_hotel_created ON rooms (hotel_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_bookings_hotel_created ON bookings (hotel_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_bookings_hotel_status ON bookings (hotel_id, status, check_in_date);
+"""
+
+# SQLite's default SQLITE_MAX_VARIABLE_NUMBER is 32766
+INSERT_CHUNK_ROWS = 500
+
+
+class SQLiteStorage(Storage):
+    """SQLite in WAL mode with a small connection pool
+
+    Queries are built from a fixed set of templates so the per-connection
+    statement cache (``cached_statements``) keeps them prepared.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path=None, pool_size=None, timeout=5.0):
+        self.path = path or os.environ.get('SQLITE_PATH', 'hotel.db')
+        self.pool_size = pool_size or int(os.environ.get('SQLITE_POOL_SIZE', 4))
+        self.timeout = timeout
+        if self.path == ':memory:':
+            # Every connection would get its own private database
+            self.pool_size = 1
+        self._pool = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # Connection handling
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        if not self._all:
+            conn.executescript(SCHEMA)
+            _add_partition_column(conn)
+            conn.executescript(INDEXES)
+        self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        # Reuse the connection pinned by an enclosing transaction()
+        pinned = getattr(self._local, 'conn', None)
+        if pinned is not None:
+            yield pinned
+            return
+
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                conn = self._connect() if len(self._all) < self.pool_size else None
+            if conn is None:
+                conn = self._pool.get(timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed storage calls atomically on one connection"""
+        if getattr(self._local, 'conn', None) is not None:
+            yield self
+            return
+
+        with self._connection() as conn:
+            self._local.conn = conn
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    yield self
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                conn.execute('COMMIT')
+            finally:
+                self._local.conn = None
+
+    def _run(self, sql, params=()):
+        operation, table = _statement(sql)
+        with self._connection() as conn, upstream_call('sqlite', table, operation):
+            try:
+                return conn.execute(sql, params).fetchall()
+            except sqlite3.IntegrityError as e:
+                if 'UNIQUE' in str(e):
+                    raise UniqueViolation(str(e)) from e
+                if 'FOREIGN KEY' in str(e):
+                    raise MissingReference(str(e)) from e
+                raise StorageError(str(e)) from e
+            except sqlite3.Error as e:
+                raise StorageError(str(e)) from e
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+            self._pool = queue.LifoQueue()
+
+    # Storage interface
+
+    def select(self, table, columns='*', filters=None, order=None, limit=None, offset=0,
+               embed=None, search=None, after=None):
+        check_table(table)
+        columns = parse_columns(table, columns)
+        relations = RELATIONS.get(table, {})
+
+        # Foreign keys are needed to attach embedded rows even if not requested
+        fetch = list(columns)
+        for alias in embed or {}:
+            foreign_key = relations[alias][1]
+            if foreign_key not in fetch:
+                fetch.append(foreign_key)
+
+        ordering = parse_order(order)
+        if ordering:
+            check_columns(table, [column for column, _ in ordering])
+
+        where, params = _where(table, filters, search, (ordering, after) if after is not None else None)
+        sql = f"SELECT {', '.join(fetch)} FROM {table}{where}"
+
+        if ordering:
+            sql += ' ORDER BY ' + ', '.join(f"{column}{' DESC' if desc else ''}" for column, desc in ordering)
+        if limit is not None or offset:
+            sql += ' LIMIT ? OFFSET ?'
+            params += [-1 if limit is None else limit, offset or 0]
+
+        rows = [_to_dict(row) for row in self._run(sql, params)]
+
+        for alias, embed_columns in (embed or {}).items():
+            related_table, foreign_key = relations[alias]
+            self._embed(rows, alias, related_table, foreign_key, parse_columns(related_table, embed_columns))
+
+        extra = set(fetch) - set(columns)
+        if extra:
+            for row in rows:
+                for column in extra:
+                    del row[column]
+        return rows
+
+    def _embed(self, rows, alias, table, foreign_key, columns):
+        ids = sorted({row[foreign_key] for row in rows if row[foreign_key] is not None})
+        related = {}
+        fetch = columns if 'id' in columns else ('id',) + columns
+        for start in range(0, len(ids), INSERT_CHUNK_ROWS):
+            chunk = ids[start:start + INSERT_CHUNK_ROWS]
+            sql = f"SELECT {', '.join(fetch)} FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})"
+            for item in self._run(sql, chunk):
+                item = _to_dict(item)
+                related[item['id']] = {column: item[column] for column in columns}
+        for row in rows:
+            row[alias] = related.get(row[foreign_key])
+
+    def insert(self, table, rows, embed=None):
+        check_table(table)
+        rows = [rows] if isinstance(rows, dict) else list(rows)
+        if not rows:
+            return []
+        columns = []
+        for row in rows:
+            columns.extend(column for column in row if column not in columns)
+        check_columns(table, columns)
+
+        inserted = []
+        with self.transaction():
+            for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+                chunk = rows[start:start + INSERT_CHUNK_ROWS]
+                placeholders = ', '.join([f"({', '.join('?' * len(columns))})"] * len(chunk))
+                sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders} RETURNING *"
+                params = [_to_db(row.get(column)) for row in chunk for column in columns]
+                inserted.extend(_to_dict(row) for row in self._run(sql, params))
+
+        for alias, embed_columns in (embed or {}).items():
+            related_table, foreign_key = RELATIONS[table][alias]
+            self._embed(inserted, alias, related_table, foreign_key, parse_columns(related_table, embed_columns))
+        return inserted
+
+    def transition_booking(self, booking_id, from_statuses, status, stamp=None, release_room=False):
+        # BEGIN IMMEDIATE serializes writers, so the room release commits with the status change
+        with self.transaction():
+            return super().transition_booking(booking_id, from_statuses, status, stamp, release_room)
+
+    def update(self, table, values, filters):
+        check_table(table)
+        if not values:
+            return self.select(table, filters=filters)
+        check_columns(table, values)
+        assignments = ', '.join(f'{column} = ?' for column in values)
+        where, params = _where(table, filters)
+        sql = f'UPDATE {table} SET {assignments}{where} RETURNING *'
+        return [_to_dict(row) for row in self._run(sql, [_to_db(v) for v in values.values()] + params)]
+
+    def delete(self, table, filters):
+        check_table(table)
+        where, params = _where(table, filters)
+        return [_to_dict(row) for row in self._run(f'DELETE FROM {table}{where} RETURNING *', params)]
+
+    def count(self, table, filters=None):
+        check_table(table)
+        where, params = _where(table, filters)
+        return self._run(f'SELECT COUNT(*) FROM {table}{where}', params)[0][0]
+
+    def sum(self, table, column, filters=None):
+        check_table(table)
+        check_columns(table, [column])
+        where, params = _where(table, filters)
+        return self._run(f'SELECT COALESCE(SUM({column}), 0) FROM {table}{where}', params)[0][0]
+
+
+def _add_partition_column(conn):
+    """Give tables created before properties their hotel_id column"""
+    for table in COLUMNS:
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if PARTITION_COLUMN not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {PARTITION}')
+
+
+STATEMENT_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+(\w+)')
+
+
+def _statement(sql):
+    """``('select', 'bookings')`` for metrics labels"""
+    match = STATEMENT_TABLE.search(sql)
+    return sql.split(None, 1)[0].lower(), match.group(1) if match else ''
+
+
+SQL_OPERATORS = {'eq': '=', 'neq': '!=', 'lt': '<', 'lte': '<=', 'gt': '>', 'gte': '>=', 'ilike': 'LIKE'}
+
+
+def _where(table, filters, search=None, keyset=None):
+    clauses = []
+    params = []
+    for column, op, value in normalize_filters(filters):
+        check_columns(table, [column])
+        if op == 'in':
+            if not value:
+                clauses.append('0')
+                continue
+            clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+            params.extend(_to_db(v) for v in value)
+        elif op == 'is':
+            clauses.append(f'{column} IS ?')
+            params.append(_to_db(value))
+        else:
+            # SQLite's LIKE is already case-insensitive for ASCII
+            clauses.append(f'{column} {SQL_OPERATORS[op]} ?')
+            params.append(_to_db(value))
+    if search:
+        search_columns, term = search
+        check_columns(table, search_columns)
+        clauses.append('(' + ' OR '.join(f'{column} LIKE ?' for column in search_columns) + ')')
+        params.extend(f'%{term}%' for _ in search_columns)
+    if keyset:
+        ordering, after = keyset
+        if len({desc for _, desc in ordering}) == 1:
+            # A row-value comparison walks the (created_at, id) index directly
+            op = '<' if ordering[0][1] else '>'
+            clauses.append(f"({', '.join(column for column, _ in ordering)}) {op} ({', '.join('?' * len(after))})")
+            params.extend(_to_db(value) for value in after)
+        else:
+            groups = []
+            for group in keyset_clauses(ordering, after):
+                groups.append('(' + ' AND '.join(f'{column} {SQL_OPERATORS[op]} ?' for column, op, _ in group) + ')')
+                params.extend(_to_db(value) for _, _, value in group)
+            clauses.append('(' + ' OR '.join(groups) + ')')
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def _to_db(value):
+    if isinstance(value, bool):
+        return int(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _to_dict(row):
+    data = dict(row)
+    # RETURNING * includes it; rows never show it
+    data.pop(PARTITION_COLUMN, None)
+    for column in BOOLEAN_COLUMNS.intersection(data):
+        if data[column] is not None:
+            data[column] = bool(data[column])
+    return data
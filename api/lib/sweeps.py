@@ -0,0 +1,222 @@
+"""Set-based status sweeps, run by a background thread or from cron
+
+Nothing in the request path notices that a date has passed: a reservation
+whose guest never arrived stays ``booked`` and keeps its room, and a guest
+past their check-out date stays ``checked_in`` until the desk acts. The
+sweeps catch up in bulk, each as a few storage statements over every
+matching row rather than one request per booking:
+
+* ``no_shows`` - ``booked`` reservations more than ``NO_SHOW_GRACE_DAYS``
+  past their check-in date become ``no_show`` (one conditional update)
+* ``overdue_checkouts`` - ``checked_in`` stays past their check-out date,
+  reported for the desk; they are not checked out automatically
+* ``room_availability`` - ``rooms.is_available`` recomputed from the
+  active bookings, fixing rooms a no-show or a lost request left behind
+
+Every update repeats its precondition in the filter, so a sweep racing a
+desk action, or another process running the same sweep, changes nothing
+twice. Each property is swept separately, through its own storage.
+``SWEEP_INTERVAL`` runs them in a thread of the Flask app; cron and Vercel
+use ``python -m api.sweeps`` and ``/api/sweeps`` instead.
+"""
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from api.lib.aggregates import get_stats
+from api.lib.analytics import get_report_engine
+from api.lib.availability import get_occupancy_map
+from api.lib.cache import get_response_cache
+from api.lib.events import get_change_feed
+from api.lib.hotels import HOTELS, current_hotel, use_hotel
+from api.lib.intervals import ACTIVE_STATUSES, get_conflict_index
+from api.lib.pagination import scan
+from api.lib.storage import get_storage
+
+NO_SHOW_GRACE_DAYS = int(os.environ.get('NO_SHOW_GRACE_DAYS', 1))
+
+# Seconds between runs in the Flask app; 0 leaves sweeping to cron
+INTERVAL = float(os.environ.get('SWEEP_INTERVAL', 0))
+
+# Ids per ``IN (...)`` filter, well inside PostgREST's URL length limit
+ID_CHUNK = 200
+
+
+def chunked(ids, size=ID_CHUNK):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def mark_no_shows(storage, today):
+    """``booked`` -> ``no_show`` once the check-in date is past the grace period"""
+    cutoff = (today - timedelta(days=NO_SHOW_GRACE_DAYS)).isoformat()
+    marked = storage.update('bookings', {'status': 'no_show'}, [
+        ('status', 'eq', 'booked'),
+        ('check_in_date', 'lt', cutoff)
+    ])
+    if marked:
+        for booking in marked:
+            get_conflict_index().booking_released(booking['room_id'], booking['id'])
+            get_occupancy_map().booking_released(booking['room_id'], booking['id'])
+        get_stats().invalidate()
+        get_report_engine().bookings_changed([booking['id'] for booking in marked])
+        get_response_cache().invalidate('bookings')
+        get_change_feed().publish('bookings', 'updated', marked)
+    return {'changed': len(marked), 'ids': [booking['id'] for booking in marked]}
+
+
+def find_overdue_checkouts(storage, today):
+    """``checked_in`` stays whose check-out date has passed"""
+    overdue = list(scan(storage, 'bookings', ('id', 'room_id', 'check_out_date'), [
+        ('status', 'eq', 'checked_in'),
+        ('check_out_date', 'lt', today.isoformat())
+    ]))
+    return {'changed': 0, 'ids': [booking['id'] for booking in overdue], 'overdue': len(overdue)}
+
+
+def sync_room_availability(storage, today):
+    """Set ``is_available`` to whether the room has no active booking"""
+    occupied = {
+        booking['room_id']
+        for booking in scan(storage, 'bookings', ('id', 'room_id'), [('status', 'in', list(ACTIVE_STATUSES))])
+    }
+    taken, released = [], []
+    for room in scan(storage, 'rooms', ('id', 'is_available')):
+        if room['is_available'] and room['id'] in occupied:
+            taken.append(room['id'])
+        elif not room['is_available'] and room['id'] not in occupied:
+            released.append(room['id'])
+
+    changed = []
+    for ids, was, now in ((taken, True, False), (released, False, True)):
+        for chunk in chunked(ids):
+            changed.extend(storage.update('rooms', {'is_available': now}, [
+                ('id', 'in', chunk),
+                ('is_available', 'eq', was)
+            ]))
+    if changed:
+        get_stats().invalidate()
+        get_response_cache().invalidate('rooms', 'bookings')
+        get_change_feed().publish('rooms', 'updated', [
+            {'id': room['id'], 'is_available': room['is_available']} for room in changed
+        ])
+    return {
+        'changed': len(changed),
+        'ids': [room['id'] for room in changed],
+        'taken': sum(1 for room in changed if not room['is_available']),
+        'released': sum(1 for room in changed if room['is_available'])
+    }
+
+
+# Run order matters: no-shows give their rooms back to room_availability
+SWEEPS = {
+    'no_shows': mark_no_shows,
+    'overdue_checkouts': find_overdue_checkouts,
+    'room_availability': sync_room_availability,
+}
+
+
+class SweepRunner:
+    """Runs the sweeps on demand or on a timer, and keeps their stats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.failures = 0
+        self.last_run = 0.0
+        self.last_duration_ms = 0.0
+        self.no_shows_marked = 0
+        self._overdue = {}
+        self.rooms_taken = 0
+        self.rooms_released = 0
+
+    def run_all(self, names=None, today=None):
+        """:meth:`run` for every property; returns ``{hotel_id: {name: result}}``"""
+        results = {}
+        for hotel_id in HOTELS:
+            with use_hotel(hotel_id):
+                results[hotel_id] = self.run(names, today)
+        return results
+
+    def run(self, names=None, today=None, storage=None):
+        """Run the named sweeps (all by default) for the current property; returns ``{name: result}``"""
+        unknown = set(names or ()) - set(SWEEPS)
+        if unknown:
+            raise ValueError(f"Unknown sweep(s): {', '.join(sorted(unknown))}")
+        today = today or date.today()
+        storage = storage or get_storage()
+        results = {}
+        # One run at a time per process; the timer and a cron request may overlap
+        with self._running:
+            started = time.perf_counter()
+            for name, sweep in SWEEPS.items():
+                if names and name not in names:
+                    continue
+                sweep_started = time.perf_counter()
+                try:
+                    result = sweep(storage, today)
+                except Exception as e:
+                    print(f'Sweep {name} failed: {e}')
+                    result = {'error': str(e)}
+                result['ms'] = round((time.perf_counter() - sweep_started) * 1000, 1)
+                results[name] = result
+            self._record(results, time.perf_counter() - started)
+        return results
+
+    def _record(self, results, elapsed):
+        with self._lock:
+            self.runs += 1
+            self.failures += sum(1 for result in results.values() if 'error' in result)
+            self.last_run = time.time()
+            self.last_duration_ms = round(elapsed * 1000, 1)
+            self.no_shows_marked += results.get('no_shows', {}).get('changed', 0)
+            if 'overdue' in results.get('overdue_checkouts', {}):
+                self._overdue[current_hotel.get()] = results['overdue_checkouts']['overdue']
+            self.rooms_taken += results.get('room_availability', {}).get('taken', 0)
+            self.rooms_released += results.get('room_availability', {}).get('released', 0)
+
+    def start(self, interval=INTERVAL):
+        """Sweep every ``interval`` seconds in a daemon thread, starting now"""
+        if interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                self.run_all()
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=loop, name='sweeps', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'failures': self.failures,
+                'last_run_seconds': self.last_run,
+                'last_duration_ms': self.last_duration_ms,
+                'no_shows_marked': self.no_shows_marked,
+                'overdue_checkouts': sum(self._overdue.values()),
+                'rooms_taken': self.rooms_taken,
+                'rooms_released': self.rooms_released
+            }
+
+
+_runner = SweepRunner()
+
+
+def get_sweep_runner():
+    """Process-wide sweep runner"""
+    return _runner
@@ -0,0 +1,55 @@
+"""Booking state machine for check-in, check-out and cancel
+
+Each action is one conditional update through
+``Storage.transition_booking``; when its precondition fails the booking's
+current status picks the error message.
+"""
+from collections import namedtuple
+
+Transition = namedtuple('Transition', 'from_statuses status stamp release_room refusals')
+
+TRANSITIONS = {
+    'checkin': Transition(
+        ('booked',), 'checked_in', 'actual_check_in', False,
+        {None: 'Only booked reservations can be checked in'}
+    ),
+    'checkout': Transition(
+        ('checked_in',), 'checked_out', 'actual_check_out', True,
+        {None: 'Only checked-in guests can be checked out'}
+    ),
+    'cancel': Transition(
+        ('booked',), 'cancelled', None, True,
+        {
+            'checked_in': 'Cannot cancel a booking for a checked-in guest',
+            'cancelled': 'Booking is already cancelled',
+            'checked_out': 'Cannot cancel a completed booking',
+            None: 'Only booked reservations can be cancelled'
+        }
+    ),
+}
+
+
+class TransitionError(Exception):
+    """Raised when a booking cannot take the requested action"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def transition(storage, action, booking_id):
+    """Apply ``action`` to the booking; ``(updated row, whether its room was released)``"""
+    try:
+        booking_id = int(booking_id)
+    except (TypeError, ValueError):
+        raise TransitionError('Booking ID must be an integer')
+
+    rule = TRANSITIONS[action]
+    booking, status, room_released = storage.transition_booking(
+        booking_id, rule.from_statuses, rule.status, rule.stamp, rule.release_room
+    )
+    if booking is None:
+        if status is None:
+            raise TransitionError('Booking not found', 404)
+        raise TransitionError(rule.refusals.get(status, rule.refusals[None]))
+    return booking, room_released
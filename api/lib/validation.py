@@ -0,0 +1,146 @@
+"""Validation entry points that keep marshmallow off the import path
+
+Each schema is also compiled once into a plain-Python validator for the
+common case: known fields, values already of the right JSON type, every
+required field present. It runs the schema's own validators (``Range``,
+``OneOf``, ``Email``) and returns what ``Schema.load`` would. Anything it
+does not accept outright (coercible strings, missing or unknown fields,
+invalid values) goes through marshmallow, so conversions and error
+messages are unchanged.
+"""
+import math
+
+# Returned by a converter when the value needs marshmallow
+MISMATCH = object()
+
+
+class ValidationError(Exception):
+    """Input failed schema validation; ``messages`` mirrors marshmallow's"""
+
+    def __init__(self, messages):
+        super().__init__(messages)
+        self.messages = messages
+
+
+class LazySchema:
+    """Stand-in for a schema instance that is only built on first ``load``"""
+
+    def __init__(self, name, **options):
+        self.name = name
+        self.options = options
+        self._schema = None
+        self._compiled = None
+
+    @property
+    def schema(self):
+        if self._schema is None:
+            from api.lib import schemas
+            self._schema = getattr(schemas, self.name)(**self.options)
+        return self._schema
+
+    @property
+    def compiled(self):
+        if self._compiled is None:
+            self._compiled = compile_schema(self.schema)
+        return self._compiled
+
+    def load(self, data, **kwargs):
+        if not kwargs:
+            result = self.compiled(data)
+            if result is not None:
+                return result
+
+        schema = self.schema
+        from marshmallow import ValidationError as SchemaError
+        try:
+            return schema.load(data, **kwargs)
+        except SchemaError as e:
+            raise ValidationError(e.messages) from e
+
+
+def _string(value):
+    return value if type(value) is str else MISMATCH
+
+
+def _integer(value):
+    return value if type(value) is int else MISMATCH
+
+
+def _number(value):
+    if type(value) not in (int, float) or not math.isfinite(value):
+        return MISMATCH
+    return float(value)
+
+
+def _boolean(value):
+    return value if type(value) is bool else MISMATCH
+
+
+def _date(value):
+    # Only YYYY-MM-DD; fromisoformat alone also takes week dates and basic format
+    if type(value) is not str or len(value) != 10 or value[4] != '-' or value[7] != '-':
+        return MISMATCH
+    from datetime import date
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return MISMATCH
+
+
+def compile_schema(schema):
+    """Fast path for ``schema.load(data)``; returns None when marshmallow must decide"""
+    from marshmallow import RAISE, fields
+    from marshmallow import ValidationError as SchemaError
+
+    converters = {
+        fields.String: _string,
+        fields.Email: _string,
+        fields.Integer: _integer,
+        fields.Float: _number,
+        fields.Boolean: _boolean,
+        fields.Date: _date,
+    }
+
+    def never(data):
+        return None
+
+    if schema.unknown != RAISE or any(schema._hooks.values()) or schema.partial not in (True, False, None):
+        return never
+
+    steps = []
+    required = set()
+    for name, field in schema.load_fields.items():
+        convert = converters.get(type(field))
+        if convert is None:
+            return never
+        key = field.data_key or name
+        steps.append((key, name, convert, tuple(field.validators), field.allow_none))
+        if field.required and not schema.partial:
+            required.add(key)
+    known = frozenset(key for key, *_ in steps)
+
+    def load(data):
+        if type(data) is not dict or not known.issuperset(data) or not required.issubset(data):
+            return None
+        result = {}
+        try:
+            for key, name, convert, validators, allow_none in steps:
+                if key not in data:
+                    continue
+                value = data[key]
+                if value is None:
+                    if not allow_none:
+                        return None
+                    result[name] = None
+                    continue
+                value = convert(value)
+                if value is MISMATCH:
+                    return None
+                for validator in validators:
+                    validator(value)
+                result[name] = value
+        except SchemaError:
+            return None
+        return result
+
+    return load
@@ -0,0 +1,123 @@
+from api.lib.admission import get_admission
+from api.lib.analytics import get_report_engine
+from api.lib.availability import get_occupancy_map
+from api.lib.cache import get_response_cache
+from api.lib.events import get_change_feed
+from api.lib.hotels import for_hotel
+from api.lib.idempotency import get_idempotency
+from api.lib.http import parse_event, to_vercel
+from api.lib.intervals import get_conflict_index
+from api.lib.membership import get_known_keys
+from api.lib.metrics import CONTENT_TYPE, render
+from api.lib.search import get_guest_index
+from api.lib.sweeps import get_sweep_runner
+
+# Component stats exported next to the request metrics:
+# prefix -> (stats source, {stat: (type, help)})
+COMPONENTS = {
+    'cache': (get_response_cache, {
+        'entries': ('gauge', 'Cached list responses'),
+        'hits': ('counter', 'Response cache hits'),
+        'misses': ('counter', 'Response cache misses'),
+        'hit_ratio': ('gauge', 'Hits over lookups since start'),
+        'evictions': ('counter', 'Entries dropped to stay under CACHE_MAX_ENTRIES'),
+        'invalidations': ('counter', 'Entries dropped by writes'),
+        'not_modified': ('counter', 'Requests answered with 304'),
+        'calls_saved': ('counter', 'Storage calls avoided by cache hits'),
+    }),
+    'admission': (get_admission, {
+        'limited': ('counter', 'Requests refused by a client rate limit'),
+        'shed': ('counter', 'Requests shed while their class was at its concurrency cap'),
+        'store_errors': ('counter', 'Rate limit checks skipped because the bucket store failed'),
+        'in_flight_heavy': ('gauge', 'Heavy requests running in this process'),
+        'in_flight_export': ('gauge', 'Exports streaming from this process'),
+        'in_flight_events': ('gauge', 'Event streams open in this process'),
+    }),
+    'idempotency': (get_idempotency, {
+        'executed': ('counter', 'Keyed writes run'),
+        'replayed': ('counter', 'Keyed writes answered with the stored response'),
+        'coalesced': ('counter', 'Keyed writes that waited for a duplicate running in this process'),
+        'in_progress': ('counter', 'Keyed writes refused while a duplicate was still running'),
+        'mismatched': ('counter', 'Keys reused for a different request'),
+        'store_errors': ('counter', 'Keyed writes run without a record because the store failed'),
+        'evictions': ('counter', 'Records dropped to stay under IDEMPOTENCY_MAX_ENTRIES or expired'),
+    }),
+    'reports': (get_report_engine, {
+        'full_loads': ('counter', 'Report engine rebuilds from storage'),
+        'incremental_refreshes': ('counter', 'Report engine partial refreshes'),
+        'days_recomputed': ('counter', 'Days recomputed by partial refreshes'),
+    }),
+    'guest_index': (get_guest_index, {
+        'documents': ('gauge', 'Guests in the search index'),
+        'trigrams': ('gauge', 'Distinct trigrams in the search index'),
+        'loaded': ('gauge', 'Whether the search index is loaded'),
+    }),
+    'conflict_index': (get_conflict_index, {
+        'rooms': ('gauge', 'Rooms with bookings in the conflict index'),
+        'bookings': ('gauge', 'Active bookings in the conflict index'),
+        'discarded_loads': ('counter', 'Room loads dropped because a booking changed while they ran'),
+    }),
+    'known_keys': (get_known_keys, {
+        'loads': ('counter', 'Known id / email / room number loads from storage'),
+        'probes': ('counter', 'Existence checks that needed a LIMIT 1 query'),
+        'probes_skipped': ('counter', 'Existence checks answered in-process'),
+        'skip_ratio': ('gauge', 'Checks answered in-process over all checks since start'),
+        'false_positives': ('counter', 'Probes for a value the filters held that found no row'),
+        'known': ('gauge', 'Ids, emails and room numbers held'),
+    }),
+    'events': (get_change_feed, {
+        'buffered': ('gauge', 'Change events kept for resuming clients'),
+        'published': ('counter', 'Change events published'),
+        'streams': ('gauge', 'Open /api/events streams'),
+    }),
+    'sweeps': (get_sweep_runner, {
+        'runs': ('counter', 'Sweep runs in this process'),
+        'failures': ('counter', 'Sweeps that raised'),
+        'last_run_seconds': ('gauge', 'Unix time of the last sweep run'),
+        'last_duration_ms': ('gauge', 'Duration of the last sweep run'),
+        'no_shows_marked': ('counter', 'Bookings marked no_show'),
+        'overdue_checkouts': ('gauge', 'Checked-in stays past their check-out date at the last run'),
+        'rooms_taken': ('counter', 'Rooms set unavailable to match their active bookings'),
+        'rooms_released': ('counter', 'Rooms set available with no active booking'),
+    }),
+    'occupancy_map': (get_occupancy_map, {
+        'rooms': ('gauge', 'Rooms in the occupancy bitmap'),
+        'stays': ('gauge', 'Active stays in the occupancy bitmap'),
+        'loaded': ('gauge', 'Whether the occupancy bitmap is loaded'),
+    }),
+}
+
+def handler(event, context):
+    """Vercel serverless function handler for metrics endpoint"""
+    return to_vercel(dispatch(*parse_event(event)))
+
+@for_hotel
+def dispatch(method, query_params, body, request_headers=None):
+    """Request metrics and component stats in Prometheus text format"""
+
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Content-Type': CONTENT_TYPE,
+        'Cache-Control': 'no-store'
+    }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {**headers, 'Content-Type': 'application/json'},
+            'data': {'error': 'Method not allowed'}
+        }
+
+    extra = {}
+    for prefix, (source, fields) in COMPONENTS.items():
+        stats = source().stats()
+        for field, (kind, help_text) in fields.items():
+            name = f'{prefix}_{field}_total' if kind == 'counter' else f'{prefix}_{field}'
+            extra[name] = (kind, help_text, float(stats[field]))
+
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        # A single text chunk; see api/lib/http.py
+        'stream': [render(extra)]
+    }
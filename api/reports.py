@@ -0,0 +1,117 @@
+from datetime import date, timedelta
+from api.lib.analytics import GROUPS, MAX_PICKUP_DAYS, get_report_engine
+from api.lib.storage import get_storage
+from api.lib.hotels import for_hotel
+from api.lib.http import parse_event, to_vercel
+
+# Longest date range a single report covers
+MAX_REPORT_DAYS = 1096
+DEFAULT_REPORT_DAYS = 30
+
+def handler(event, context):
+    """Vercel serverless function handler for reports endpoint"""
+    return to_vercel(dispatch(*parse_event(event)))
+
+@for_hotel
+def dispatch(method, query_params, body, request_headers=None):
+    """Route a parsed request to the matching report"""
+
+    # CORS headers
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+        'Content-Type': 'application/json'
+    }
+
+    # Handle OPTIONS for CORS
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'data': None
+        }
+
+    try:
+        if method == 'GET':
+            action = query_params.get('action', 'occupancy')
+            if action == 'occupancy':
+                return handle_occupancy_report(query_params, headers)
+            elif action == 'pickup':
+                return handle_pickup_report(query_params, headers)
+            return {
+                'statusCode': 404,
+                'headers': headers,
+                'data': {'error': f'Unknown report: {action}'}
+            }
+        else:
+            return {
+                'statusCode': 405,
+                'headers': headers,
+                'data': {'error': 'Method not allowed'}
+            }
+    except Exception as e:
+        print(f'Reports API Error: {str(e)}')
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'data': {'error': 'Internal server error', 'details': str(e)}
+        }
+
+def parse_range(params):
+    """``(start, end)`` from the query, defaulting to the last 30 days"""
+    end = date.fromisoformat(params['end']) if params.get('end') else date.today()
+    if params.get('start'):
+        start = date.fromisoformat(params['start'])
+    else:
+        start = end - timedelta(days=DEFAULT_REPORT_DAYS - 1)
+
+    if end < start:
+        raise ValueError('end must not be before start')
+    if (end - start).days >= MAX_REPORT_DAYS:
+        raise ValueError(f'Reports cover at most {MAX_REPORT_DAYS} days')
+    return start, end
+
+def bad_request(message, headers):
+    return {
+        'statusCode': 400,
+        'headers': headers,
+        'data': {'error': message}
+    }
+
+def handle_occupancy_report(params, headers):
+    """Occupancy, ADR and RevPAR by day, week or room type"""
+    group = params.get('group', 'day')
+    if group not in GROUPS:
+        return bad_request(f"group must be one of: {', '.join(GROUPS)}", headers)
+
+    try:
+        start, end = parse_range(params)
+    except ValueError as e:
+        return bad_request(str(e), headers)
+
+    if params.get('refresh', '').lower() == 'true':
+        get_report_engine().invalidate()
+
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'data': get_report_engine().occupancy(get_storage(), start, end, group)
+    }
+
+def handle_pickup_report(params, headers):
+    """Room-nights on the books for a stay range, by days before arrival"""
+    try:
+        start, end = parse_range(params)
+        max_days = int(params.get('max_days', 90))
+    except ValueError as e:
+        return bad_request(str(e), headers)
+
+    if not 0 <= max_days <= MAX_PICKUP_DAYS:
+        return bad_request(f'max_days must be between 0 and {MAX_PICKUP_DAYS}', headers)
+
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'data': get_report_engine().pickup(get_storage(), start, end, max_days)
+    }
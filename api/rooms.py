@@ -1,28 +1,31 @@
-from supabase import create_client, Client
-from marshmallow import Schema, fields, ValidationError, validate
-import os
-import json
+from datetime import date
+from api.lib.aggregates import get_stats
+from api.lib.analytics import get_report_engine
+from api.lib.availability import get_occupancy_map
+from api.lib import batch
+from api.lib.cache import get_response_cache
+from api.lib.events import get_change_feed
+from api.lib.membership import get_known_keys
+from api.lib.pagination import InvalidCursor, list_page
+from api.lib.projection import InvalidFields, parse_projection
+from api.lib.storage import UniqueViolation, get_storage
+from api.lib.hotels import for_hotel
+from api.lib.idempotency import idempotent
+from api.lib.http import parse_event, to_vercel
+from api.lib.validation import LazySchema, ValidationError
 
-# Initialize Supabase client
-supabase: Client = create_client(
-    os.environ.get('SUPABASE_URL'),
-    os.environ.get('SUPABASE_SERVICE_KEY')
-)
-
-# Validation schema
-class RoomSchema(Schema):
-    room_number = fields.Str(required=True)
-    room_type = fields.Str(required=True, validate=validate.OneOf(['single', 'double', 'suite', 'dorm']))
-    capacity = fields.Int(required=True, validate=validate.Range(min=1))
-    price_per_night = fields.Float(required=True, validate=validate.Range(min=0))
-
-room_schema = RoomSchema()
+# Validation schema (marshmallow is imported on first use)
+room_schema = LazySchema('RoomSchema')
+room_update_schema = LazySchema('RoomUpdateSchema', partial=True)
 
 def handler(event, context):
     """Vercel serverless function handler for rooms endpoint"""
-    # Parse the request
-    method = event.get('httpMethod', event.get('method', 'GET'))
-    query_params = event.get('queryStringParameters', {}) or {}
+    return to_vercel(dispatch(*parse_event(event)))
+
+@for_hotel
+@idempotent
+def dispatch(method, query_params, body, request_headers=None):
+    """Route a parsed request to the matching rooms handler"""
     
     # CORS headers
     headers = {
@@ -37,90 +40,206 @@ def handler(event, context):
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': ''
+            'data': None
         }
     
     try:
         if method == 'GET':
-            return handle_get_rooms(query_params, headers)
+            if query_params.get('action') == 'availability':
+                return handle_room_availability(query_params, headers)
+            return handle_get_rooms(query_params, headers, request_headers)
         elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
+            if isinstance(body, list):
+                return handle_create_rooms_batch(body, headers)
             return handle_create_room(body, headers)
         elif method == 'PUT':
-            body = json.loads(event.get('body', '{}'))
             return handle_update_room(query_params, body, headers)
         else:
             return {
                 'statusCode': 405,
                 'headers': headers,
-                'body': json.dumps({'error': 'Method not allowed'})
+                'data': {'error': 'Method not allowed'}
             }
     except Exception as e:
         print(f'Rooms API Error: {str(e)}')
         return {
             'statusCode': 500,
             'headers': headers,
-            'body': json.dumps({'error': 'Internal server error', 'details': str(e)})
+            'data': {'error': 'Internal server error', 'details': str(e)}
         }
 
-def handle_get_rooms(params, headers):
+def handle_get_rooms(params, headers, request_headers=None):
     """Get all rooms with optional filtering"""
     skip = int(params.get('skip', 0))
     limit = int(params.get('limit', 100))
     available = params.get('available')
     room_type = params.get('room_type')
+    cursor = params.get('cursor')
     
-    query = supabase.table('rooms').select('*')
+    filters = {}
     
     if available is not None:
-        is_available = available.lower() == 'true'
-        query = query.eq('is_available', is_available)
+        filters['is_available'] = available.lower() == 'true'
     
     if room_type:
-        query = query.eq('room_type', room_type)
+        filters['room_type'] = room_type
+    
+    # Served from the response cache until a room or booking write
+    cache = get_response_cache()
+    try:
+        projection = parse_projection('rooms', params)
+        key = (skip, limit, cursor, tuple(sorted(filters.items())), projection.key)
+        entry = cache.fetch('rooms', key, lambda: list_page(
+            get_storage(), 'rooms', limit, skip, cursor, projection.columns, filters=filters
+        ))
+    except (InvalidCursor, InvalidFields) as e:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'data': {'error': str(e)}
+        }
+    
+    return cache.respond(entry, headers, request_headers)
+
+def handle_room_availability(params, headers):
+    """Rooms free on every day of a stay, answered from the occupancy bitmap"""
+    check_in = params.get('check_in')
+    check_out = params.get('check_out')
+    room_type = params.get('room_type')
+    capacity = params.get('capacity')
+    
+    if not check_in or not check_out:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'data': {'error': 'check_in and check_out are required'}
+        }
+    
+    try:
+        start = date.fromisoformat(check_in)
+        end = date.fromisoformat(check_out)
+        min_capacity = int(capacity) if capacity else None
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'data': {'error': 'Dates must be YYYY-MM-DD and capacity a number'}
+        }
+    
+    if end <= start:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'data': {'error': 'check_out must be after check_in'}
+        }
     
-    response = query.range(skip, skip + limit - 1).order('created_at', desc=True).execute()
+    rooms = get_occupancy_map().free_rooms(
+        get_storage(), start, end, room_type.lower() if room_type else None, min_capacity
+    )
     
     return {
         'statusCode': 200,
         'headers': headers,
-        'body': json.dumps(response.data)
+        'data': rooms
     }
 
 def handle_create_room(data, headers):
     """Create a new room"""
+    storage = get_storage()
     try:
         # Validate input
         validated_data = room_schema.load(data)
         
-        # Check if room number already exists
-        existing = supabase.table('rooms').select('id').eq('room_number', validated_data['room_number']).execute()
-        if existing.data:
-            return {
-                'statusCode': 400,
-                'headers': headers,
-                'body': json.dumps({'error': 'Room number already exists'})
-            }
+        # Check if room number already exists; numbers never seen need no query
+        known = get_known_keys()
+        if not known.is_new(storage, 'rooms', 'room_number', validated_data['room_number']):
+            return duplicate_room_number(headers)
         
         # Add default availability
         validated_data['is_available'] = True
         
-        # Create room
-        response = supabase.table('rooms').insert(validated_data).execute()
+        # Create room; the unique constraint catches numbers added elsewhere
+        try:
+            room = storage.insert('rooms', validated_data)[0]
+        except UniqueViolation:
+            return duplicate_room_number(headers)
+        known.added('rooms', [room])
+        get_stats().room_created(is_available=True)
+        get_occupancy_map().rooms_added([room])
+        get_report_engine().rooms_changed()
+        get_response_cache().invalidate('rooms')
+        get_change_feed().publish('rooms', 'created', [room])
         
         return {
             'statusCode': 201,
             'headers': headers,
-            'body': json.dumps(response.data[0])
+            'data': room
         }
     
     except ValidationError as e:
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Validation failed', 'details': e.messages})
+            'data': {'error': 'Validation failed', 'details': e.messages}
         }
 
+def duplicate_room_number(headers):
+    """400 for a room number already in use"""
+    return {
+        'statusCode': 400,
+        'headers': headers,
+        'data': {'error': 'Room number already exists'}
+    }
+
+def handle_create_rooms_batch(items, headers):
+    """Create many rooms with one uniqueness check and one insert"""
+    storage = get_storage()
+    if len(items) > batch.MAX_BATCH_SIZE:
+        return batch.too_large(len(items), headers)
+    
+    results = [None] * len(items)
+    valid = []
+    
+    # Validate every item before touching the database
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, room_schema.load(item)))
+        except ValidationError as e:
+            results[index] = batch.item_error(index, 'Validation failed', e.messages)
+    
+    # Room numbers must be unique against the table and within the batch
+    existing = {
+        row['room_number'] for row in
+        batch.select_in(storage, 'rooms', 'room_number', 'room_number', [data['room_number'] for _, data in valid])
+    }
+    pending = []
+    for index, data in valid:
+        if data['room_number'] in existing:
+            results[index] = batch.item_error(index, 'Room number already exists')
+        else:
+            existing.add(data['room_number'])
+            data['is_available'] = True
+            pending.append((index, data))
+    
+    # Room numbers taken by a concurrent request since the check fail their items only
+    inserted, rejected = batch.insert_unique(
+        storage, 'rooms', 'room_number', pending, 'Room number already exists'
+    )
+    for result in rejected:
+        results[result['index']] = result
+    created = [row for _, row in inserted]
+    if created:
+        for index, row in inserted:
+            results[index] = batch.item_created(index, row)
+        get_known_keys().added('rooms', created)
+        get_stats().room_created(is_available=True, count=len(created))
+        get_occupancy_map().rooms_added(created)
+        get_report_engine().rooms_changed()
+        get_response_cache().invalidate('rooms')
+        get_change_feed().publish('rooms', 'created', created)
+    
+    return batch.batch_response(results, headers)
+
 def handle_update_room(params, data, headers):
     """Update room details"""
     room_id = params.get('id')
@@ -129,29 +248,54 @@ def handle_update_room(params, data, headers):
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': 'Room ID is required'})
+            'data': {'error': 'Room ID is required'}
         }
     
     try:
+        changes = room_update_schema.load(data)
+        if not changes:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'data': {'error': 'No fields to update'}
+            }
+        
         # Update room
-        response = supabase.table('rooms').update(data).eq('id', room_id).execute()
+        updated = get_storage().update('rooms', changes, {'id': room_id})
         
-        if not response.data:
+        if not updated:
             return {
                 'statusCode': 404,
                 'headers': headers,
-                'body': json.dumps({'error': 'Room not found'})
+                'data': {'error': 'Room not found'}
             }
         
+        # The room number may have changed; the old one is probed until the next load
+        get_known_keys().added('rooms', updated)
+        # Availability may have been edited directly, so recount
+        get_stats().invalidate()
+        # Type or capacity may have changed
+        get_occupancy_map().invalidate()
+        get_report_engine().rooms_changed()
+        # Booking lists embed room details
+        get_response_cache().invalidate('rooms', 'bookings')
+        get_change_feed().publish('rooms', 'updated', updated)
+        
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': json.dumps(response.data[0])
+            'data': updated[0]
         }
     
+    except ValidationError as e:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'data': {'error': 'Validation failed', 'details': e.messages}
+        }
     except Exception as e:
         return {
             'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'error': str(e)})
+            'data': {'error': str(e)}
         }
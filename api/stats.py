@@ -0,0 +1,58 @@
+from api.lib.aggregates import get_stats
+from api.lib.storage import get_storage
+from api.lib.hotels import for_hotel
+from api.lib.http import parse_event, to_vercel
+
+def handler(event, context):
+    """Vercel serverless function handler for dashboard stats endpoint"""
+    return to_vercel(dispatch(*parse_event(event)))
+
+@for_hotel
+def dispatch(method, query_params, body, request_headers=None):
+    """Route a parsed request to the matching dashboard stats handler"""
+
+    # CORS headers
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+        'Content-Type': 'application/json'
+    }
+
+    # Handle OPTIONS for CORS
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'data': None
+        }
+
+    try:
+        if method == 'GET':
+            return handle_get_stats(query_params, headers)
+        else:
+            return {
+                'statusCode': 405,
+                'headers': headers,
+                'data': {'error': 'Method not allowed'}
+            }
+    except Exception as e:
+        print(f'Stats API Error: {str(e)}')
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'data': {'error': 'Internal server error', 'details': str(e)}
+        }
+
+def handle_get_stats(params, headers):
+    """Get dashboard totals, recomputing them only when stale"""
+    stats = get_stats()
+
+    if params.get('refresh', '').lower() == 'true':
+        stats.invalidate()
+
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'data': stats.snapshot(get_storage())
+    }
@@ -0,0 +1,131 @@
+"""Run the status sweeps: ``/api/sweeps`` for Vercel Cron, ``python -m api.sweeps`` for cron
+
+Every property is swept unless the request (``X-Hotel-Id`` / ``hotel_id``)
+or ``--hotel`` names one.
+"""
+import argparse
+import hmac
+import os
+import sys
+import time
+from datetime import date
+
+from api.lib.hotels import HEADER, PARAM, UnknownHotel, hotel_from_request, use_hotel
+from api.lib.sweeps import SWEEPS, get_sweep_runner
+from api.lib.http import parse_event, to_vercel
+
+def handler(event, context):
+    """Vercel serverless function handler for sweeps endpoint"""
+    return to_vercel(dispatch(*parse_event(event)))
+
+def dispatch(method, query_params, body, request_headers=None):
+    """Run the sweeps named in ``only`` (all by default) and report what they changed per property"""
+
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+        'Content-Type': 'application/json',
+        'Cache-Control': 'no-store'
+    }
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'data': None
+        }
+
+    # Vercel Cron sends GET with the project's CRON_SECRET as a bearer token
+    if method not in ('GET', 'POST'):
+        return {
+            'statusCode': 405,
+            'headers': headers,
+            'data': {'error': 'Method not allowed'}
+        }
+
+    # No secret means no callers, unless a local setup opts out explicitly
+    secret = os.environ.get('CRON_SECRET')
+    if not secret and os.environ.get('SWEEPS_ALLOW_UNAUTHENTICATED') != '1':
+        return {
+            'statusCode': 503,
+            'headers': headers,
+            'data': {'error': 'CRON_SECRET is not configured'}
+        }
+    if secret and not hmac.compare_digest((request_headers or {}).get('authorization', ''), f'Bearer {secret}'):
+        return {
+            'statusCode': 401,
+            'headers': headers,
+            'data': {'error': 'Unauthorized'}
+        }
+
+    names = [name for name in query_params.get('only', '').split(',') if name]
+    named = (request_headers or {}).get(HEADER) or query_params.get(PARAM)
+    try:
+        results = run(names, hotel_from_request(query_params, request_headers) if named else None)
+    except UnknownHotel as e:
+        return {
+            'statusCode': 404,
+            'headers': headers,
+            'data': {'error': str(e)}
+        }
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'data': {'error': str(e)}
+        }
+    except Exception as e:
+        print(f'Sweeps API Error: {str(e)}')
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'data': {'error': 'Internal server error', 'details': str(e)}
+        }
+
+    failed = any('error' in result for swept in results.values() for result in swept.values())
+    return {
+        'statusCode': 500 if failed else 200,
+        'headers': headers,
+        'data': {'results': results}
+    }
+
+def run(names, hotel_id=None, today=None):
+    """``{hotel_id: {name: result}}`` for one property, or all of them"""
+    runner = get_sweep_runner()
+    if hotel_id is None:
+        return runner.run_all(names, today)
+    with use_hotel(hotel_id):
+        return {hotel_id: runner.run(names, today)}
+
+def report(results):
+    for hotel_id, swept in results.items():
+        for name, result in swept.items():
+            if 'error' in result:
+                print(f'{hotel_id:<12} {name:<18} FAILED  {result["error"]}')
+                continue
+            ids = result['ids']
+            shown = ', '.join(str(i) for i in ids[:10]) + (' ...' if len(ids) > 10 else '')
+            print(f'{hotel_id:<12} {name:<18} {len(ids):>6} {result["ms"]:>8.1f} ms  {shown}')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the booking and room status sweeps')
+    parser.add_argument('--only', default='', help=f"comma-separated subset of: {', '.join(SWEEPS)}")
+    parser.add_argument('--date', type=date.fromisoformat, help='treat this day as today (YYYY-MM-DD)')
+    parser.add_argument('--hotel', help='sweep only this property')
+    parser.add_argument('--every', type=float, default=0, help='keep running, sweeping every N seconds')
+    args = parser.parse_args(argv)
+
+    names = [name for name in args.only.split(',') if name]
+    while True:
+        try:
+            results = run(names, args.hotel, args.date)
+        except ValueError as e:
+            parser.error(str(e))
+        report(results)
+        if args.every <= 0:
+            return 1 if any('error' in result for swept in results.values() for result in swept.values()) else 0
+        time.sleep(args.every)
+
+if __name__ == '__main__':
+    sys.exit(main())
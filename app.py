@@ -1,12 +1,20 @@
 from flask import Flask, render_template, send_from_directory, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 import sys
-import json
 
 # Add the current directory to the path so we can import from api/
 sys.path.insert(0, os.path.dirname(__file__))
 
+from api import guests, rooms, bookings, stats, reports, batch, health, metrics, events, sweeps
+from api.lib.admission import Refused, get_admission
+from api.lib.compression import compress_response
+from api.lib.metrics import get_metrics
+from api.lib.sweeps import get_sweep_runner
+from api.lib import serialization
+
 app = Flask(__name__, 
             static_folder='static',
             template_folder='templates')
@@ -14,6 +22,29 @@ app = Flask(__name__,
 # Enable CORS for all routes
 CORS(app)
 
+# Behind N reverse proxies, rate limit by the client address they forward
+PROXY_HOPS = int(os.environ.get('PROXY_HOPS', 0))
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
+
+class JSONProvider(DefaultJSONProvider):
+    """Request and response JSON through the shared codec (orjson when installed)"""
+
+    def dumps(self, obj, **kwargs):
+        return serialization.dumps(obj, kwargs.get('sort_keys', False))
+
+    def loads(self, s, **kwargs):
+        return serialization.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Bytes straight from the encoder; handler key order is kept
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(serialization.dumpb(obj), mimetype=self.mimetype)
+
+app.json = JSONProvider(app)
+# A long-running server pays the encoder import once, up front
+serialization.get_codec()
+
 @app.route('/')
 def index():
     """Serve the main application page"""
@@ -24,49 +55,90 @@ def serve_static(path):
     """Serve static files"""
     return send_from_directory('static', path)
 
-# Helper function to convert Flask request to Vercel event format
-def flask_to_vercel_event(flask_request):
-    """Convert Flask request to Vercel event format"""
-    return {
-        'httpMethod': flask_request.method,
-        'method': flask_request.method,
-        'queryStringParameters': dict(flask_request.args),
-        'body': flask_request.get_data(as_text=True) if flask_request.data else '{}'
-    }
-
-# Helper function to convert Vercel response to Flask response
-def vercel_to_flask_response(vercel_response):
-    """Convert Vercel response to Flask response"""
-    response = jsonify(json.loads(vercel_response['body']) if vercel_response.get('body') else {})
-    response.status_code = vercel_response.get('statusCode', 200)
-    for key, value in vercel_response.get('headers', {}).items():
-        response.headers[key] = value
-    return response
-
-# API Routes - Import and use the handlers from api/ modules
-@app.route('/api/guests', methods=['GET', 'POST', 'DELETE', 'OPTIONS'])
-def guests_api():
-    """Guests API endpoint"""
-    from api.guests import handler
-    event = flask_to_vercel_event(request)
-    vercel_response = handler(event, {})
-    return vercel_to_flask_response(vercel_response)
-
-@app.route('/api/rooms', methods=['GET', 'POST', 'PUT', 'OPTIONS'])
-def rooms_api():
-    """Rooms API endpoint"""
-    from api.rooms import handler
-    event = flask_to_vercel_event(request)
-    vercel_response = handler(event, {})
-    return vercel_to_flask_response(vercel_response)
-
-@app.route('/api/bookings', methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
-def bookings_api():
-    """Bookings API endpoint"""
-    from api.bookings import handler
-    event = flask_to_vercel_event(request)
-    vercel_response = handler(event, {})
-    return vercel_to_flask_response(vercel_response)
+def call_handler(dispatch, defaults=None, route=None):
+    """Run an API handler in-process and serialize its result exactly once"""
+    route = route or request.path
+    trace = get_metrics().start(route, request.method)
+    response = None
+    ticket = None
+    try:
+        params = {**request.args.to_dict(), **(defaults or {})}
+        try:
+            ticket = get_admission().admit(request.remote_addr, route, request.method, params)
+        except Refused as e:
+            response = jsonify({'error': str(e)})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+
+        body = request.get_json(force=True, silent=True)
+        result = dispatch(
+            request.method,
+            params,
+            {} if body is None else body,
+            {k.lower(): v for k, v in request.headers.items()}
+        )
+        if 'stream' in result:
+            response = app.response_class(result['stream'])
+            # An export or event stream holds its slot until the last chunk is sent
+            response.call_on_close(ticket.release)
+        else:
+            data = result.get('data')
+            response = jsonify(data) if data is not None else app.response_class(status=200)
+        response.status_code = result.get('statusCode', 200)
+        for key, value in result.get('headers', {}).items():
+            response.headers[key] = value
+        # gzip / brotli for large bodies when the client accepts them
+        return compress_response(response, request.headers.get('Accept-Encoding'))
+    finally:
+        if ticket is not None and (response is None or not response.is_streamed):
+            ticket.release()
+        get_metrics().finish(
+            trace,
+            response.status_code if response is not None else 500,
+            request.content_length,
+            # Streamed bodies are sent after this returns; their size is unknown here
+            None if response is None or response.is_streamed else response.content_length
+        )
+
+# API Routes - each handler module is imported and registered once.
+# Vercel deploys the same modules through their handler(event, context) shim;
+# sub-paths map to an ``action`` query param there as well (see vercel.json).
+API_ROUTES = [
+    ('/api/guests/suggest', guests, ['GET', 'OPTIONS'], {'action': 'suggest'}),
+    ('/api/guests/export', guests, ['GET', 'OPTIONS'], {'action': 'export'}),
+    ('/api/guests', guests, ['GET', 'POST', 'DELETE', 'OPTIONS']),
+    ('/api/rooms/availability', rooms, ['GET', 'OPTIONS'], {'action': 'availability'}),
+    ('/api/rooms', rooms, ['GET', 'POST', 'PUT', 'OPTIONS']),
+    ('/api/bookings/export', bookings, ['GET', 'OPTIONS'], {'action': 'export'}),
+    ('/api/bookings', bookings, ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS']),
+    ('/api/stats', stats, ['GET', 'OPTIONS']),
+    ('/api/reports/occupancy', reports, ['GET', 'OPTIONS'], {'action': 'occupancy'}),
+    ('/api/reports/pickup', reports, ['GET', 'OPTIONS'], {'action': 'pickup'}),
+    ('/api/batch', batch, ['POST', 'OPTIONS']),
+    ('/api/events', events, ['GET', 'OPTIONS']),
+    ('/api/sweeps', sweeps, ['GET', 'POST', 'OPTIONS']),
+    ('/api/health', health, ['GET']),
+    ('/api/metrics', metrics, ['GET']),
+]
+
+def register_api_routes(flask_app):
+    """Bind every API path to its module's dispatch function"""
+    for path, module, methods, *defaults in API_ROUTES:
+        defaults = defaults[0] if defaults else {}
+        name = '_'.join([module.__name__.rsplit('.', 1)[-1], *defaults.values()])
+        dispatch = module.dispatch
+        flask_app.add_url_rule(
+            path,
+            endpoint=f'{name}_api',
+            view_func=lambda dispatch=dispatch, defaults=defaults, path=path: call_handler(dispatch, defaults, path),
+            methods=methods
+        )
+
+register_api_routes(app)
+
+# No-show / room availability sweeps every SWEEP_INTERVAL seconds (off by default)
+get_sweep_runner().start()
 
 if __name__ == '__main__':
     # For local development only
@@ -0,0 +1,204 @@
+"""Cost and effect of the server-side rate limiter and admission control
+
+Usage:
+    python benchmarks/bench_admission.py [--seconds 3] [--abusers 16] [--desks 2] [--pause 10]
+                                         [--processes 4] [--latency 2] [--connections 4]
+
+Three parts:
+
+* the cost of one ``admit()`` call with the in-memory and the SQLite bucket
+  store
+* several processes drawing from one SQLite bucket for a few seconds; the
+  total granted should be about ``burst + rate * seconds`` however many
+  processes share it
+* a flood: one client address hammers ``GET /api/bookings`` (a new page
+  each time, so the response cache does not help) from many threads while
+  front-desk clients keep listing rooms and suggesting guests, with
+  admission off and then on. Reports the desk latency, how many of the
+  flood's requests were refused and upstream calls per second, against the
+  in-memory stand-in from ``fake_postgrest.py`` limited to ``--connections``
+  calls at a time. The flood threads run in the server's interpreter, so
+  the desks' median also pays for building the refusals; a real flood pays
+  that on its own machine.
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ['RATE_LIMIT'] = 'on'
+# Desk reads go to the database too, where the flood competes with them
+os.environ['CACHE_TTL'] = '0'
+
+from api.lib import registry  # noqa: E402
+from api.lib.admission import Admission, MemoryBuckets, SQLiteBuckets, get_admission  # noqa: E402
+from api.lib.storage import set_storage  # noqa: E402
+from api.lib.storage.supabase_backend import SupabaseStorage  # noqa: E402
+from app import app  # noqa: E402
+from fake_postgrest import FakePostgrest  # noqa: E402
+
+SHARED_RATE, SHARED_BURST = 50.0, 100.0
+
+
+class PooledPostgrest(FakePostgrest):
+    """Upstream that serves only ``connections`` calls at a time, like a small database"""
+
+    def __init__(self, latency, connections):
+        super().__init__(latency=latency)
+        self._pool = threading.BoundedSemaphore(connections)
+
+    def round_trip(self):
+        with self._pool:
+            super().round_trip()
+
+
+def admit_cost(store, iterations=20000):
+    """Microseconds per admitted read over ``iterations`` distinct clients"""
+    registry.replace('rate_limit_store', store)
+    admission = Admission(rates={'read': (1e6, 1e6)}, concurrency={})
+    started = time.perf_counter()
+    for i in range(iterations):
+        admission.admit(f'10.0.{i % 250}.{i % 7}', '/api/rooms', 'GET', {}).release()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def drain(path, seconds, results):
+    """Child process: take tokens from one shared bucket as fast as possible"""
+    store = SQLiteBuckets(path)
+    granted = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        granted += store.take('shared', SHARED_RATE, SHARED_BURST, time.time())[0]
+    results.put(granted)
+
+
+def shared_grants(processes, seconds):
+    path = os.path.join(tempfile.mkdtemp(), 'buckets.db')
+    # Create the table before the children race for it
+    SQLiteBuckets(path).take('warmup', 1.0, 1.0, time.time())
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=drain, args=(path, seconds, results)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    total = sum(results.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    return total
+
+
+def seed(client, guests, rooms, bookings, rng):
+    client.seed('guests', [
+        {'name': f'Guest {i}', 'email': f'guest{i}@example.com', 'phone': f'555{i:07d}'}
+        for i in range(guests)
+    ])
+    client.seed('rooms', [
+        {'room_number': str(100 + i), 'room_type': 'double', 'capacity': 2,
+         'price_per_night': 120.0, 'is_available': True}
+        for i in range(rooms)
+    ])
+    client.seed('bookings', [
+        {'guest_id': rng.randint(1, guests), 'room_id': rng.randint(1, rooms),
+         'check_in_date': '2025-03-01', 'check_out_date': '2025-03-04', 'total_amount': 360.0, 'status': 'booked'}
+        for _ in range(bookings)
+    ])
+
+
+def flood(upstream, seconds, abusers, desks, pause):
+    """Run the flood for ``seconds``; return desk latencies and the flood's statuses"""
+    stop = time.time() + seconds
+    pages = itertools.count()
+    desk_ms = []
+    flood_statuses = []
+    lock = threading.Lock()
+
+    def abuser():
+        client = app.test_client()
+        client.environ_base['REMOTE_ADDR'] = '203.0.113.9'
+        statuses = []
+        while time.time() < stop:
+            statuses.append(client.get(f'/api/bookings?limit=50&skip={next(pages) % 4000}').status_code)
+            # A remote client's round trip; a refusal costs it that much at least
+            time.sleep(pause)
+        with lock:
+            flood_statuses.extend(statuses)
+
+    def desk(index):
+        client = app.test_client()
+        client.environ_base['REMOTE_ADDR'] = f'198.51.100.{index + 1}'
+        rng = random.Random(index)
+        timings = []
+        while time.time() < stop:
+            url = '/api/rooms' if rng.random() < 0.5 else f'/api/guests/suggest?q=Guest {rng.randrange(100)}'
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.status_code
+            # A person at a desk, not a loop
+            time.sleep(0.05)
+        with lock:
+            desk_ms.extend(timings)
+
+    upstream.calls.clear()
+    threads = [threading.Thread(target=abuser) for _ in range(abusers)]
+    threads += [threading.Thread(target=desk, args=(i,)) for i in range(desks)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(desk_ms), flood_statuses, sum(upstream.calls.values())
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--abusers', type=int, default=16)
+    parser.add_argument('--desks', type=int, default=2)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=2.0, help='simulated ms per upstream call')
+    parser.add_argument('--pause', type=float, default=10.0, help='ms each flood thread waits between requests')
+    parser.add_argument('--connections', type=int, default=4, help='upstream calls served at once')
+    args = parser.parse_args()
+
+    print('admit() per request')
+    print(f"  {'memory store':<14} {admit_cost(MemoryBuckets()):>7.1f} us")
+    sqlite_store = SQLiteBuckets(os.path.join(tempfile.mkdtemp(), 'buckets.db'))
+    print(f"  {'sqlite store':<14} {admit_cost(sqlite_store):>7.1f} us")
+
+    expected = SHARED_BURST + SHARED_RATE * args.seconds
+    print(f'\nOne bucket ({SHARED_RATE:g}/s, burst {SHARED_BURST:g}) shared for {args.seconds:g} s, '
+          f'expect about {expected:.0f} grants')
+    for processes in sorted({1, args.processes}):
+        print(f'  {processes} process(es): {shared_grants(processes, args.seconds)} granted')
+
+    upstream = PooledPostgrest(args.latency / 1000, args.connections)
+    seed(upstream, 500, 100, 5000, random.Random(21))
+    set_storage(SupabaseStorage(client=upstream))
+    admission = get_admission()
+
+    print(f'\nFlood: {args.abusers} threads on GET /api/bookings from one address, '
+          f'{args.desks} desks reading, {args.latency:g} ms per upstream call, {args.connections} at a time')
+    print(f"  {'admission':<10} {'desk p50':>9} {'desk p95':>9} {'flood req':>10} {'refused':>8} {'upstream/s':>11}")
+    for enabled in (False, True):
+        admission.enabled = enabled
+        registry.replace('rate_limit_store', SQLiteBuckets(os.path.join(tempfile.mkdtemp(), 'buckets.db')))
+        desk_ms, statuses, calls = flood(upstream, args.seconds, args.abusers, args.desks, args.pause / 1000)
+        refused = sum(1 for status in statuses if status == 429)
+        print(f"  {'on' if enabled else 'off':<10} {percentile(desk_ms, 50):>7.2f}ms {percentile(desk_ms, 95):>7.2f}ms "
+              f"{len(statuses):>10} {refused / max(1, len(statuses)):>7.0%} {calls / args.seconds:>11.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
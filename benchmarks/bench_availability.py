@@ -0,0 +1,114 @@
+"""Availability search: occupancy bitmap vs. one overlap query per room
+
+Usage:
+    python benchmarks/bench_availability.py [--rooms 500] [--bookings 50000]
+
+Fills a temporary SQLite database with rooms and non-overlapping stays over
+the next year, then answers "which rooms are free for these nights" for
+random date ranges, first by asking the database about each room and then
+with the in-process occupancy bitmap.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.lib.availability import OccupancyMap  # noqa: E402
+from api.lib.intervals import ACTIVE_STATUSES  # noqa: E402
+from api.lib.storage.sqlite_backend import SQLiteStorage  # noqa: E402
+
+ROOM_TYPES = ('single', 'double', 'suite', 'dorm')
+
+
+def load(storage, room_count, booking_count, rng):
+    storage.insert('guests', {'name': 'Bench', 'email': 'bench@example.com', 'phone': '0'})
+    rooms = storage.insert('rooms', [
+        {'room_number': str(100 + i), 'room_type': ROOM_TYPES[i % 4], 'capacity': 1 + i % 4, 'price_per_night': 50.0}
+        for i in range(room_count)
+    ])
+    today = date.today()
+    per_room = max(booking_count // room_count, 1)
+    rows = []
+    for room in rooms:
+        day = rng.randrange(3)
+        for _ in range(per_room):
+            start = today + timedelta(days=day)
+            nights = rng.randrange(1, 4)
+            rows.append({
+                'guest_id': 1,
+                'room_id': room['id'],
+                'check_in_date': start.isoformat(),
+                'check_out_date': (start + timedelta(days=nights)).isoformat(),
+                'total_amount': 50.0 * nights,
+                'status': 'booked'
+            })
+            day += nights + 1 + rng.randrange(4)
+    for start in range(0, len(rows), 5000):
+        storage.insert('bookings', rows[start:start + 5000])
+    return rooms
+
+
+def per_room_queries(storage, rooms, check_in, check_out, room_type):
+    free = []
+    for room in rooms:
+        if room['room_type'] != room_type:
+            continue
+        clash = storage.first('bookings', 'id', [
+            ('room_id', 'eq', room['id']),
+            ('status', 'in', list(ACTIVE_STATUSES)),
+            ('check_in_date', 'lte', check_out),
+            ('check_out_date', 'gte', check_in)
+        ])
+        if clash is None:
+            free.append(room['id'])
+    return free
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=500)
+    parser.add_argument('--bookings', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as workdir:
+        storage = SQLiteStorage(path=os.path.join(workdir, 'bench.db'))
+        rooms = load(storage, args.rooms, args.bookings, rng)
+
+        today = date.today()
+        queries = []
+        for _ in range(args.queries):
+            start = today + timedelta(days=rng.randrange(300))
+            queries.append((start.isoformat(), (start + timedelta(days=rng.randrange(1, 6))).isoformat(),
+                            rng.choice(ROOM_TYPES)))
+
+        started = time.perf_counter()
+        expected = [sorted(per_room_queries(storage, rooms, *query)) for query in queries]
+        naive = (time.perf_counter() - started) / len(queries)
+
+        occupancy = OccupancyMap()
+        started = time.perf_counter()
+        occupancy.free_rooms(storage, today, today)
+        build = time.perf_counter() - started
+
+        started = time.perf_counter()
+        got = [sorted(room['id'] for room in occupancy.free_rooms(storage, ci, co, room_type))
+               for ci, co, room_type in queries]
+        bitmap = (time.perf_counter() - started) / len(queries)
+
+        assert got == expected, 'bitmap and per-room queries disagree'
+        print(f'{args.rooms} rooms, {args.bookings} bookings, {args.queries} searches')
+        print(f'per-room queries: {naive * 1000:8.2f} ms/search')
+        print(f'bitmap:           {bitmap * 1000:8.3f} ms/search (build {build * 1000:.0f} ms once)')
+        print(f'speedup:          {naive / bitmap:8.0f}x')
+        storage.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Import-time and cold-start benchmark with a regression budget
+
+Usage:
+    python benchmarks/bench_coldstart.py [--runs 7] [--write-budget]
+
+For every serverless entry module this spawns fresh interpreters and reports
+the median of:
+
+* import time, read from ``python -X importtime`` (cumulative, top module)
+* time to first response, measured inside the child from the start of the
+  import to the handler returning, for ``/api/health`` and ``/api/rooms``
+* process wall time, which also includes interpreter startup
+
+Cold starts run against a fresh SQLite database so no network is involved.
+The script exits non-zero when any median exceeds the limits stored in
+``coldstart_budget.json``; ``--write-budget`` records the current medians
+times ``--headroom`` as the new limits.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), 'coldstart_budget.json')
+
+IMPORT_TARGETS = ['api.health', 'api.stats', 'api.guests', 'api.rooms', 'api.bookings']
+
+# Route -> module whose Vercel handler serves it
+FIRST_RESPONSE_TARGETS = {
+    '/api/health': 'api.health',
+    '/api/rooms': 'api.rooms',
+}
+
+FIRST_RESPONSE_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import {module} as endpoint
+response = endpoint.handler({{'httpMethod': 'GET', 'queryStringParameters': {{}}}}, {{}})
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({{'ms': elapsed, 'status': response['statusCode']}}))
+"""
+
+
+def child_env(db_dir):
+    env = dict(os.environ)
+    env['STORAGE_BACKEND'] = 'sqlite'
+    env['SQLITE_PATH'] = os.path.join(db_dir, f'cold-{time.perf_counter_ns()}.db')
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+
+def import_time_ms(module, db_dir):
+    """Cumulative import time of ``module`` in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=child_env(db_dir), capture_output=True, text=True, check=True
+    )
+    for line in reversed(result.stderr.splitlines()):
+        parts = [p.strip() for p in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000
+    raise RuntimeError(f'No importtime entry for {module}')
+
+
+def first_response_ms(module, db_dir):
+    """(in-process ms, wall ms) to import ``module`` and serve one GET"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', FIRST_RESPONSE_SCRIPT.format(module=module)],
+        cwd=ROOT, env=child_env(db_dir), capture_output=True, text=True, check=True
+    )
+    wall = (time.perf_counter() - started) * 1000
+    payload = json.loads(result.stdout.strip().splitlines()[-1])
+    if payload['status'] != 200:
+        raise RuntimeError(f'{module} answered {payload["status"]}')
+    return payload['ms'], wall
+
+
+def measure(runs):
+    results = {'import': {}, 'first_response': {}, 'process_wall': {}}
+    with tempfile.TemporaryDirectory() as db_dir:
+        # Warm the bytecode cache so runs measure imports, not compilation
+        import_time_ms('api.bookings', db_dir)
+
+        for module in IMPORT_TARGETS:
+            results['import'][module] = statistics.median(import_time_ms(module, db_dir) for _ in range(runs))
+
+        for route, module in FIRST_RESPONSE_TARGETS.items():
+            samples = [first_response_ms(module, db_dir) for _ in range(runs)]
+            results['first_response'][route] = statistics.median(s[0] for s in samples)
+            results['process_wall'][route] = statistics.median(s[1] for s in samples)
+    return results
+
+
+def check(results, budget):
+    failures = []
+    for section, values in results.items():
+        for name, value in values.items():
+            limit = budget.get(section, {}).get(name)
+            if limit is not None and value > limit:
+                failures.append(f'{section} {name}: {value:.1f} ms > budget {limit:.1f} ms')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--write-budget', action='store_true')
+    parser.add_argument('--headroom', type=float, default=2.0)
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+
+    budget = {}
+    if os.path.exists(BUDGET_FILE):
+        with open(BUDGET_FILE) as f:
+            budget = json.load(f)
+
+    for section, values in results.items():
+        print(section)
+        for name, value in values.items():
+            limit = budget.get(section, {}).get(name)
+            suffix = f'  (budget {limit:.1f})' if limit is not None else ''
+            print(f'  {name:<16} {value:8.1f} ms{suffix}')
+
+    if args.write_budget:
+        new_budget = {
+            section: {name: round(value * args.headroom, 1) for name, value in values.items()}
+            for section, values in results.items()
+        }
+        with open(BUDGET_FILE, 'w') as f:
+            json.dump(new_budget, f, indent=4)
+            f.write('\n')
+        print(f'Budget written to {BUDGET_FILE}')
+        return 0
+
+    failures = check(results, budget)
+    for failure in failures:
+        print(f'!! {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Compare the booking conflict index against the old linear scan
+
+Usage:
+    python benchmarks/bench_conflicts.py [--sizes 10,100,1000,10000] [--queries 2000]
+
+Each size is the number of active bookings on a single room. The linear scan
+reproduces the loop ``handle_create_booking`` used to run over the rows
+returned by Supabase; the network round trip it also paid is not included.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.lib.intervals import RoomIntervals, to_day  # noqa: E402
+
+
+def make_bookings(count, start=date(2025, 1, 1)):
+    """Back-to-back stays of 1-5 nights with a free day between each"""
+    rows = []
+    day = start
+    for booking_id in range(1, count + 1):
+        nights = random.randint(1, 5)
+        check_out = day + timedelta(days=nights)
+        rows.append({
+            'id': booking_id,
+            'check_in_date': day.isoformat(),
+            'check_out_date': check_out.isoformat()
+        })
+        day = check_out + timedelta(days=2)
+    return rows, day
+
+
+def linear_scan(rows, check_in, check_out):
+    for conflict in rows:
+        conflict_in = datetime.fromisoformat(conflict['check_in_date'].replace('Z', '+00:00')).date()
+        conflict_out = datetime.fromisoformat(conflict['check_out_date'].replace('Z', '+00:00')).date()
+        if check_in <= conflict_out and check_out >= conflict_in:
+            return conflict['id']
+    return None
+
+
+def build_index(rows):
+    intervals = RoomIntervals()
+    for row in rows:
+        intervals.add(row['id'], to_day(row['check_in_date']), to_day(row['check_out_date']))
+    return intervals
+
+
+def run(size, queries):
+    rows, last_day = make_bookings(size)
+    span = (last_day - date(2025, 1, 1)).days
+    probes = []
+    for _ in range(queries):
+        check_in = date(2025, 1, 1) + timedelta(days=random.randint(0, span))
+        probes.append((check_in, check_in + timedelta(days=random.randint(1, 4))))
+
+    started = time.perf_counter()
+    expected = [linear_scan(rows, a, b) for a, b in probes]
+    linear = (time.perf_counter() - started) / queries
+
+    started = time.perf_counter()
+    intervals = build_index(rows)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    got = [intervals.find_overlap(a.toordinal(), b.toordinal()) for a, b in probes]
+    indexed = (time.perf_counter() - started) / queries
+
+    # Both must agree on whether a conflict exists
+    mismatches = sum((e is None) != (g is None) for e, g in zip(expected, got))
+    return linear, indexed, build, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000,10000')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    print(f"{'bookings':>10} {'linear us':>12} {'indexed us':>12} {'speedup':>10} {'build ms':>10}")
+    failed = False
+    for size in (int(s) for s in args.sizes.split(',')):
+        linear, indexed, build, mismatches = run(size, args.queries)
+        print(f'{size:>10} {linear * 1e6:>12.2f} {indexed * 1e6:>12.2f} '
+              f'{linear / indexed:>9.1f}x {build * 1e3:>10.2f}')
+        if mismatches:
+            print(f'  !! {mismatches} probes disagreed with the linear scan')
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
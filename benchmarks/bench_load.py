@@ -0,0 +1,388 @@
+"""Throughput and tail-latency benchmark for the API handlers
+
+Usage:
+    python benchmarks/bench_load.py [--mix front_desk] [--concurrency 8] [--requests 3000]
+                                    [--guests 2000] [--rooms 200] [--bookings 10000]
+                                    [--latency 2] [--write-baseline]
+
+Runs the Flask app in-process with its storage pointed at an in-memory
+stand-in for the Supabase client (``fake_postgrest.py``), seeded with the
+given number of guests, rooms and bookings. Worker threads replay a weighted
+mix of requests (list rooms, search guests, create booking, check in/out,
+...) and the script reports, per endpoint, p50/p95/p99 latency and upstream
+calls per request, plus overall requests per second. ``--latency`` adds a
+simulated round trip (ms) to every upstream call.
+
+Results are compared with ``load_baseline.json`` when it was recorded with
+the same settings. The script exits non-zero on any 5xx response, when an
+endpoint's p95 or the overall throughput is worse than the baseline by more
+than ``--tolerance``, or when an endpoint makes noticeably more upstream
+calls than recorded. ``--write-baseline`` stores the current run.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Every simulated desk shares the test client's address; the limiter has bench_admission.py
+os.environ.setdefault('RATE_LIMIT', 'off')
+
+from api.lib.storage import set_storage  # noqa: E402
+from api.lib.storage.supabase_backend import SupabaseStorage  # noqa: E402
+from app import app  # noqa: E402
+from fake_postgrest import FakePostgrest, call_label  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'load_baseline.json')
+
+# Relative weights of each request type
+MIXES = {
+    'front_desk': {
+        'list_rooms': 25, 'search_guests': 15, 'suggest_guests': 10, 'list_bookings': 15,
+        'room_availability': 10, 'create_booking': 10, 'check_in': 7, 'check_out': 5, 'stats': 3,
+    },
+    'read_heavy': {'list_rooms': 40, 'list_bookings': 30, 'search_guests': 20, 'stats': 10},
+    'write_heavy': {'create_booking': 40, 'check_in': 25, 'check_out': 25, 'list_bookings': 10},
+}
+
+FIRST_NAMES = ('Ana', 'Ben', 'Chen', 'Dara', 'Eli', 'Fatima', 'Gus', 'Hana', 'Ivan', 'Jo', 'Kofi', 'Lena')
+LAST_NAMES = ('Smith', 'Garcia', 'Okafor', 'Ivanova', 'Tanaka', 'Novak', 'Silva', 'Khan', 'Berg', 'Moreau')
+ROOM_TYPES = ('single', 'double', 'suite', 'dorm')
+
+# p95 must also grow by more than this, so sub-millisecond endpoints don't flap
+LATENCY_SLACK_MS = 5.0
+
+# More upstream calls than this (relative, plus an absolute slack) fails the run
+CALLS_TOLERANCE = (1.25, 0.1)
+
+
+class DeskState:
+    """Rooms and bookings the workers hand between create, check-in and check-out"""
+
+    def __init__(self, rng):
+        self.lock = threading.Lock()
+        self.rng = rng
+        self.guest_ids = []
+        self.names = []
+        self.free_rooms = []
+        self.booked = []
+        self.checked_in = []
+
+    def take(self, pool):
+        with self.lock:
+            if not pool:
+                return None
+            return pool.pop(self.rng.randrange(len(pool)))
+
+    def put(self, pool, value):
+        with self.lock:
+            pool.append(value)
+
+
+def seed(client, state, guests, rooms, bookings, rng):
+    today = date.today()
+    guest_rows = client.seed('guests', [
+        {
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}',
+            'email': f'guest{i}@example.com',
+            'phone': f'555{i:07d}'
+        }
+        for i in range(guests)
+    ])
+    room_rows = client.seed('rooms', [
+        {
+            'room_number': str(100 + i),
+            'room_type': ROOM_TYPES[i % len(ROOM_TYPES)],
+            'capacity': 1 + i % 4,
+            'price_per_night': 60.0 + 20 * (i % 4)
+        }
+        for i in range(rooms)
+    ])
+    state.guest_ids = [row['id'] for row in guest_rows]
+    state.names = [row['name'].split()[0] for row in guest_rows]
+
+    # History in the past, plus upcoming stays on a fifth of the rooms
+    rows = []
+    for _ in range(bookings):
+        start = today - timedelta(days=rng.randrange(1, 720))
+        rows.append({
+            'guest_id': rng.choice(state.guest_ids),
+            'room_id': rng.choice(room_rows)['id'],
+            'check_in_date': start.isoformat(),
+            'check_out_date': (start + timedelta(days=rng.randrange(1, 5))).isoformat(),
+            'total_amount': 120.0,
+            'status': rng.choice(('checked_out', 'checked_out', 'checked_out', 'cancelled'))
+        })
+    upcoming = []
+    for room in room_rows[::5]:
+        start = today + timedelta(days=rng.randrange(1, 30))
+        upcoming.append({
+            'guest_id': rng.choice(state.guest_ids),
+            'room_id': room['id'],
+            'check_in_date': start.isoformat(),
+            'check_out_date': (start + timedelta(days=2)).isoformat(),
+            'total_amount': 240.0,
+            'status': 'booked'
+        })
+        client.tables['rooms'][room['id']]['is_available'] = False
+    client.seed('bookings', rows)
+    state.booked = [row['id'] for row in client.seed('bookings', upcoming)]
+    state.free_rooms = [row['id'] for row in room_rows if row['is_available'] and row['id'] not in
+                        {b['room_id'] for b in upcoming}]
+
+
+# Request builders: (state, rng) -> (method, url, json body, on_response) or None when
+# the shared state has nothing to act on
+
+def list_rooms(state, rng):
+    return 'GET', '/api/rooms', None, None
+
+
+def list_bookings(state, rng):
+    return 'GET', '/api/bookings', None, None
+
+
+def stats(state, rng):
+    return 'GET', '/api/stats', None, None
+
+
+def search_guests(state, rng):
+    return 'GET', f'/api/guests?search={rng.choice(state.names)}', None, None
+
+
+def suggest_guests(state, rng):
+    name = rng.choice(state.names)
+    return 'GET', f'/api/guests/suggest?q={name[:rng.randrange(2, len(name) + 1)]}', None, None
+
+
+def room_availability(state, rng):
+    start = date.today() + timedelta(days=rng.randrange(60))
+    end = start + timedelta(days=rng.randrange(1, 5))
+    return 'GET', f'/api/rooms/availability?check_in={start}&check_out={end}', None, None
+
+
+def create_booking(state, rng):
+    room_id = state.take(state.free_rooms)
+    if room_id is None:
+        return None
+    start = date.today() + timedelta(days=rng.randrange(60, 300))
+    body = {
+        'guest_id': rng.choice(state.guest_ids),
+        'room_id': room_id,
+        'check_in_date': start.isoformat(),
+        'check_out_date': (start + timedelta(days=rng.randrange(1, 4))).isoformat(),
+        'total_amount': 150.0
+    }
+
+    def on_response(status, data):
+        if status == 201:
+            state.put(state.booked, data['id'])
+        else:
+            state.put(state.free_rooms, room_id)
+    return 'POST', '/api/bookings', body, on_response
+
+
+def check_in(state, rng):
+    booking_id = state.take(state.booked)
+    if booking_id is None:
+        return None
+
+    def on_response(status, data):
+        if status == 200:
+            state.put(state.checked_in, (booking_id, data['booking']['room_id']))
+    return 'PUT', f'/api/bookings?id={booking_id}&action=checkin', None, on_response
+
+
+def check_out(state, rng):
+    taken = state.take(state.checked_in)
+    if taken is None:
+        return None
+    booking_id, room_id = taken
+
+    def on_response(status, data):
+        if status == 200:
+            state.put(state.free_rooms, room_id)
+    return 'PUT', f'/api/bookings?id={booking_id}&action=checkout', None, on_response
+
+
+BUILDERS = {
+    'list_rooms': list_rooms, 'list_bookings': list_bookings, 'stats': stats,
+    'search_guests': search_guests, 'suggest_guests': suggest_guests,
+    'room_availability': room_availability, 'create_booking': create_booking,
+    'check_in': check_in, 'check_out': check_out,
+}
+
+
+def run(mix, state, total, concurrency, seed_value, record=True):
+    """Replay ``total`` requests over ``concurrency`` threads; return samples and wall time"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    counter = itertools.count()
+    samples = []
+    samples_lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed_value * 1000 + index)
+        client = app.test_client()
+        local = []
+        while next(counter) < total:
+            name = rng.choices(names, weights)[0]
+            request = BUILDERS[name](state, rng)
+            if request is None:
+                # Nothing to check in/out yet; browse instead
+                name, request = 'list_rooms', list_rooms(state, rng)
+            method, url, body, on_response = request
+
+            token = call_label.set(name)
+            started = time.perf_counter()
+            response = client.open(url, method=method, json=body)
+            elapsed = (time.perf_counter() - started) * 1000
+            call_label.reset(token)
+
+            if on_response is not None:
+                on_response(response.status_code, response.get_json(silent=True))
+            local.append((name, response.status_code, elapsed))
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples, wall, calls):
+    by_name = defaultdict(list)
+    for name, status, elapsed in samples:
+        by_name[name].append((status, elapsed))
+
+    endpoints = {}
+    for name, entries in sorted(by_name.items()):
+        latencies = sorted(elapsed for _, elapsed in entries)
+        endpoints[name] = {
+            'count': len(entries),
+            'rejected': sum(1 for status, _ in entries if 400 <= status < 500),
+            'errors': sum(1 for status, _ in entries if status >= 500),
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'calls_per_request': round(calls[name] / len(entries), 3),
+        }
+
+    latencies = sorted(elapsed for _, _, elapsed in samples)
+    overall = {
+        'requests': len(samples),
+        'rps': round(len(samples) / wall, 1),
+        'p50': round(percentile(latencies, 50), 3),
+        'p95': round(percentile(latencies, 95), 3),
+        'p99': round(percentile(latencies, 99), 3),
+        'calls_per_request': round(sum(calls.values()) / len(samples), 3),
+    }
+    return {'overall': overall, 'endpoints': endpoints}
+
+
+def report(summary):
+    print(f"{'endpoint':<18} {'count':>6} {'4xx':>5} {'5xx':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls/req':>10}")
+    for name, row in summary['endpoints'].items():
+        print(f"{name:<18} {row['count']:>6} {row['rejected']:>5} {row['errors']:>5} "
+              f"{row['p50']:>8.2f} {row['p95']:>8.2f} {row['p99']:>8.2f} {row['calls_per_request']:>10.2f}")
+    overall = summary['overall']
+    print(f"{'overall':<18} {overall['requests']:>6} {'':>5} {'':>5} {overall['p50']:>8.2f} "
+          f"{overall['p95']:>8.2f} {overall['p99']:>8.2f} {overall['calls_per_request']:>10.2f}")
+    print(f"throughput: {overall['rps']:.1f} requests/s")
+
+
+def check(summary, baseline, tolerance):
+    failures = []
+    for name, row in summary['endpoints'].items():
+        if row['errors']:
+            failures.append(f'{name}: {row["errors"]} server errors')
+        base = baseline['endpoints'].get(name) if baseline else None
+        if base is None:
+            continue
+        if row['p95'] > base['p95'] * tolerance and row['p95'] - base['p95'] > LATENCY_SLACK_MS:
+            failures.append(f"{name}: p95 {row['p95']:.2f} ms > {tolerance}x baseline {base['p95']:.2f} ms")
+        ratio, slack = CALLS_TOLERANCE
+        if row['calls_per_request'] > base['calls_per_request'] * ratio + slack:
+            failures.append(f"{name}: {row['calls_per_request']:.2f} upstream calls/request, "
+                            f"baseline {base['calls_per_request']:.2f}")
+    if baseline and summary['overall']['rps'] < baseline['overall']['rps'] / tolerance:
+        failures.append(f"throughput {summary['overall']['rps']:.1f} req/s < baseline "
+                        f"{baseline['overall']['rps']:.1f} / {tolerance}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mix', choices=sorted(MIXES), default='front_desk')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--guests', type=int, default=2000)
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--bookings', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=2.0, help='simulated ms per upstream call')
+    parser.add_argument('--seed', type=int, default=16)
+    parser.add_argument('--tolerance', type=float, default=2.0)
+    parser.add_argument('--write-baseline', action='store_true')
+    args = parser.parse_args()
+
+    config = {key: getattr(args, key) for key in
+              ('mix', 'concurrency', 'requests', 'guests', 'rooms', 'bookings', 'latency', 'seed')}
+
+    rng = random.Random(args.seed)
+    client = FakePostgrest(latency=args.latency / 1000)
+    state = DeskState(rng)
+    seed(client, state, args.guests, args.rooms, args.bookings, rng)
+    set_storage(SupabaseStorage(client=client))
+
+    # Build indexes and caches before measuring
+    run(MIXES[args.mix], state, args.warmup, args.concurrency, args.seed + 1)
+    client.calls.clear()
+
+    samples, wall = run(MIXES[args.mix], state, args.requests, args.concurrency, args.seed)
+    summary = summarize(samples, wall, client.calls)
+    print(f"{args.mix} mix, {args.concurrency} workers, {args.requests} requests, "
+          f"{args.latency:g} ms per upstream call ({args.guests} guests, {args.rooms} rooms, {args.bookings} bookings)")
+    report(summary)
+
+    if args.write_baseline:
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump({'config': config, **summary}, f, indent=4)
+            f.write('\n')
+        print(f'Baseline written to {BASELINE_FILE}')
+        return 0
+
+    baseline = None
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            print('Baseline was recorded with other settings; only checking for server errors')
+            baseline = None
+
+    failures = check(summary, baseline, args.tolerance)
+    for failure in failures:
+        print(f'!! {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
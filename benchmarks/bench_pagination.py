@@ -0,0 +1,82 @@
+"""Offset vs. keyset pagination over a large booking history
+
+Usage:
+    python benchmarks/bench_pagination.py [--bookings 300000] [--page-size 100]
+
+Loads the bookings table of a temporary SQLite database and times fetching
+single pages at increasing depths, once with ``skip`` (``LIMIT ... OFFSET``)
+and once with the ``(created_at, id)`` cursor used by the list endpoints.
+Offset pages get slower with depth; keyset pages should stay flat.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.lib.pagination import LIST_ORDER, encode_cursor, list_page  # noqa: E402
+from api.lib.storage.sqlite_backend import SQLiteStorage  # noqa: E402
+
+
+def load(storage, count):
+    storage.insert('guests', {'name': 'Bench', 'email': 'bench@example.com', 'phone': '0'})
+    storage.insert('rooms', {'room_number': '1', 'room_type': 'single', 'capacity': 1, 'price_per_night': 1.0})
+    start = datetime(2020, 1, 1)
+    chunk = []
+    for i in range(count):
+        # Several rows share each timestamp so the id tie-break matters
+        chunk.append({
+            'guest_id': 1,
+            'room_id': 1,
+            'check_in_date': '2026-01-01',
+            'check_out_date': '2026-01-02',
+            'total_amount': 1.0,
+            'status': 'checked_out',
+            'created_at': (start + timedelta(seconds=i // 3)).isoformat()
+        })
+        if len(chunk) == 5000:
+            storage.insert('bookings', chunk)
+            chunk = []
+    if chunk:
+        storage.insert('bookings', chunk)
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=300000)
+    parser.add_argument('--page-size', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        storage = SQLiteStorage(path=os.path.join(workdir, 'bench.db'))
+        started = time.perf_counter()
+        load(storage, args.bookings)
+        print(f'Loaded {args.bookings} bookings in {time.perf_counter() - started:.1f}s')
+
+        print(f"{'depth':>10} {'offset ms':>10} {'cursor ms':>10}")
+        depth = args.page_size
+        while depth < args.bookings:
+            # The row just before the page gives the cursor a client would hold
+            previous = storage.select('bookings', 'id, created_at', order=LIST_ORDER, limit=1, offset=depth - 1)[0]
+            cursor = encode_cursor(previous)
+            offset_ms = timed(lambda: list_page(storage, 'bookings', args.page_size, skip=depth))
+            cursor_ms = timed(lambda: list_page(storage, 'bookings', args.page_size, cursor=cursor))
+            print(f'{depth:>10} {offset_ms:>10.2f} {cursor_ms:>10.2f}')
+            depth *= 10
+        storage.close()
+
+
+if __name__ == '__main__':
+    main()
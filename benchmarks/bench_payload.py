@@ -0,0 +1,117 @@
+"""Bytes on the wire for a page of bookings, by response shape and encoding
+
+Usage:
+    python benchmarks/bench_payload.py [--rows 100] [--guests 60] [--rooms 40]
+
+Requests ``GET /api/bookings`` through the Flask test client against the
+in-memory store from ``fake_postgrest.py`` (varied names, emails and dates,
+so gzip is not flattered by repetition) as:
+
+* the default nested rows, guest and room embedded in every booking
+* ``fields=`` with just what the bookings table in the UI shows
+* ``shape=normalized``, each guest and room sent once
+* both together, which is what the UI requests
+
+each sent plain, gzip and (when the ``brotli`` package is installed) br,
+and prints the body size, the shrink against the plain default and the
+server time per request.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ['CACHE_TTL'] = '0'
+# Every request comes from one test client address
+os.environ['RATE_LIMIT'] = 'off'
+
+from api.lib.compression import available_encodings  # noqa: E402
+from api.lib.storage import set_storage  # noqa: E402
+from api.lib.storage.supabase_backend import SupabaseStorage  # noqa: E402
+from app import app  # noqa: E402
+from fake_postgrest import FakePostgrest  # noqa: E402
+
+UI_FIELDS = 'id,status,check_in_date,check_out_date,total_amount,guest.name,guest.email,room.room_number,room.room_type'
+
+VARIANTS = (
+    ('nested', {}),
+    ('fields', {'fields': UI_FIELDS}),
+    ('normalized', {'shape': 'normalized'}),
+    ('fields + normalized', {'fields': UI_FIELDS, 'shape': 'normalized'}),
+)
+
+FIRST = ('Ana', 'Bo', 'Chen', 'Dara', 'Eli', 'Farah', 'Goran', 'Hana', 'Ivo', 'Jun', 'Kemal', 'Lea', 'Mira', 'Noor')
+LAST = ('Smith', 'Okafor', 'Novak', 'Garcia', 'Tanaka', 'Haddad', 'Larsen', 'Silva', 'Kowalski', 'Nguyen')
+ROOM_TYPES = ('single', 'double', 'suite', 'deluxe')
+
+
+def seed(client, guests, rooms, bookings, rng):
+    client.seed('guests', [
+        {
+            'name': f'{rng.choice(FIRST)} {rng.choice(LAST)}',
+            'email': f'guest{i}.{rng.randrange(10 ** 6)}@example.com',
+            'phone': f'555{rng.randrange(10 ** 7):07d}',
+            'address': f'{rng.randrange(1, 999)} Main St'
+        }
+        for i in range(guests)
+    ])
+    client.seed('rooms', [
+        {
+            'room_number': str(100 + i), 'room_type': rng.choice(ROOM_TYPES), 'capacity': rng.randint(1, 4),
+            'price_per_night': float(rng.randrange(60, 400)), 'is_available': True
+        }
+        for i in range(rooms)
+    ])
+    start = date(2025, 1, 1)
+    stays = []
+    for _ in range(bookings):
+        check_in = start + timedelta(days=rng.randrange(365))
+        nights = rng.randint(1, 7)
+        stays.append({
+            'guest_id': rng.randint(1, guests), 'room_id': rng.randint(1, rooms),
+            'check_in_date': check_in.isoformat(), 'check_out_date': (check_in + timedelta(days=nights)).isoformat(),
+            'total_amount': float(nights * rng.randrange(60, 400)), 'status': rng.choice(('booked', 'checked_in'))
+        })
+    client.seed('bookings', stays)
+
+
+def server_ms(test_client, url, headers, iterations=50):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        test_client.get(url, headers=headers)
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--guests', type=int, default=60)
+    parser.add_argument('--rooms', type=int, default=40)
+    args = parser.parse_args()
+
+    client = FakePostgrest()
+    seed(client, args.guests, args.rooms, args.rows * 2, random.Random(7))
+    set_storage(SupabaseStorage(client=client))
+    test_client = app.test_client()
+
+    print(f"{'shape':<22} {'encoding':<9} {'bytes':>8} {'shrink':>8} {'ms/req':>8}")
+    baseline = None
+    for label, params in VARIANTS:
+        query = '&'.join(f'{key}={value}' for key, value in {'limit': args.rows, **params}.items())
+        url = f'/api/bookings?{query}'
+        for encoding in ('identity', *available_encodings()):
+            headers = {'Accept-Encoding': encoding}
+            response = test_client.get(url, headers=headers)
+            assert response.status_code == 200, response.data[:200]
+            assert response.headers.get('Content-Encoding', 'identity') == encoding
+            size = len(response.data)
+            baseline = baseline or size
+            print(f'{label:<22} {encoding:<9} {size:>8} {baseline / size:>7.1f}x {server_ms(test_client, url, headers):>8.2f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
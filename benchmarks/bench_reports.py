@@ -0,0 +1,92 @@
+"""Occupancy / revenue report timing for a year of data
+
+Usage:
+    python benchmarks/bench_reports.py [--rooms 300] [--days 365]
+
+Fills a temporary SQLite database with back-to-back stays for every room
+over ``--days`` days, then times the first report (which loads and expands
+every booking), warm reports for each grouping, the pickup curve, and an
+incremental refresh after a handful of writes.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.lib.analytics import ReportEngine  # noqa: E402
+from api.lib.storage.sqlite_backend import SQLiteStorage  # noqa: E402
+
+ROOM_TYPES = ('single', 'double', 'suite', 'dorm')
+
+
+def load(storage, room_count, days, rng):
+    storage.insert('guests', {'name': 'Bench', 'email': 'bench@example.com', 'phone': '0'})
+    rooms = storage.insert('rooms', [
+        {'room_number': str(100 + i), 'room_type': ROOM_TYPES[i % 4], 'capacity': 2, 'price_per_night': 80.0}
+        for i in range(room_count)
+    ])
+    origin = date.today() - timedelta(days=days // 2)
+    rows = []
+    for room in rooms:
+        day = 0
+        while day < days:
+            nights = rng.randrange(1, 6)
+            start = origin + timedelta(days=day)
+            rows.append({
+                'guest_id': 1,
+                'room_id': room['id'],
+                'check_in_date': start.isoformat(),
+                'check_out_date': (start + timedelta(days=nights)).isoformat(),
+                'total_amount': 80.0 * nights,
+                'status': rng.choice(('booked', 'checked_out', 'checked_out', 'cancelled')),
+                'created_at': (start - timedelta(days=rng.randrange(90))).isoformat()
+            })
+            day += nights + rng.randrange(3)
+    for start in range(0, len(rows), 5000):
+        storage.insert('bookings', rows[start:start + 5000])
+    return origin, len(rows)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=300)
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as workdir:
+        storage = SQLiteStorage(path=os.path.join(workdir, 'bench.db'))
+        origin, count = load(storage, args.rooms, args.days, rng)
+        start, end = origin, origin + timedelta(days=args.days - 1)
+        print(f'{args.rooms} rooms, {count} bookings over {args.days} days')
+
+        engine = ReportEngine()
+        print(f"first report (load + expand):  {timed(lambda: engine.occupancy(storage, start, end)):8.1f} ms")
+        for group in ('day', 'week', 'room_type'):
+            print(f"warm report by {group:<10}      {timed(lambda: engine.occupancy(storage, start, end, group)):8.1f} ms")
+        print(f"pickup curve (90 days)         {timed(lambda: engine.pickup(storage, start, end, 90)):8.1f} ms")
+
+        changed = [row['id'] for row in storage.select('bookings', 'id', {'status': 'booked'}, limit=5)]
+        for booking_id in changed:
+            storage.update('bookings', {'status': 'cancelled'}, {'id': booking_id})
+        engine.bookings_changed(changed)
+        before = engine.days_recomputed
+        elapsed = timed(lambda: engine.occupancy(storage, start, end))
+        print(f"after {len(changed)} writes (incremental)    {elapsed:8.1f} ms, "
+              f"{engine.days_recomputed - before} days recomputed")
+        storage.close()
+
+
+if __name__ == '__main__':
+    main()
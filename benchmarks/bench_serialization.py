@@ -0,0 +1,149 @@
+"""CPU per request spent validating input and encoding JSON
+
+Usage:
+    python benchmarks/bench_serialization.py [--rows 100] [--iterations 2000]
+
+Compares, in process CPU time per call:
+
+* marshmallow ``Schema.load`` against the compiled validators, for a new
+  booking, a new guest and a partial room update
+* stdlib ``json`` against the shared codec (orjson when installed), for a
+  page of ``--rows`` bookings with guest and room embedded, and for the ETag
+  hash of that page
+
+and then whole requests through the Flask test client (``GET /api/bookings``
+with the response cache off, ``POST /api/bookings``) against the in-memory
+store from ``fake_postgrest.py`` with no simulated latency, once with the
+stdlib encoder and marshmallow and once with the fast paths.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ['CACHE_TTL'] = '0'
+# Every request comes from one test client address
+os.environ['RATE_LIMIT'] = 'off'
+
+from api import bookings, guests, rooms  # noqa: E402
+from api.lib import registry  # noqa: E402
+from api.lib.serialization import StdlibCodec, create_codec  # noqa: E402
+from api.lib.storage import set_storage  # noqa: E402
+from api.lib.storage.supabase_backend import SupabaseStorage  # noqa: E402
+from app import app  # noqa: E402
+from fake_postgrest import FakePostgrest  # noqa: E402
+
+
+def cpu_per_call(fn, iterations):
+    fn()
+    started = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - started) / iterations
+
+
+def report(label, slow, fast):
+    print(f'{label:<34} {slow * 1e6:>10.1f} {fast * 1e6:>10.1f} {(slow - fast) * 1e6:>10.1f} {slow / fast:>8.1f}x')
+
+
+def without_fast_paths(fn, iterations):
+    """``cpu_per_call`` with the stdlib encoder and marshmallow for new bookings"""
+    previous = registry.replace('json_codec', StdlibCodec())
+    compiled = bookings.booking_schema._compiled
+    bookings.booking_schema._compiled = lambda data: None
+    try:
+        return cpu_per_call(fn, iterations)
+    finally:
+        bookings.booking_schema._compiled = compiled
+        registry.replace('json_codec', previous)
+
+
+def page_of_bookings(rows):
+    start = date(2025, 1, 1)
+    return {
+        'items': [
+            {
+                'id': i, 'guest_id': i % 50 + 1, 'room_id': i % 30 + 1,
+                'check_in_date': (start + timedelta(days=i)).isoformat(),
+                'check_out_date': (start + timedelta(days=i + 2)).isoformat(),
+                'total_amount': 240.0, 'status': 'booked',
+                'actual_check_in': None, 'actual_check_out': None,
+                'created_at': f'2025-01-01T10:00:{i % 60:02d}.000000+00:00',
+                'guest': {'id': i % 50 + 1, 'name': f'Guest {i}', 'email': f'guest{i}@example.com', 'phone': '5550000000'},
+                'room': {'id': i % 30 + 1, 'room_number': str(100 + i % 30), 'room_type': 'double', 'price_per_night': 120.0}
+            }
+            for i in range(rows)
+        ],
+        'next_cursor': 'eyJjIjoiMjAyNS0wMS0wMSJ9'
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    print(f"{'per call':<34} {'slow us':>10} {'fast us':>10} {'saved us':>10} {'speedup':>9}")
+
+    booking = {'guest_id': 3, 'room_id': 7, 'check_in_date': '2030-01-02', 'check_out_date': '2030-01-05',
+               'total_amount': 360.0}
+    guest = {'name': 'Ana Smith', 'email': 'ana@example.com', 'phone': '5551234567', 'address': None}
+    room_update = {'price_per_night': 95.0, 'is_available': False}
+    for label, schema, payload in (
+        ('validate new booking', bookings.booking_schema, booking),
+        ('validate new guest', guests.guest_schema, guest),
+        ('validate room update', rooms.room_update_schema, room_update),
+    ):
+        assert schema.load(payload) == schema.schema.load(payload)
+        report(label, cpu_per_call(lambda: schema.schema.load(payload), n),
+               cpu_per_call(lambda: schema.load(payload), n))
+
+    page = page_of_bookings(args.rows)
+    stdlib, fast = StdlibCodec(), create_codec()
+    report(f'encode {args.rows} bookings ({fast.name})',
+           cpu_per_call(lambda: json.dumps(page, separators=(',', ':')).encode(), n // 4),
+           cpu_per_call(lambda: fast.dumpb(page), n // 4))
+    report(f'etag {args.rows} bookings ({fast.name})',
+           cpu_per_call(lambda: hashlib.sha1(stdlib.dumpb(page, sort_keys=True)).hexdigest(), n // 4),
+           cpu_per_call(lambda: hashlib.sha1(fast.dumpb(page, sort_keys=True)).hexdigest(), n // 4))
+
+    # Whole requests through Flask against the in-memory store
+    client = FakePostgrest()
+    client.seed('guests', [{'name': f'Guest {i}', 'email': f'guest{i}@example.com', 'phone': '5550000000'}
+                           for i in range(50)])
+    client.seed('rooms', [{'room_number': str(100 + i), 'room_type': 'double', 'capacity': 2, 'price_per_night': 120.0}
+                          for i in range(30)])
+    # The store assigns ids and created_at itself
+    client.seed('bookings', [
+        {key: value for key, value in row.items() if key not in ('id', 'created_at', 'guest', 'room')}
+        for row in page_of_bookings(args.rows * 5)['items']
+    ])
+    set_storage(SupabaseStorage(client=client))
+    test_client = app.test_client()
+    stay = itertools.count()
+
+    def list_page():
+        test_client.get(f'/api/bookings?cursor=&limit={args.rows}')
+
+    def create():
+        # A fresh room each time so there is never a conflict
+        room = client.seed('rooms', [{'room_number': f'x{next(stay)}', 'room_type': 'single', 'capacity': 1,
+                                      'price_per_night': 80.0}])[0]
+        response = test_client.post('/api/bookings', json={**booking, 'room_id': room['id']})
+        assert response.status_code == 201, response.get_json()
+
+    registry.replace('json_codec', fast)
+    for label, fn in ((f'GET /api/bookings ({args.rows} rows)', list_page), ('POST /api/bookings', create)):
+        report(label, without_fast_paths(fn, n // 10), cpu_per_call(fn, n // 10))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,384 @@
+"""In-memory stand-in for the Supabase client used by the load benchmark
+
+Implements the slice of the supabase-py / postgrest-py query builder that
+``SupabaseStorage`` uses (select with embeds, insert, update, delete,
+filters, order, limit, the raw ``or``/``and``/``offset``/``select`` params,
+exact counts and the ``transition_booking`` RPC) over dicts in memory.
+
+Every ``execute()`` counts as one upstream call and can sleep for a
+simulated network round trip. Calls are attributed to whatever label is set
+in :data:`call_label` at the time, so a benchmark can report upstream calls
+per request; ``api.lib.concurrency.gather`` carries the label into its pool
+threads.
+"""
+import contextvars
+import functools
+import itertools
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+# Label the current request's upstream calls are counted under
+call_label = contextvars.ContextVar('call_label', default=None)
+
+TABLES = ('guests', 'rooms', 'bookings')
+
+# Columns with a unique constraint, as in the Supabase schema
+UNIQUE = {'guests': ('email',), 'rooms': ('room_number',)}
+
+# Columns that increase with every insert, so a table's dict order is their order
+INSERTION_ORDERED = ('id', 'created_at')
+
+DEFAULTS = {
+    'rooms': {'is_available': True},
+    'bookings': {'status': 'booked', 'actual_check_in': None, 'actual_check_out': None},
+}
+
+
+class APIError(Exception):
+    """Shaped like postgrest's APIError: the SQLSTATE or PGRST code in ``code``"""
+
+    def __init__(self, code, message):
+        super().__init__(f'{code}: {message}')
+        self.code = code
+
+
+class Response:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class Params(tuple):
+    """Immutable like httpx.QueryParams: ``add`` returns a new instance"""
+
+    def add(self, key, value):
+        return Params(self + ((key, value),))
+
+
+class FakePostgrest:
+    """The ``client`` object handed to ``SupabaseStorage(client=...)``"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.tables = {table: {} for table in TABLES}
+        self._ids = {table: itertools.count(1) for table in TABLES}
+        self._unique = {(table, column): set() for table, columns in UNIQUE.items() for column in columns}
+        self._lock = threading.RLock()
+        self._clock = datetime(2024, 1, 1)
+        self.calls = Counter()
+
+    def table(self, name):
+        return Query(self, name)
+
+    from_ = table
+
+    def rpc(self, fn, params):
+        return Rpc(self, fn, params)
+
+    def now(self):
+        # Strictly increasing, so keyset pages by created_at are stable
+        self._clock += timedelta(microseconds=1)
+        return self._clock.isoformat()
+
+    def seed(self, table, rows):
+        """Insert rows directly, without counting upstream calls"""
+        with self._lock:
+            return [self._store(table, row) for row in rows]
+
+    def round_trip(self):
+        self.calls[call_label.get()] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _store(self, table, row):
+        stored = {**DEFAULTS.get(table, {}), **row}
+        self._claim_unique(table, stored)
+        stored.setdefault('id', next(self._ids[table]))
+        stored.setdefault('created_at', self.now())
+        self.tables[table][stored['id']] = stored
+        return stored
+
+    def _claim_unique(self, table, row, previous=None):
+        for column in UNIQUE.get(table, ()):
+            if column not in row or (previous is not None and previous.get(column) == row[column]):
+                continue
+            taken = self._unique[table, column]
+            if row[column] in taken:
+                raise APIError('23505', f'duplicate key value violates unique constraint on {table}.{column}')
+            taken.add(row[column])
+            if previous is not None:
+                taken.discard(previous.get(column))
+
+    def _release_unique(self, table, row):
+        for column in UNIQUE.get(table, ()):
+            self._unique[table, column].discard(row.get(column))
+
+
+class Query:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.params = Params()
+        self.operation = 'select'
+        self.columns = '*'
+        self.count = None
+        self.payload = None
+        self.filters = []
+        self.ordering = []
+        self.row_limit = None
+
+    # Operations
+
+    def select(self, columns='*', count=None):
+        self.columns = columns
+        self.count = count
+        return self
+
+    def insert(self, rows, **options):
+        self.operation, self.payload = 'insert', rows
+        return self
+
+    def update(self, values, **options):
+        self.operation, self.payload = 'update', values
+        return self
+
+    def delete(self, **options):
+        self.operation = 'delete'
+        return self
+
+    # Filters and modifiers
+
+    def _filter(self, column, op, value):
+        self.filters.append((column, op, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def in_(self, column, values):
+        return self._filter(column, 'in', list(values))
+
+    def ilike(self, column, pattern):
+        return self._filter(column, 'ilike', pattern)
+
+    def is_(self, column, value):
+        return self._filter(column, 'is', None if value in (None, 'null') else value)
+
+    def order(self, column, desc=False, **options):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, count, **options):
+        self.row_limit = count
+        return self
+
+    # Execution
+
+    def execute(self):
+        self.db.round_trip()
+        with self.db._lock:
+            if self.operation == 'insert':
+                rows = self.payload if isinstance(self.payload, list) else [self.payload]
+                stored = []
+                try:
+                    for row in rows:
+                        stored.append(self.db._store(self.table, dict(row)))
+                except APIError:
+                    # One statement in PostgREST: a failing row inserts nothing
+                    for row in stored:
+                        del self.db.tables[self.table][row['id']]
+                        self.db._release_unique(self.table, row)
+                    raise
+                columns = dict(self.params).get('select', '*')
+                return Response([self._project(row, columns) for row in stored])
+
+            matched = self._matching()
+            if self.operation == 'update':
+                for row in matched:
+                    self.db._claim_unique(self.table, self.payload, previous=row)
+                    row.update(self.payload)
+                return Response([dict(row) for row in matched])
+            if self.operation == 'delete':
+                for row in matched:
+                    self.db._release_unique(self.table, row)
+                    del self.db.tables[self.table][row['id']]
+                return Response([dict(row) for row in matched])
+
+            directions = {desc for column, desc in self.ordering if column in INSERTION_ORDERED}
+            if self.ordering and len(directions) == 1 and all(c in INSERTION_ORDERED for c, _ in self.ordering):
+                # Rows are stored in id and created_at order already
+                if directions.pop():
+                    matched.reverse()
+            else:
+                for column, desc in reversed(self.ordering):
+                    matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+            total = len(matched)
+            offset = int(dict(self.params).get('offset', 0))
+            matched = matched[offset:]
+            if self.row_limit is not None:
+                matched = matched[:self.row_limit]
+            return Response([self._project(row, self.columns) for row in matched],
+                            total if self.count else None)
+
+    def _matching(self):
+        rows = self.db.tables[self.table]
+        # Primary key lookups are the common case; skip the scan
+        for column, op, value in self.filters:
+            if column == 'id' and op in ('eq', 'in'):
+                ids = value if op == 'in' else [value]
+                candidates = [rows[key] for key in dict.fromkeys(int(unquote(v)) for v in ids) if key in rows]
+                break
+        else:
+            candidates = rows.values()
+            # Foreign keys are indexed in the schema; narrow on one cheaply
+            for column, op, value in self.filters:
+                if column.endswith('_id') and op == 'eq' and str(unquote(value)).isdigit():
+                    key = int(unquote(value))
+                    candidates = [row for row in candidates if row.get(column) == key]
+                    break
+
+        extra = [(key, value) for key, value in self.params if key in ('or', 'and')]
+        if not self.filters and not extra:
+            return list(candidates)
+        return [
+            row for row in candidates
+            if all(compare(row.get(column), op, value) for column, op, value in self.filters)
+            and all(logic_tree(f'{key}{value}', row) for key, value in extra)
+        ]
+
+    def _project(self, row, columns):
+        out = {}
+        for kind, name, embed in parse_columns(columns):
+            if kind == 'embed':
+                alias, table, embed_columns = embed
+                related = self.db.tables[table].get(row.get(f'{alias}_id'))
+                out[alias] = None if related is None else self._project(related, embed_columns)
+            elif kind == 'all':
+                out.update(row)
+            else:
+                out[name] = row.get(name)
+        return out
+
+
+class Rpc:
+    def __init__(self, db, fn, params):
+        self.db = db
+        self.fn = fn
+        self.params = params
+
+    def execute(self):
+        self.db.round_trip()
+        if self.fn != 'transition_booking':
+            raise APIError('PGRST202', f'Could not find the function public.{self.fn}')
+        p = self.params
+        with self.db._lock:
+            booking = self.db.tables['bookings'].get(int(p['p_booking_id']))
+            if booking is None or booking['status'] not in p['p_from']:
+                return Response({'booking': None, 'status': booking and booking['status'], 'room_released': False})
+            booking['status'] = p['p_to']
+            if p['p_stamp']:
+                booking[p['p_stamp']] = self.db.now()
+            released = False
+            if p['p_release_room']:
+                room = self.db.tables['rooms'].get(booking['room_id'])
+                if room is not None and not room['is_available']:
+                    room['is_available'] = True
+                    released = True
+            return Response({'booking': dict(booking), 'status': booking['status'], 'room_released': released})
+
+
+def unquote(value):
+    if isinstance(value, str) and len(value) > 1 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def coerce(stored, value):
+    """Convert a filter value (often a string) to the stored value's type"""
+    value = unquote(value)
+    if isinstance(stored, bool):
+        return value in (True, 'true')
+    if isinstance(stored, (int, float)) and not isinstance(value, bool):
+        try:
+            return type(stored)(value)
+        except (TypeError, ValueError):
+            return value
+    return value if not isinstance(stored, str) else str(value)
+
+
+def compare(stored, op, value):
+    if op == 'is':
+        return stored is value or stored == value
+    if op == 'in':
+        return any(stored == coerce(stored, item) for item in value)
+    if stored is None:
+        return op == 'neq'
+    if op == 'ilike':
+        pattern = re.escape(str(unquote(value))).replace('%', '.*')
+        return re.fullmatch(pattern, str(stored), re.IGNORECASE | re.DOTALL) is not None
+    value = coerce(stored, value)
+    return {
+        'eq': stored == value, 'neq': stored != value,
+        'lt': stored < value, 'lte': stored <= value,
+        'gt': stored > value, 'gte': stored >= value,
+    }[op]
+
+
+@functools.lru_cache(maxsize=256)
+def parse_columns(columns):
+    """``'*, guest:guests(name)'`` -> ``(kind, column, embed groups)`` tuples"""
+    parsed = []
+    for part in split_top_level(columns.replace('\n', ' ')):
+        embed = re.match(r'(\w+):(\w+)\(([^)]*)\)$', part)
+        if embed:
+            parsed.append(('embed', None, embed.groups()))
+        else:
+            parsed.append(('all' if part == '*' else 'column', part, None))
+    return tuple(parsed)
+
+
+def split_top_level(text):
+    """Split on commas outside parentheses and double quotes"""
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        if char == ',' and depth == 0 and not quoted:
+            parts.append(current.strip())
+            current = ''
+        else:
+            current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def logic_tree(text, row):
+    """Evaluate ``or(a.ilike."%x%",and(b.eq."y",id.lt.7))`` against a row"""
+    for kind, combine in (('or', any), ('and', all)):
+        if text.startswith(f'{kind}(') and text.endswith(')'):
+            return combine(logic_tree(part, row) for part in split_top_level(text[len(kind) + 1:-1]))
+    column, op, value = text.split('.', 2)
+    return compare(row.get(column), op, value)
@@ -0,0 +1,26 @@
+-- Several properties in one Supabase project.
+--
+-- Only needed when HOTELS lists more than one property without a backend
+-- of its own; the API then adds hotel_id = <property> to every query and
+-- insert. Existing rows are given the first property; change 'default'
+-- below to its id (or list "default" in HOTELS).
+--
+-- Emails and room numbers become unique per property, and the list,
+-- status and pagination indexes lead with hotel_id so one property's
+-- queries never read another's rows.
+--
+-- Run once in the Supabase SQL editor before setting HOTELS.
+
+ALTER TABLE guests ADD COLUMN IF NOT EXISTS hotel_id text NOT NULL DEFAULT 'default';
+ALTER TABLE rooms ADD COLUMN IF NOT EXISTS hotel_id text NOT NULL DEFAULT 'default';
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS hotel_id text NOT NULL DEFAULT 'default';
+
+ALTER TABLE guests DROP CONSTRAINT IF EXISTS guests_email_key;
+ALTER TABLE rooms DROP CONSTRAINT IF EXISTS rooms_room_number_key;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_guests_hotel_email ON guests (hotel_id, email);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rooms_hotel_number ON rooms (hotel_id, room_number);
+
+CREATE INDEX IF NOT EXISTS idx_guests_hotel_created ON guests (hotel_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_rooms_hotel_created ON rooms (hotel_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_bookings_hotel_created ON bookings (hotel_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_bookings_hotel_status ON bookings (hotel_id, status, check_in_date);
@@ -0,0 +1,48 @@
+-- Booking status transitions for check-in, check-out and cancel.
+--
+-- The status precondition and the update are a single statement, and the
+-- room release runs in the same transaction, so each action is one round
+-- trip and two clerks cannot both check out or cancel the same booking.
+-- Returns {"booking": <updated row> | null, "status": <status> | null,
+-- "room_released": <bool>}: on a refused transition "booking" is null and
+-- "status" is the current one (null when the booking does not exist);
+-- "room_released" is whether the room went from unavailable to available.
+--
+-- Run once in the Supabase SQL editor. Until it exists the API falls back
+-- to a conditional PATCH followed by a separate room update.
+
+CREATE OR REPLACE FUNCTION transition_booking(
+    p_booking_id bigint,
+    p_from text[],
+    p_to text,
+    p_stamp text DEFAULT NULL,
+    p_release_room boolean DEFAULT false
+) RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated bookings;
+    current_status text;
+    released boolean := false;
+BEGIN
+    UPDATE bookings
+       SET status = p_to,
+           actual_check_in = CASE WHEN p_stamp = 'actual_check_in' THEN now() ELSE actual_check_in END,
+           actual_check_out = CASE WHEN p_stamp = 'actual_check_out' THEN now() ELSE actual_check_out END
+     WHERE id = p_booking_id
+       AND status = ANY (p_from)
+    RETURNING * INTO updated;
+
+    IF NOT FOUND THEN
+        SELECT status INTO current_status FROM bookings WHERE id = p_booking_id;
+        RETURN jsonb_build_object('booking', NULL, 'status', current_status, 'room_released', false);
+    END IF;
+
+    IF p_release_room THEN
+        UPDATE rooms SET is_available = true WHERE id = updated.room_id AND is_available IS NOT TRUE;
+        released := FOUND;
+    END IF;
+
+    RETURN jsonb_build_object('booking', to_jsonb(updated), 'status', updated.status, 'room_released', released);
+END;
+$$;
@@ -1,5 +1,11 @@
 // Hotel Management System - Main Application
 
+// Only what the bookings table shows; each guest and room is sent once
+const BOOKING_LIST_PARAMS = {
+    fields: 'id,status,check_in_date,check_out_date,total_amount,guest.name,guest.email,room.room_number,room.room_type',
+    shape: 'normalized'
+};
+
 class HotelManagementApp {
     constructor() {
         this.currentPage = 'dashboard';
@@ -8,12 +14,20 @@ class HotelManagementApp {
             rooms: [],
             bookings: []
         };
+        // Resources touched by change events since the last redraw
+        this.changed = new Set();
+        // Writes from this and other terminals arrive as change events
+        this.feed = new HotelUtils.ChangeFeed(window.api, {
+            onChange: event => this.applyChange(event),
+            onReset: () => this.navigateToPage(this.currentPage)
+        });
         this.init();
     }
 
     async init() {
         this.setupNavigation();
         this.setupEventListeners();
+        this.feed.start();
         await this.loadDashboard();
     }
 
@@ -84,52 +98,45 @@ class HotelManagementApp {
         });
     }
 
-    async loadDashboard() {
+    async loadDashboard(quiet = false) {
         try {
-            HotelUtils.LoadingManager.show('main-content');
-
-            const [guests, rooms, bookings] = await Promise.all([
-                window.api.get('/guests'),
-                window.api.get('/rooms'),
-                window.api.get('/bookings')
-            ]);
-
-            this.data.guests = guests;
-            this.data.rooms = rooms;
-            this.data.bookings = bookings;
+            if (!quiet) {
+                HotelUtils.LoadingManager.show('main-content');
+            }
 
-            const stats = this.calculateStats();
+            // Totals are aggregated server-side, so this stays one small request
+            const stats = await window.api.get('/stats');
 
             document.getElementById('main-content').innerHTML = `
                 <div class="dashboard">
                     <div class="card">
                         <div class="icon">👥</div>
-                        <div class="number">${stats.totalGuests}</div>
+                        <div class="number">${stats.total_guests}</div>
                         <div class="label">Total Guests</div>
                     </div>
                     <div class="card">
                         <div class="icon">🏠</div>
-                        <div class="number">${stats.totalRooms}</div>
+                        <div class="number">${stats.total_rooms}</div>
                         <div class="label">Total Rooms</div>
                     </div>
                     <div class="card">
                         <div class="icon">✅</div>
-                        <div class="number">${stats.availableRooms}</div>
+                        <div class="number">${stats.available_rooms}</div>
                         <div class="label">Available Rooms</div>
                     </div>
                     <div class="card">
                         <div class="icon">📅</div>
-                        <div class="number">${stats.activeBookings}</div>
+                        <div class="number">${stats.active_bookings}</div>
                         <div class="label">Active Bookings</div>
                     </div>
                     <div class="card">
                         <div class="icon">💰</div>
-                        <div class="number">${HotelUtils.CurrencyUtils.format(stats.totalRevenue)}</div>
+                        <div class="number">${HotelUtils.CurrencyUtils.format(stats.total_revenue)}</div>
                         <div class="label">Total Revenue</div>
                     </div>
                     <div class="card">
                         <div class="icon">📊</div>
-                        <div class="number">${stats.occupancyRate}%</div>
+                        <div class="number">${stats.occupancy_rate}%</div>
                         <div class="label">Occupancy Rate</div>
                     </div>
                 </div>
@@ -162,7 +169,7 @@ class HotelManagementApp {
                             </tr>
                         </thead>
                         <tbody>
-                            ${stats.recentBookings.map(booking => `
+                            ${stats.recent_bookings.map(booking => `
                                 <tr>
                                     <td>${booking.guest.name}</td>
                                     <td>${booking.room.room_number}</td>
@@ -190,209 +197,277 @@ class HotelManagementApp {
         try {
             HotelUtils.LoadingManager.show('main-content');
 
-            const guests = await window.api.get('/guests');
-            this.data.guests = guests;
+            this.data.guests = await window.api.get('/guests');
+            this.renderGuestsPage();
+        } catch (error) {
+            console.error('Error loading guests:', error);
+        }
+    }
 
-            document.getElementById('main-content').innerHTML = `
-                <div class="actions">
-                    <button class="btn" onclick="app.showGuestModal()">
-                        <span>➕</span> Add New Guest
-                    </button>
+    renderGuestsPage() {
+        const guests = this.data.guests;
+        document.getElementById('main-content').innerHTML = `
+            <div class="actions">
+                <button class="btn" onclick="app.showGuestModal()">
+                    <span>➕</span> Add New Guest
+                </button>
+            </div>
+            
+            <div class="table-container">
+                <div class="table-header">
+                    <h2>Guests</h2>
+                    <span class="text-muted">${guests.length} total guests</span>
                 </div>
-                
-                <div class="table-container">
-                    <div class="table-header">
-                        <h2>Guests</h2>
-                        <span class="text-muted">${guests.length} total guests</span>
-                    </div>
-                    <table>
-                        <thead>
+                <table>
+                    <thead>
+                        <tr>
+                            <th>ID</th>
+                            <th>Name</th>
+                            <th>Email</th>
+                            <th>Phone</th>
+                            <th>Address</th>
+                            <th>ID Proof</th>
+                            <th>Registered</th>
+                            <th>Actions</th>
+                        </tr>
+                    </thead>
+                    <tbody>
+                        ${guests.map(guest => `
                             <tr>
-                                <th>ID</th>
-                                <th>Name</th>
-                                <th>Email</th>
-                                <th>Phone</th>
-                                <th>Address</th>
-                                <th>ID Proof</th>
-                                <th>Registered</th>
-                                <th>Actions</th>
+                                <td>#${guest.id}</td>
+                                <td>
+                                    <strong>${guest.name}</strong>
+                                </td>
+                                <td>${guest.email}</td>
+                                <td>${guest.phone}</td>
+                                <td>${guest.address || '-'}</td>
+                                <td>${guest.id_proof || '-'}</td>
+                                <td>${HotelUtils.DateUtils.formatDate(guest.created_at)}</td>
+                                <td>
+                                    <div class="actions">
+                                        <button class="btn btn-sm btn-danger" onclick="app.deleteGuest(${guest.id})">
+                                            Delete
+                                        </button>
+                                    </div>
+                                </td>
                             </tr>
-                        </thead>
-                        <tbody>
-                            ${guests.map(guest => `
-                                <tr>
-                                    <td>#${guest.id}</td>
-                                    <td>
-                                        <strong>${guest.name}</strong>
-                                    </td>
-                                    <td>${guest.email}</td>
-                                    <td>${guest.phone}</td>
-                                    <td>${guest.address || '-'}</td>
-                                    <td>${guest.id_proof || '-'}</td>
-                                    <td>${HotelUtils.DateUtils.formatDate(guest.created_at)}</td>
-                                    <td>
-                                        <div class="actions">
-                                            <button class="btn btn-sm btn-danger" onclick="app.deleteGuest(${guest.id})">
-                                                Delete
-                                            </button>
-                                        </div>
-                                    </td>
-                                </tr>
-                            `).join('')}
-                        </tbody>
-                    </table>
-                </div>
-            `;
-
-        } catch (error) {
-            console.error('Error loading guests:', error);
-        }
+                        `).join('')}
+                    </tbody>
+                </table>
+            </div>
+        `;
     }
 
     async loadRoomsPage() {
         try {
             HotelUtils.LoadingManager.show('main-content');
 
-            const rooms = await window.api.get('/rooms');
-            this.data.rooms = rooms;
+            this.data.rooms = await window.api.get('/rooms');
+            this.renderRoomsPage();
+        } catch (error) {
+            console.error('Error loading rooms:', error);
+        }
+    }
 
-            document.getElementById('main-content').innerHTML = `
-                <div class="actions">
-                    <button class="btn btn-success" onclick="app.showRoomModal()">
-                        <span>➕</span> Add New Room
-                    </button>
+    renderRoomsPage() {
+        const rooms = this.data.rooms;
+        document.getElementById('main-content').innerHTML = `
+            <div class="actions">
+                <button class="btn btn-success" onclick="app.showRoomModal()">
+                    <span>➕</span> Add New Room
+                </button>
+            </div>
+            
+            <div class="table-container">
+                <div class="table-header">
+                    <h2>Rooms</h2>
+                    <span class="text-muted">${rooms.length} total rooms</span>
                 </div>
-                
-                <div class="table-container">
-                    <div class="table-header">
-                        <h2>Rooms</h2>
-                        <span class="text-muted">${rooms.length} total rooms</span>
-                    </div>
-                    <table>
-                        <thead>
+                <table>
+                    <thead>
+                        <tr>
+                            <th>ID</th>
+                            <th>Room Number</th>
+                            <th>Type</th>
+                            <th>Capacity</th>
+                            <th>Price/Night</th>
+                            <th>Status</th>
+                            <th>Created</th>
+                            <th>Actions</th>
+                        </tr>
+                    </thead>
+                    <tbody>
+                        ${rooms.map(room => `
                             <tr>
-                                <th>ID</th>
-                                <th>Room Number</th>
-                                <th>Type</th>
-                                <th>Capacity</th>
-                                <th>Price/Night</th>
-                                <th>Status</th>
-                                <th>Created</th>
-                                <th>Actions</th>
+                                <td>#${room.id}</td>
+                                <td><strong>${room.room_number}</strong></td>
+                                <td>${room.room_type.charAt(0).toUpperCase() + room.room_type.slice(1)}</td>
+                                <td>${room.capacity} guests</td>
+                                <td>${HotelUtils.CurrencyUtils.format(room.price_per_night)}</td>
+                                <td>
+                                    <span class="status-badge status-${room.is_available ? 'available' : 'occupied'}">
+                                        ${room.is_available ? 'Available' : 'Occupied'}
+                                    </span>
+                                </td>
+                                <td>${HotelUtils.DateUtils.formatDate(room.created_at)}</td>
+                                <td>
+                                    <button class="btn btn-sm btn-warning">Edit</button>
+                                </td>
                             </tr>
-                        </thead>
-                        <tbody>
-                            ${rooms.map(room => `
-                                <tr>
-                                    <td>#${room.id}</td>
-                                    <td><strong>${room.room_number}</strong></td>
-                                    <td>${room.room_type.charAt(0).toUpperCase() + room.room_type.slice(1)}</td>
-                                    <td>${room.capacity} guests</td>
-                                    <td>${HotelUtils.CurrencyUtils.format(room.price_per_night)}</td>
-                                    <td>
-                                        <span class="status-badge status-${room.is_available ? 'available' : 'occupied'}">
-                                            ${room.is_available ? 'Available' : 'Occupied'}
-                                        </span>
-                                    </td>
-                                    <td>${HotelUtils.DateUtils.formatDate(room.created_at)}</td>
-                                    <td>
-                                        <button class="btn btn-sm btn-warning">Edit</button>
-                                    </td>
-                                </tr>
-                            `).join('')}
-                        </tbody>
-                    </table>
-                </div>
-            `;
-
-        } catch (error) {
-            console.error('Error loading rooms:', error);
-        }
+                        `).join('')}
+                    </tbody>
+                </table>
+            </div>
+        `;
     }
 
     async loadBookingsPage() {
         try {
             HotelUtils.LoadingManager.show('main-content');
 
-            const bookings = await window.api.get('/bookings');
-            this.data.bookings = bookings;
+            const page = await window.api.get('/bookings', BOOKING_LIST_PARAMS);
+            this.data.bookings = this.joinIncluded(page);
+            this.renderBookingsPage();
+        } catch (error) {
+            console.error('Error loading bookings:', error);
+        }
+    }
 
-            document.getElementById('main-content').innerHTML = `
-                <div class="actions">
-                    <button class="btn btn-warning" onclick="app.showBookingModal()">
-                        <span>➕</span> New Booking
-                    </button>
+    renderBookingsPage() {
+        const bookings = this.data.bookings;
+        document.getElementById('main-content').innerHTML = `
+            <div class="actions">
+                <button class="btn btn-warning" onclick="app.showBookingModal()">
+                    <span>➕</span> New Booking
+                </button>
+            </div>
+            
+            <div class="table-container">
+                <div class="table-header">
+                    <h2>Bookings</h2>
+                    <span class="text-muted">${bookings.length} total bookings</span>
                 </div>
-                
-                <div class="table-container">
-                    <div class="table-header">
-                        <h2>Bookings</h2>
-                        <span class="text-muted">${bookings.length} total bookings</span>
-                    </div>
-                    <table>
-                        <thead>
+                <table>
+                    <thead>
+                        <tr>
+                            <th>ID</th>
+                            <th>Guest</th>
+                            <th>Room</th>
+                            <th>Check-in</th>
+                            <th>Check-out</th>
+                            <th>Nights</th>
+                            <th>Total Amount</th>
+                            <th>Status</th>
+                            <th>Actions</th>
+                        </tr>
+                    </thead>
+                    <tbody>
+                        ${bookings.map(booking => `
                             <tr>
-                                <th>ID</th>
-                                <th>Guest</th>
-                                <th>Room</th>
-                                <th>Check-in</th>
-                                <th>Check-out</th>
-                                <th>Nights</th>
-                                <th>Total Amount</th>
-                                <th>Status</th>
-                                <th>Actions</th>
+                                <td>#${booking.id}</td>
+                                <td>
+                                    <strong>${booking.guest.name}</strong><br>
+                                    <small>${booking.guest.email}</small>
+                                </td>
+                                <td>
+                                    ${booking.room.room_number}<br>
+                                    <small>${booking.room.room_type}</small>
+                                </td>
+                                <td>${HotelUtils.DateUtils.formatDate(booking.check_in_date)}</td>
+                                <td>${HotelUtils.DateUtils.formatDate(booking.check_out_date)}</td>
+                                <td>${HotelUtils.DateUtils.getDaysBetween(booking.check_in_date, booking.check_out_date)}</td>
+                                <td>${HotelUtils.CurrencyUtils.format(booking.total_amount)}</td>
+                                <td>
+                                    <span class="status-badge status-${booking.status.replace('_', '-')}">
+                                        ${booking.status.replace('_', ' ').replace(/\b\w/g, l => l.toUpperCase())}
+                                    </span>
+                                    ${booking.status === 'checked_in' && booking.check_out_date < HotelUtils.DateUtils.today() ? `
+                                        <span class="status-badge status-warning">Overdue</span>
+                                    ` : ''}
+                                </td>
+                                <td>
+                                    <div class="actions">
+                                        ${booking.status === 'booked' ? `
+                                            <button class="btn btn-sm btn-success" onclick="app.checkInGuest(${booking.id})">
+                                                Check In
+                                            </button>
+                                            <button class="btn btn-sm btn-danger" onclick="app.cancelBooking(${booking.id})">
+                                                Cancel
+                                            </button>
+                                        ` : ''}
+                                        ${booking.status === 'checked_in' ? `
+                                            <button class="btn btn-sm btn-warning" onclick="app.checkOutGuest(${booking.id})">
+                                                Check Out
+                                            </button>
+                                        ` : ''}
+                                    </div>
+                                </td>
                             </tr>
-                        </thead>
-                        <tbody>
-                            ${bookings.map(booking => `
-                                <tr>
-                                    <td>#${booking.id}</td>
-                                    <td>
-                                        <strong>${booking.guest.name}</strong><br>
-                                        <small>${booking.guest.email}</small>
-                                    </td>
-                                    <td>
-                                        ${booking.room.room_number}<br>
-                                        <small>${booking.room.room_type}</small>
-                                    </td>
-                                    <td>${HotelUtils.DateUtils.formatDate(booking.check_in_date)}</td>
-                                    <td>${HotelUtils.DateUtils.formatDate(booking.check_out_date)}</td>
-                                    <td>${HotelUtils.DateUtils.getDaysBetween(booking.check_in_date, booking.check_out_date)}</td>
-                                    <td>${HotelUtils.CurrencyUtils.format(booking.total_amount)}</td>
-                                    <td>
-                                        <span class="status-badge status-${booking.status.replace('_', '-')}">
-                                            ${booking.status.replace('_', ' ').replace(/\b\w/g, l => l.toUpperCase())}
-                                        </span>
-                                    </td>
-                                    <td>
-                                        <div class="actions">
-                                            ${booking.status === 'booked' ? `
-                                                <button class="btn btn-sm btn-success" onclick="app.checkInGuest(${booking.id})">
-                                                    Check In
-                                                </button>
-                                                <button class="btn btn-sm btn-danger" onclick="app.cancelBooking(${booking.id})">
-                                                    Cancel
-                                                </button>
-                                            ` : ''}
-                                            ${booking.status === 'checked_in' ? `
-                                                <button class="btn btn-sm btn-warning" onclick="app.checkOutGuest(${booking.id})">
-                                                    Check Out
-                                                </button>
-                                            ` : ''}
-                                        </div>
-                                    </td>
-                                </tr>
-                            `).join('')}
-                        </tbody>
-                    </table>
-                </div>
-            `;
+                        `).join('')}
+                    </tbody>
+                </table>
+            </div>
+        `;
+    }
 
-        } catch (error) {
-            console.error('Error loading bookings:', error);
+    // Patch the local lists with one change event and redraw what is on screen
+    applyChange({ resource, op, data }) {
+        const rows = this.data[resource];
+        if (!rows) return;
+
+        const index = rows.findIndex(row => row.id === data.id);
+        if (op === 'deleted') {
+            if (index !== -1) rows.splice(index, 1);
+        } else if (index !== -1) {
+            Object.assign(rows[index], data);
+        } else if (op === 'created') {
+            rows.unshift(data);
+        }
+
+        // Bookings created by the API embed guest and room; a moved booking does not
+        const moved = resource === 'bookings' && op === 'updated' && index !== -1 && (
+            rows[index].guest_id !== rows[index].guest.id || rows[index].room_id !== rows[index].room.id
+        );
+        this.changed.add(moved ? 'moved' : resource);
+
+        // One redraw for a burst of events
+        HotelUtils.Debouncer.debounce('render', () => {
+            const changed = this.changed;
+            this.changed = new Set();
+            if (this.currentPage === 'dashboard') {
+                this.loadDashboard(true);
+            } else if (changed.has('moved') && this.currentPage === 'bookings') {
+                this.loadBookingsPage();
+            } else if (changed.has(this.currentPage)) {
+                this.renderCurrentPage();
+            }
+        }, 100);
+    }
+
+    renderCurrentPage() {
+        switch (this.currentPage) {
+            case 'guests':
+                this.renderGuestsPage();
+                break;
+            case 'rooms':
+                this.renderRoomsPage();
+                break;
+            case 'bookings':
+                this.renderBookingsPage();
+                break;
         }
     }
 
+    // Put each booking's guest and room back from a shape=normalized page
+    joinIncluded(page) {
+        const { guests = {}, rooms = {} } = page.included;
+        return page.data.map(booking => ({
+            ...booking,
+            guest: guests[booking.guest_id],
+            room: rooms[booking.room_id]
+        }));
+    }
+
     // Modal methods
     showGuestModal() {
         const modalHTML = `
@@ -474,10 +549,16 @@ class HotelManagementApp {
 
     async showBookingModal() {
         try {
-            const [guests, rooms] = await Promise.all([
-                window.api.get('/guests'),
-                window.api.get('/rooms?available=true')
-            ]);
+            // Both lists in one request
+            const batch = window.api.batch();
+            const guestList = batch.get('/guests');
+            const roomList = batch.get('/rooms', { available: true });
+            await batch.flush();
+            const [guests, rooms] = await Promise.all([guestList.result, roomList.result]);
+
+            // The total amount calculator looks rooms up here
+            this.data.guests = guests;
+            this.data.rooms = rooms;
 
             const modalHTML = `
                 <div class="modal-content">
@@ -488,20 +569,15 @@ class HotelManagementApp {
                     <form id="bookingForm">
                         <div class="form-group">
                             <label for="guest_id">Guest *</label>
+                            <input type="search" id="guest_search" placeholder="Search by name, email or phone" autocomplete="off">
                             <select id="guest_id" name="guest_id" required>
-                                <option value="">Select Guest</option>
-                                ${guests.map(guest => `
-                                    <option value="${guest.id}">${guest.name} (${guest.email})</option>
-                                `).join('')}
+                                ${this.guestOptions(guests)}
                             </select>
                         </div>
                         <div class="form-group">
                             <label for="room_id">Room *</label>
                             <select id="room_id" name="room_id" required>
-                                <option value="">Select Room</option>
-                                ${rooms.map(room => `
-                                    <option value="${room.id}">${room.room_number} - ${room.room_type} (${HotelUtils.CurrencyUtils.format(room.price_per_night)}/night)</option>
-                                `).join('')}
+                                ${this.roomOptions(rooms)}
                             </select>
                         </div>
                         <div class="form-group">
@@ -530,6 +606,60 @@ class HotelManagementApp {
         }
     }
 
+    guestOptions(guests) {
+        return `
+            <option value="">Select Guest</option>
+            ${guests.map(guest => `
+                <option value="${guest.id}">${guest.name} (${guest.email})</option>
+            `).join('')}
+        `;
+    }
+
+    async updateGuestOptions(query) {
+        const select = document.getElementById('guest_id');
+        if (!select) return;
+
+        const term = query.trim();
+        const guests = term
+            ? await window.api.get('/guests/suggest', { q: term })
+            : this.data.guests;
+
+        select.innerHTML = this.guestOptions(guests);
+        if (term && guests.length > 0) {
+            select.value = guests[0].id;
+        }
+    }
+
+    roomOptions(rooms) {
+        return `
+            <option value="">Select Room</option>
+            ${rooms.map(room => `
+                <option value="${room.id}">${room.room_number} - ${room.room_type} (${HotelUtils.CurrencyUtils.format(room.price_per_night)}/night)</option>
+            `).join('')}
+        `;
+    }
+
+    async updateRoomOptions() {
+        const select = document.getElementById('room_id');
+        const checkIn = document.getElementById('check_in_date').value;
+        const checkOut = document.getElementById('check_out_date').value;
+        if (!select) return;
+
+        let rooms = this.data.rooms;
+        if (checkIn && checkOut && checkOut > checkIn) {
+            // Only offer rooms with no stay overlapping the chosen nights
+            const free = await window.api.get('/rooms/availability', { check_in: checkIn, check_out: checkOut });
+            const freeIds = new Set(free.map(room => room.id));
+            rooms = rooms.filter(room => freeIds.has(room.id));
+        }
+
+        const selected = select.value;
+        select.innerHTML = this.roomOptions(rooms);
+        if (rooms.some(room => room.id == selected)) {
+            select.value = selected;
+        }
+    }
+
     // Form setup methods
     setupGuestForm() {
         const form = document.getElementById('guestForm');
@@ -546,15 +676,12 @@ class HotelManagementApp {
                 };
 
                 try {
-                    await window.api.post('/guests', guestData);
+                    await this.writeThenSync(batch => batch.post('/guests', guestData));
                     HotelUtils.ToastManager.show('Guest created successfully!', 'success');
                     HotelUtils.ModalManager.hide('guestModal');
                     HotelUtils.ModalManager.destroy('guestModal');
-                    // Refresh guest data globally
-                    this.data.guests = await window.api.get('/guests');
-                    await this.loadGuestsPage();
                 } catch (error) {
-                    // Error already handled by API client
+                    // Error already shown
                 }
             };
         }
@@ -574,15 +701,12 @@ class HotelManagementApp {
                 };
 
                 try {
-                    await window.api.post('/rooms', roomData);
+                    await this.writeThenSync(batch => batch.post('/rooms', roomData));
                     HotelUtils.ToastManager.show('Room created successfully!', 'success');
                     HotelUtils.ModalManager.hide('roomModal');
                     HotelUtils.ModalManager.destroy('roomModal');
-                    // Refresh room data globally
-                    this.data.rooms = await window.api.get('/rooms');
-                    await this.loadRoomsPage();
                 } catch (error) {
-                    // Error already handled by API client
+                    // Error already shown
                 }
             };
         }
@@ -608,9 +732,20 @@ class HotelManagementApp {
                 }
             };
 
+            // Type-ahead over all guests, not just the first page
+            const guestSearch = document.getElementById('guest_search');
+            guestSearch.addEventListener('input', () => {
+                HotelUtils.Debouncer.debounce('guestSuggest', () => {
+                    this.updateGuestOptions(guestSearch.value).catch(() => {});
+                }, 150);
+            });
+
             document.getElementById('room_id').addEventListener('change', updateTotalAmount);
-            document.getElementById('check_in_date').addEventListener('change', updateTotalAmount);
-            document.getElementById('check_out_date').addEventListener('change', updateTotalAmount);
+            const onDatesChanged = () => {
+                this.updateRoomOptions().catch(() => {}).then(updateTotalAmount);
+            };
+            document.getElementById('check_in_date').addEventListener('change', onDatesChanged);
+            document.getElementById('check_out_date').addEventListener('change', onDatesChanged);
 
             form.onsubmit = async (e) => {
                 e.preventDefault();
@@ -624,15 +759,13 @@ class HotelManagementApp {
                 };
 
                 try {
-                    await window.api.post('/bookings', bookingData);
+                    // Create and fetch the resulting changes in one round trip
+                    await this.writeThenSync(batch => batch.post('/bookings', bookingData));
                     HotelUtils.ToastManager.show('Booking created successfully!', 'success');
                     HotelUtils.ModalManager.hide('bookingModal');
                     HotelUtils.ModalManager.destroy('bookingModal');
-                    // Refresh booking data globally
-                    this.data.bookings = await window.api.get('/bookings');
-                    await this.loadBookingsPage();
                 } catch (error) {
-                    // Error already handled by API client
+                    // Error already shown
                 }
             };
         }
@@ -642,70 +775,60 @@ class HotelManagementApp {
     async deleteGuest(guestId) {
         if (confirm('Are you sure you want to delete this guest?')) {
             try {
-                await window.api.delete(`/guests?id=${guestId}`);
+                await this.writeThenSync(batch => batch.delete(`/guests?id=${guestId}`));
                 HotelUtils.ToastManager.show('Guest deleted successfully!', 'success');
-                await this.loadGuestsPage();
             } catch (error) {
-                // Error already handled by API client
+                // Error already shown
             }
         }
     }
 
+    // Run one write and fetch the changes since our last event in the same
+    // batch, then patch the local lists; rejects (after a toast) if the write failed
+    async writeThenSync(queueWrite) {
+        const batch = window.api.batch();
+        const write = queueWrite(batch);
+        const delta = batch.get('/events', { updated_since: this.feed.lastEventId || '' });
+        await batch.flush();
+        try {
+            await write.result;
+        } catch (error) {
+            HotelUtils.ToastManager.show(error.message, 'error');
+            throw error;
+        }
+        this.feed.applyDelta(await delta.result);
+        return write.result;
+    }
+
     async checkInGuest(bookingId) {
         try {
-            await window.api.put(`/bookings?id=${bookingId}&action=checkin`);
+            await this.writeThenSync(batch => batch.put(`/bookings?id=${bookingId}&action=checkin`));
             HotelUtils.ToastManager.show('Guest checked in successfully!', 'success');
-            await this.loadBookingsPage();
         } catch (error) {
-            // Error already handled by API client
+            // Error already shown
         }
     }
 
     async checkOutGuest(bookingId) {
         try {
-            await window.api.put(`/bookings?id=${bookingId}&action=checkout`);
+            await this.writeThenSync(batch => batch.put(`/bookings?id=${bookingId}&action=checkout`));
             HotelUtils.ToastManager.show('Guest checked out successfully!', 'success');
-            await this.loadBookingsPage();
         } catch (error) {
-            // Error already handled by API client
+            // Error already shown
         }
     }
 
     async cancelBooking(bookingId) {
         if (confirm('Are you sure you want to cancel this booking?')) {
             try {
-                await window.api.delete(`/bookings?id=${bookingId}`);
+                await this.writeThenSync(batch => batch.delete(`/bookings?id=${bookingId}`));
                 HotelUtils.ToastManager.show('Booking cancelled successfully!', 'success');
-                await this.loadBookingsPage();
             } catch (error) {
-                // Error already handled by API client
+                // Error already shown
             }
         }
     }
 
-    // Utility methods
-    calculateStats() {
-        const totalGuests = this.data.guests.length;
-        const totalRooms = this.data.rooms.length;
-        const availableRooms = this.data.rooms.filter(r => r.is_available).length;
-        const activeBookings = this.data.bookings.filter(b => ['booked', 'checked_in'].includes(b.status)).length;
-        const totalRevenue = this.data.bookings.reduce((sum, b) => sum + b.total_amount, 0);
-        const occupancyRate = totalRooms > 0 ? Math.round(((totalRooms - availableRooms) / totalRooms) * 100) : 0;
-
-        const recentBookings = this.data.bookings
-            .sort((a, b) => new Date(b.created_at) - new Date(a.created_at))
-            .slice(0, 5);
-
-        return {
-            totalGuests,
-            totalRooms,
-            availableRooms,
-            activeBookings,
-            totalRevenue,
-            occupancyRate,
-            recentBookings
-        };
-    }
 }
 
 // Global refresh function
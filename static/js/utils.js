@@ -72,6 +72,8 @@ class ModalManager {
 class ApiClient {
     constructor(baseURL = '/api') {
         this.baseURL = baseURL;
+        // Multi-property deployments: open the app as /?hotel=<id>
+        this.hotelId = new URLSearchParams(window.location.search).get('hotel');
         this.requestQueue = new Map();
         this.rateLimits = {
             general: 30, // 30 requests per minute
@@ -111,6 +113,11 @@ class ApiClient {
             // Prevent duplicate requests
             const requestKey = `${options.method || 'GET'}-${endpoint}-${JSON.stringify(options.body || {})}`;
             
+            // One key per write, reused by its retries so the server runs it once
+            if (['POST', 'PUT'].includes(options.method)) {
+                options = { ...options, headers: { 'Idempotency-Key': this.newIdempotencyKey(), ...options.headers } };
+            }
+            
             // Create request promise
             const requestPromise = this.executeRequest(endpoint, options);
             
@@ -131,14 +138,35 @@ class ApiClient {
     async executeRequest(endpoint, options = {}) {
         const url = `${this.baseURL}${endpoint}`;
         const config = {
+            ...options,
             headers: {
                 'Content-Type': 'application/json',
+                ...(this.hotelId ? { 'X-Hotel-Id': this.hotelId } : {}),
                 ...options.headers
-            },
-            ...options
+            }
         };
         
-        const response = await fetch(url, config);
+        // Reads and keyed writes are safe to send again
+        const retriable = !config.method || Boolean(config.headers['Idempotency-Key']);
+        
+        let response;
+        try {
+            response = await fetch(url, config);
+        } catch (error) {
+            // Network failure: the write may or may not have run, so retry it with its key
+            if (!retriable || options.retried) {
+                throw error;
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            return this.executeRequest(endpoint, { ...options, retried: true });
+        }
+        
+        // Rate limited: wait as long as the server asks, once
+        if (response.status === 429 && retriable && !options.retried) {
+            const seconds = Math.min(parseInt(response.headers.get('Retry-After'), 10) || 1, 10);
+            await new Promise(resolve => setTimeout(resolve, seconds * 1000));
+            return this.executeRequest(endpoint, { ...options, retried: true });
+        }
         
         if (!response.ok) {
             let error;
@@ -165,6 +193,14 @@ class ApiClient {
         }
     }
     
+    newIdempotencyKey() {
+        // randomUUID needs a secure context (https or localhost)
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    }
+    
     async get(endpoint, params = {}) {
         const query = new URLSearchParams(params).toString();
         const url = query ? `${endpoint}?${query}` : endpoint;
@@ -190,6 +226,187 @@ class ApiClient {
             method: 'DELETE'
         });
     }
+    
+    // Start a queue of operations sent together through /api/batch
+    batch() {
+        return new ApiBatch(this);
+    }
+}
+
+// Queues API calls and sends them as one POST /api/batch request.
+// add() returns a handle whose ref('id') can be used in later operations'
+// params or body, and whose result promise settles when the batch flushes.
+class ApiBatch {
+    constructor(client) {
+        this.client = client;
+        this.operations = [];
+        this.handles = [];
+    }
+    
+    add(method, endpoint, body) {
+        const index = this.operations.length;
+        const operation = { method, resource: endpoint };
+        if (body !== undefined) {
+            operation.body = body;
+        }
+        this.operations.push(operation);
+        
+        const handle = { ref: (path = 'id') => `$${index}.${path}` };
+        handle.result = new Promise((resolve, reject) => {
+            handle.resolve = resolve;
+            handle.reject = reject;
+        });
+        // Callers that only need some results should not see unhandled rejections
+        handle.result.catch(() => {});
+        this.handles.push(handle);
+        return handle;
+    }
+    
+    get(endpoint, params = {}) {
+        const query = new URLSearchParams(params).toString();
+        return this.add('GET', query ? `${endpoint}?${query}` : endpoint);
+    }
+    
+    post(endpoint, data) {
+        return this.add('POST', endpoint, data);
+    }
+    
+    put(endpoint, data) {
+        return this.add('PUT', endpoint, data);
+    }
+    
+    delete(endpoint) {
+        return this.add('DELETE', endpoint);
+    }
+    
+    // Send everything queued so far; resolves with the per-operation results
+    async flush() {
+        const operations = this.operations.splice(0);
+        const handles = this.handles.splice(0);
+        if (operations.length === 0) {
+            return [];
+        }
+        
+        try {
+            const { results } = await this.client.post('/batch', { operations });
+            results.forEach((result, index) => {
+                if (result.status < 400) {
+                    handles[index].resolve(result.data);
+                } else {
+                    const message = (result.data && result.data.error) || `HTTP ${result.status}`;
+                    handles[index].reject(new Error(message));
+                }
+            });
+            return results;
+        } catch (error) {
+            handles.forEach(handle => handle.reject(error));
+            throw error;
+        }
+    }
+}
+
+// Follows /api/events so local data can be patched instead of refetched.
+// Uses Server-Sent Events where available and polls the delta endpoint
+// otherwise; onChange sees each event once and in order, onReset is called
+// (at most every minResetInterval ms) when the server cannot say what changed.
+class ChangeFeed {
+    constructor(client, { onChange, onReset, pollInterval = 10000, minResetInterval = 30000 } = {}) {
+        this.client = client;
+        this.onChange = onChange || (() => {});
+        this.onReset = onReset || (() => {});
+        this.pollInterval = pollInterval;
+        this.minResetInterval = minResetInterval;
+        this.lastEventId = null;
+        this.lastReset = 0;
+        this.resetTimer = null;
+        this.source = null;
+    }
+    
+    // Resolves once the feed knows where the server's log stands (or after 2s)
+    start() {
+        return new Promise(resolve => {
+            setTimeout(resolve, 2000);
+            if (!window.EventSource) {
+                this.poll().finally(resolve);
+                return;
+            }
+            
+            // EventSource cannot send headers
+            const hotel = this.client.hotelId ? `?hotel_id=${encodeURIComponent(this.client.hotelId)}` : '';
+            this.source = new EventSource(`${this.client.baseURL}/events${hotel}`);
+            this.source.addEventListener('ready', event => {
+                this.lastEventId = event.lastEventId;
+                resolve();
+            });
+            this.source.addEventListener('reset', event => {
+                this.lastEventId = event.lastEventId;
+                this.reset();
+            });
+            this.source.addEventListener('change', event => {
+                this.apply([JSON.parse(event.data)]);
+            });
+            this.source.onerror = () => {
+                // The browser retries on its own unless the server refused the stream
+                if (this.source.readyState === EventSource.CLOSED) {
+                    this.source = null;
+                    this.poll();
+                }
+            };
+        });
+    }
+    
+    async poll() {
+        try {
+            const delta = await this.client.get('/events', { updated_since: this.lastEventId || '' });
+            if (this.lastEventId === null) {
+                // First round only learns where the log stands
+                this.lastEventId = delta.last_event_id;
+            } else {
+                this.applyDelta(delta);
+            }
+        } catch (error) {
+            // Try again next round
+        }
+        setTimeout(() => this.poll(), this.pollInterval);
+    }
+    
+    // Apply a GET /api/events?updated_since= response
+    applyDelta(delta) {
+        const known = this.lastEventId !== null;
+        this.apply(delta.events);
+        this.lastEventId = delta.last_event_id;
+        if (delta.reset || !known) {
+            this.reset();
+        }
+    }
+    
+    apply(events) {
+        for (const event of events) {
+            if (!this.isSeen(event.id)) {
+                this.lastEventId = event.id;
+                this.onChange(event);
+            }
+        }
+    }
+    
+    // Ids are "<epoch>-<seq>"; the same event can come from the stream and a delta
+    isSeen(id) {
+        if (!this.lastEventId) return false;
+        const [epoch, seq] = id.split('-');
+        const [lastEpoch, lastSeq] = this.lastEventId.split('-');
+        return epoch === lastEpoch && Number(seq) <= Number(lastSeq);
+    }
+    
+    reset() {
+        clearTimeout(this.resetTimer);
+        const wait = this.lastReset + this.minResetInterval - Date.now();
+        if (wait > 0) {
+            this.resetTimer = setTimeout(() => this.reset(), wait);
+            return;
+        }
+        this.lastReset = Date.now();
+        this.onReset();
+    }
 }
 
 // Form validation
@@ -268,6 +485,11 @@ class DateUtils {
         return new Date(date) < new Date();
     }
     
+    // Local date as YYYY-MM-DD, comparable with the API's date strings
+    static today() {
+        return new Date().toLocaleDateString('en-CA');
+    }
+    
     static addDays(date, days) {
         const result = new Date(date);
         result.setDate(result.getDate() + days);
@@ -359,5 +581,6 @@ window.HotelUtils = {
     CurrencyUtils,
     FormValidator,
     LoadingManager,
+    ChangeFeed,
     Debouncer: debouncer
 };